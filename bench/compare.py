@@ -0,0 +1,50 @@
+"""Compare two benchmark result files
+
+    python -m bench.compare bench/results/before.json bench/results/after.json
+"""
+import sys
+import json
+
+# Metrics where a higher value is better; for the others lower is better
+HIGHER_IS_BETTER = ('requests', 'throughput_rps', 'deliveries', 'deliveries_per_second')
+
+
+def flatten(scenario: dict, prefix: str = '') -> dict:
+    values = {}
+    for key, value in scenario.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            values[prefix + key] = value
+    return values
+
+
+def compare(before: dict, after: dict):
+    print(f"{before['commit']} -> {after['commit']}")
+    for name, scenario in after['scenarios'].items():
+        if name not in before['scenarios']:
+            continue
+        print(f"\n{name}")
+        old_values = flatten(before['scenarios'][name])
+        for metric, new in flatten(scenario).items():
+            old = old_values.get(metric)
+            if old is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            better = change > 0 if metric.split('.')[-1] in HIGHER_IS_BETTER else change < 0
+            marker = '' if abs(change) < 5 else ('✅' if better else '⚠️')
+            print(f"  {metric:<28} {old:>12} {new:>12} {change:>+8.1f}% {marker}")
+
+
+def main():
+    if len(sys.argv) != 3:
+        raise SystemExit("usage: python -m bench.compare AVANT.json APRES.json")
+    with open(sys.argv[1]) as f:
+        before = json.load(f)
+    with open(sys.argv[2]) as f:
+        after = json.load(f)
+    compare(before, after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Point the app's database module at the benchmark MySQL server
+
+database.py hard-codes the Aiven server; the benchmark must never touch
+it, so its connection settings are overridden from BENCH_MYSQL_* before
+anything opens a connection.
+"""
+import os
+import mysql.connector
+import database
+
+BENCH_MYSQL = {
+    'host': os.getenv("BENCH_MYSQL_HOST", "127.0.0.1"),
+    'port': int(os.getenv("BENCH_MYSQL_PORT", "3306")),
+    'user': os.getenv("BENCH_MYSQL_USER", "root"),
+    'password': os.getenv("BENCH_MYSQL_PASSWORD", ""),
+    'database': os.getenv("BENCH_MYSQL_DATABASE", "math_bench"),
+}
+
+
+def configure():
+    """Create the benchmark database if needed and redirect database.py to it"""
+    conn = mysql.connector.connect(
+        host=BENCH_MYSQL['host'], port=BENCH_MYSQL['port'],
+        user=BENCH_MYSQL['user'], password=BENCH_MYSQL['password']
+    )
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{BENCH_MYSQL['database']}` CHARACTER SET utf8mb4")
+    cursor.close()
+    conn.close()
+
+    database.MYSQL_HOST = BENCH_MYSQL['host']
+    database.MYSQL_PORT = BENCH_MYSQL['port']
+    database.MYSQL_USER = BENCH_MYSQL['user']
+    database.MYSQL_PASSWORD = BENCH_MYSQL['password']
+    database.MYSQL_DATABASE = BENCH_MYSQL['database']
+    database.MYSQL_SSL_CA = None
+
+
+def connect():
+    """Raw connection to the benchmark database (seeding, fixtures)"""
+    return mysql.connector.connect(**BENCH_MYSQL)
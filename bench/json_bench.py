@@ -0,0 +1,67 @@
+"""Microbenchmark: serializing a 1,000-message payload
+
+    python -m bench.json_bench --messages 1000 --repeat 200
+
+Compares the former path (convert_datetime_to_string + JSONResponse)
+with FastJSONResponse, using orjson and the stdlib fallback.
+"""
+import timeit
+import argparse
+from decimal import Decimal
+from datetime import datetime, timedelta
+from fastapi.responses import JSONResponse
+import json_encoder
+from json_encoder import FastJSONResponse, convert_datetime_to_string
+
+
+def message_payload(count: int) -> dict:
+    """Rows shaped like get_private_messages output"""
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    return {"success": True, "messages": [
+        {
+            'id': i, 'conversation_id': 42, 'sender_id': 1000 + i % 7, 'message_type': 'text',
+            'content': f"Bonjour, voici la correction de l'exercice {i} sur les intégrales",
+            'file_url': None, 'drive_file_id': None, 'created_at': start + timedelta(seconds=37 * i),
+            'first_name': 'Élève', 'last_name': f"Numéro{i % 7}",
+            'profile_picture': '/media/profile_pictures/thumb.webp', 'thumbnail_url': None,
+            'score': Decimal('12.50'),
+        }
+        for i in range(count)
+    ]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de sérialisation JSON")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = message_payload(args.messages)
+    cases = {
+        'convert_datetime_to_string + JSONResponse': lambda: JSONResponse(convert_datetime_to_string(payload)),
+        'FastJSONResponse (orjson)': lambda: FastJSONResponse(payload),
+    }
+
+    results = {}
+    orjson = json_encoder.orjson
+    for name, build in cases.items():
+        if 'orjson' in name and orjson is None:
+            continue
+        results[name] = min(timeit.repeat(build, number=args.repeat, repeat=3)) / args.repeat
+
+    json_encoder.orjson = None
+    try:
+        results['FastJSONResponse (stdlib)'] = min(
+            timeit.repeat(lambda: FastJSONResponse(payload), number=args.repeat, repeat=3)
+        ) / args.repeat
+    finally:
+        json_encoder.orjson = orjson
+
+    baseline = results['convert_datetime_to_string + JSONResponse']
+    print(f"{args.messages} messages, {len(FastJSONResponse(payload).body)} octets")
+    for name, seconds in results.items():
+        print(f"  {name:<45} {seconds * 1000:8.3f} ms  x{baseline / seconds:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
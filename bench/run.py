@@ -0,0 +1,112 @@
+"""Load-test main:app and write throughput / latency percentiles to JSON
+
+    python -m bench.seed --reset            # once, against BENCH_MYSQL_*
+    python -m bench.run --duration 20 --concurrency 32
+    python -m bench.compare bench/results/before.json bench/results/after.json
+
+The server is started in a subprocess (bench.server: local MySQL,
+local-disk storage) unless --base-url points at one already running.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+import httpx
+from bench.scenarios import LOAD_SCENARIOS, load_fixtures, run_load, run_ws_fanout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+ALL_SCENARIOS = list(LOAD_SCENARIOS) + ['ws_fanout']
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_server(port: int) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, "-m", "bench.server", "--port", str(port)], cwd=ROOT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("❌ Le serveur de benchmark s'est arrêté au démarrage")
+        try:
+            if httpx.get(f"{base_url}/login", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("❌ Le serveur de benchmark n'a pas démarré en 60s")
+
+
+async def run_all(args, base_url: str) -> dict:
+    fixtures = load_fixtures(args.concurrency)
+    results = {}
+    for name in args.scenarios:
+        print(f"▶️  {name}...")
+        if name == 'ws_fanout':
+            results[name] = await run_ws_fanout(base_url, args.listeners, args.fanout_messages)
+        else:
+            setup, step = LOAD_SCENARIOS[name]
+            results[name] = await run_load(base_url, setup, step, fixtures,
+                                           args.concurrency, args.duration, args.warmup)
+        print(f"   {json.dumps(results[name])}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'application")
+    parser.add_argument("--scenarios", nargs="+", choices=ALL_SCENARIOS, default=ALL_SCENARIOS)
+    parser.add_argument("--duration", type=float, default=20, help="secondes mesurées par scénario")
+    parser.add_argument("--warmup", type=float, default=3, help="secondes non comptées au début")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--listeners", type=int, default=200, help="clients WebSocket pour ws_fanout")
+    parser.add_argument("--fanout-messages", type=int, default=100)
+    parser.add_argument("--base-url", help="serveur déjà lancé (sinon bench.server est démarré)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.base_url
+    if not base_url:
+        process = start_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        results = asyncio.run(run_all(args, base_url))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'duration': args.duration, 'warmup': args.warmup, 'concurrency': args.concurrency,
+            'listeners': args.listeners, 'fanout_messages': args.fanout_messages,
+        },
+        'scenarios': results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Résultats écrits dans {out}")
+
+
+if __name__ == "__main__":
+    main()
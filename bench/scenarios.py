@@ -0,0 +1,235 @@
+"""Benchmark scenarios: each one drives the HTTP/WebSocket API of a running server
+
+A load scenario is a setup coroutine (log a worker in, pick its fixture)
+and a step coroutine (one timed request). ws_fanout is measured
+separately: it times delivery of each message to every listener.
+"""
+import json
+import time
+import random
+import asyncio
+from typing import Callable, Dict, List
+import httpx
+import websockets
+from bench.db import connect
+from bench.seed import BENCH_PASSWORD
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def load_fixtures(count: int) -> Dict[str, list]:
+    """Seeded users and conversations the workers act as"""
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id, phone FROM users WHERE user_type = 'pro' ORDER BY id LIMIT %s", (count,))
+    pro_users = cursor.fetchall()
+    cursor.execute("""
+        SELECT cp.conversation_id, u.id AS user_id, u.phone
+        FROM conversation_participants cp
+        JOIN conversations c ON c.id = cp.conversation_id
+        JOIN users u ON u.id = cp.user_id
+        WHERE c.conversation_type = 'private'
+        ORDER BY cp.conversation_id
+        LIMIT %s
+    """, (count,))
+    private = cursor.fetchall()
+    cursor.execute("SELECT phone FROM users ORDER BY id LIMIT %s", (max(count * 10, 100),))
+    phones = [row['phone'] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return {'pro_users': pro_users, 'private': private, 'phones': phones}
+
+
+async def login(client: httpx.AsyncClient, phone: str):
+    response = await client.post("/login", data={'phone': phone, 'password': BENCH_PASSWORD})
+    response.raise_for_status()
+
+
+# --- load scenarios: (setup, step) -------------------------------------------
+
+async def login_setup(client, fixtures, index):
+    return {'phones': fixtures['phones'], 'rng': random.Random(index)}
+
+
+async def login_step(client, state):
+    await login(client, state['rng'].choice(state['phones']))
+
+
+async def catalog_setup(client, fixtures, index):
+    user = fixtures['pro_users'][index % len(fixtures['pro_users'])]
+    await login(client, user['phone'])
+    return {}
+
+
+async def catalog_step(client, state):
+    (await client.get("/pg_pro")).raise_for_status()
+
+
+async def conversation_setup(client, fixtures, index):
+    fixture = fixtures['private'][index % len(fixtures['private'])]
+    await login(client, fixture['phone'])
+    return {'conversation_id': fixture['conversation_id'], 'sent': 0}
+
+
+async def send_message_step(client, state):
+    state['sent'] += 1
+    response = await client.post("/send_private_message", data={
+        'conversation_id': state['conversation_id'],
+        'message_type': 'text',
+        'content': f"bench message {state['sent']}",
+    })
+    response.raise_for_status()
+
+
+async def fetch_messages_step(client, state):
+    (await client.get(f"/get_private_messages/{state['conversation_id']}")).raise_for_status()
+
+
+LOAD_SCENARIOS: Dict[str, tuple] = {
+    'login': (login_setup, login_step),
+    'catalog': (catalog_setup, catalog_step),
+    'send_message': (conversation_setup, send_message_step),
+    'fetch_messages': (conversation_setup, fetch_messages_step),
+}
+
+
+async def run_load(base_url: str, setup: Callable, step: Callable, fixtures: dict,
+                   concurrency: int, duration: float, warmup: float) -> dict:
+    """`concurrency` workers loop on step() for warmup + duration seconds;
+    only requests started after the warmup are counted"""
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    async def worker(index):
+        nonlocal errors
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            state = await setup(client, fixtures, index)
+            while time.perf_counter() < deadline:
+                begin = time.perf_counter()
+                try:
+                    await step(client, state)
+                except (httpx.HTTPError, OSError):
+                    if begin >= measure_from:
+                        errors += 1
+                    continue
+                if begin >= measure_from:
+                    latencies.append(time.perf_counter() - begin)
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return summarize(latencies, errors, duration)
+
+
+# --- WebSocket fan-out ---------------------------------------------------------
+
+def create_fanout_group(listeners: int) -> dict:
+    """A fresh group per run, so every listener is newly added by /invite_members
+    (which is what registers it for broadcasts in the server process)"""
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id, phone FROM users WHERE is_active = TRUE ORDER BY id LIMIT %s", (listeners + 1,))
+    users = cursor.fetchall()
+    sender = users[0]
+    cursor.execute("""
+        INSERT INTO conversations (name, conversation_type, created_by) VALUES (%s, 'group', %s)
+    """, (f"Bench fan-out {int(time.time())}", sender['id']))
+    group_id = cursor.lastrowid
+    cursor.execute("""
+        INSERT INTO conversation_participants (conversation_id, user_id, role) VALUES (%s, %s, 'admin')
+    """, (group_id, sender['id']))
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return {'group_id': group_id, 'sender': sender, 'listeners': [user['id'] for user in users[1:]]}
+
+
+async def run_ws_fanout(base_url: str, listeners: int, messages: int) -> dict:
+    """Time from POST /send_group_message to reception by every listener"""
+    group = create_fanout_group(listeners)
+    ws_url = base_url.replace('http', 'ws', 1)
+    sent_at: Dict[str, float] = {}
+    deliveries: List[float] = []
+    received = asyncio.Event()
+    expected = len(group['listeners']) * messages
+
+    async def listen(user_id):
+        async with websockets.connect(f"{ws_url}/ws/notifications/{user_id}", max_queue=None) as ws:
+            ready.release()
+            async for raw in ws:
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    continue
+                if data.get('type') == 'new_message':
+                    content = data['message'].get('content')
+                    if content in sent_at:
+                        deliveries.append(time.perf_counter() - sent_at[content])
+                        if len(deliveries) >= expected:
+                            received.set()
+
+    ready = asyncio.Semaphore(0)
+    tasks = [asyncio.create_task(listen(uid)) for uid in group['listeners']]
+    for _ in tasks:
+        await ready.acquire()
+
+    post_latencies, errors = [], 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await login(client, group['sender']['phone'])
+        response = await client.post("/invite_members", data={
+            'group_id': group['group_id'], 'user_ids': ','.join(map(str, group['listeners']))
+        })
+        response.raise_for_status()
+
+        start = time.perf_counter()
+        for i in range(messages):
+            content = f"fanout {group['group_id']} {i}"
+            sent_at[content] = begin = time.perf_counter()
+            try:
+                response = await client.post("/send_group_message", data={
+                    'conversation_id': group['group_id'], 'message_type': 'text', 'content': content
+                })
+                response.raise_for_status()
+                post_latencies.append(time.perf_counter() - begin)
+            except httpx.HTTPError:
+                errors += 1
+
+    try:
+        await asyncio.wait_for(received.wait(), timeout=30)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    deliveries.sort()
+    return {
+        'listeners': len(group['listeners']),
+        'messages': messages,
+        'post': summarize(post_latencies, errors, elapsed),
+        'deliveries': len(deliveries),
+        'lost': expected - len(deliveries),
+        'deliveries_per_second': round(len(deliveries) / elapsed, 2) if elapsed else 0.0,
+        'delivery_p50_ms': round(percentile(deliveries, 50) * 1000, 2),
+        'delivery_p99_ms': round(percentile(deliveries, 99) * 1000, 2),
+    }
@@ -0,0 +1,154 @@
+"""Seed the benchmark database with realistic volumes
+
+    python -m bench.seed --users 5000 --groups 200 --messages 1000000
+
+Every run is reproducible (fixed random seed). Seeding refuses to run
+on a non-empty database unless --reset is given, which drops it first.
+"""
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+import mysql.connector
+from auth import hash_password
+from bench.db import BENCH_MYSQL, configure, connect
+
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 5000
+CLASS_LEVELS = ('Terminale', 'Première', 'Seconde', 'Troisième')
+SUBJECTS = ('Algèbre', 'Analyse', 'Géométrie', 'Probabilités', 'Arithmétique')
+WORDS = ('bonjour', 'exercice', 'fonction', 'dérivée', 'intégrale', 'limite', 'merci', 'demain',
+         'corrigé', 'question', 'vecteur', 'matrice', 'suite', 'probabilité', 'examen', 'ok')
+
+
+def bench_phone(index: int) -> str:
+    return f"b{index:07d}"
+
+
+def _insert(conn, sql, rows, label):
+    """executemany in batches (one multi-row INSERT each), committing as we go"""
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    for offset in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(sql, rows[offset:offset + BATCH_SIZE])
+        conn.commit()
+    cursor.close()
+    print(f"  - {len(rows)} {label} en {time.perf_counter() - start:.1f}s")
+
+
+def _random_date(rng, now, days=365):
+    return now - timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+
+def seed(users=5000, groups=200, group_size=50, private=2000, messages=1_000_000, contents=2000, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    conn = connect()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM users")
+    if cursor.fetchone()[0]:
+        raise SystemExit("La base de benchmark n'est pas vide: relancer avec --reset")
+
+    print(f"🌱 Seed de {BENCH_MYSQL['database']}...")
+    password = hash_password(BENCH_PASSWORD)
+    _insert(conn, """
+        INSERT INTO users (first_name, last_name, phone, password, user_type, class_level, is_active, is_verified, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, TRUE, TRUE, %s)
+    """, [
+        (f"Eleve{i}", f"Bench{i % 97}", bench_phone(i), password,
+         'pro' if rng.random() < 0.3 else 'free', rng.choice(CLASS_LEVELS), _random_date(rng, now))
+        for i in range(users)
+    ], "utilisateurs")
+
+    cursor.execute("SELECT id FROM users ORDER BY phone")
+    user_ids = [row[0] for row in cursor.fetchall()]
+
+    _insert(conn, """
+        INSERT INTO contents (title, description, drive_link, content_type, access_type, class_level, subject, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [
+        (f"Cours {i}", f"Support de cours numéro {i}", f"/media/educational_content/cours_{i}.pdf",
+         rng.choice(('pdf', 'video', 'image', 'book', 'audio')), rng.choice(('free', 'pro')),
+         rng.choice(CLASS_LEVELS), rng.choice(SUBJECTS), _random_date(rng, now))
+        for i in range(contents)
+    ], "contenus")
+
+    # Private conversations between neighbouring users, then groups
+    participants = {}
+    for i in range(min(private, len(user_ids) // 2)):
+        cursor.execute("INSERT INTO conversations (conversation_type, created_by) VALUES ('private', %s)",
+                       (user_ids[2 * i],))
+        participants[cursor.lastrowid] = [(user_ids[2 * i], 'member'), (user_ids[2 * i + 1], 'member')]
+    for i in range(groups):
+        members = rng.sample(user_ids, min(group_size, len(user_ids)))
+        cursor.execute("""
+            INSERT INTO conversations (name, conversation_type, created_by, description)
+            VALUES (%s, 'group', %s, %s)
+        """, (f"Groupe bench {i}", members[0], "Groupe de révision"))
+        participants[cursor.lastrowid] = [(members[0], 'admin')] + [(uid, 'member') for uid in members[1:]]
+    conn.commit()
+    print(f"  - {len(participants)} conversations")
+
+    _insert(conn, """
+        INSERT INTO conversation_participants (conversation_id, user_id, role) VALUES (%s, %s, %s)
+    """, [(cid, uid, role) for cid, members in participants.items() for uid, role in members], "participants")
+
+    conversation_ids = list(participants)
+    message_rows = []
+    for _ in range(messages):
+        cid = rng.choice(conversation_ids)
+        sender = rng.choice(participants[cid])[0]
+        content = ' '.join(rng.choices(WORDS, k=rng.randint(2, 20)))
+        message_rows.append((cid, sender, content, _random_date(rng, now)))
+        if len(message_rows) >= BATCH_SIZE * 20:
+            _insert(conn, """
+                INSERT INTO messages (conversation_id, sender_id, message_type, content, created_at)
+                VALUES (%s, %s, 'text', %s, %s)
+            """, message_rows, "messages")
+            message_rows = []
+    if message_rows:
+        _insert(conn, """
+            INSERT INTO messages (conversation_id, sender_id, message_type, content, created_at)
+            VALUES (%s, %s, 'text', %s, %s)
+        """, message_rows, "messages")
+
+    cursor.close()
+    conn.close()
+    print("✅ Seed terminé")
+
+
+def reset():
+    conn = mysql.connector.connect(**{k: v for k, v in BENCH_MYSQL.items() if k != 'database'})
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{BENCH_MYSQL['database']}`")
+    cursor.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Données de benchmark")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--group-size", type=int, default=50)
+    parser.add_argument("--private", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--contents", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="supprimer la base de benchmark avant le seed")
+    args = parser.parse_args()
+
+    if args.reset:
+        # configure() recreates the dropped database
+        reset()
+    configure()
+
+    # Create the schema exactly as the app does
+    from database import init_database
+    init_database()
+
+    seed(args.users, args.groups, args.group_size, args.private, args.messages, args.contents, args.seed)
+
+
+if __name__ == "__main__":
+    main()
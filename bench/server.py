@@ -0,0 +1,28 @@
+"""Run main:app for the benchmark: local MySQL, local-disk storage
+
+    python -m bench.server --port 8765
+"""
+import os
+import argparse
+
+# Before config.py is imported: no Google Drive calls during a benchmark
+os.environ["STORAGE_BACKEND"] = "local"
+
+import uvicorn
+from bench.db import configure
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de benchmark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    configure()
+    from main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
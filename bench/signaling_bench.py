@@ -0,0 +1,91 @@
+"""Simulation: signaling traffic of a mesh group call
+
+    python -m bench.signaling_bench --participants 12 --candidates 8
+
+Participants join one after another; every newcomer negotiates one
+peer connection with each participant already present (offer, answer,
+and a burst of trickle-ICE candidates in each direction). "broadcast"
+is the former relay (every message to the whole call), "ciblé" uses
+SignalingRelay with `to` and ICE batching. Frames and bytes are counted
+on fake sockets, so no server or browser is needed.
+"""
+import time
+import asyncio
+import argparse
+from websocket_manager import ConnectionManager
+from call_signaling import SignalingRelay
+
+CALL_ID = 1
+SDP = "v=0\r\no=- 4611731400430051336 2 IN IP4 127.0.0.1\r\n" + "a=candidate-placeholder\r\n" * 40
+
+
+class FakeSocket:
+    def __init__(self, totals: dict):
+        self.totals = totals
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.totals['frames'] += 1
+        self.totals['bytes'] += len(text)
+        await asyncio.sleep(0)
+
+
+def candidate(user_id: int, peer_id: int, index: int) -> dict:
+    return {'candidate': f"candidate:{index} 1 udp 2122260223 192.168.{user_id}.{peer_id} {50000 + index} typ host",
+            'sdpMid': '0', 'sdpMLineIndex': 0}
+
+
+async def negotiate(send, newcomer: int, peer: int, candidates: int):
+    """One peer connection: the present participant offers, the newcomer answers"""
+    await send(peer, {'type': 'offer', 'to': newcomer, 'data': {'type': 'offer', 'sdp': SDP}})
+    await send(newcomer, {'type': 'answer', 'to': peer, 'data': {'type': 'answer', 'sdp': SDP}})
+    for index in range(candidates):
+        await send(peer, {'type': 'ice-candidate', 'to': newcomer, 'data': candidate(peer, newcomer, index)})
+        await send(newcomer, {'type': 'ice-candidate', 'to': peer, 'data': candidate(newcomer, peer, index)})
+
+
+async def simulate(mode: str, participants: int, candidates: int) -> dict:
+    totals = {'frames': 0, 'bytes': 0}
+    connections = ConnectionManager()
+    relay = SignalingRelay(connections, batch_window=0.005)
+
+    async def send(user_id: int, data: dict):
+        if mode == 'broadcast':
+            message = {"from": user_id, "type": data.get("type"), "data": data.get("data")}
+            await connections.broadcast_to_call(message, CALL_ID, exclude_user=user_id)
+        else:
+            await relay.relay(CALL_ID, user_id, data)
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for newcomer in range(1, participants + 1):
+        await connections.connect_call(FakeSocket(totals), CALL_ID, newcomer)
+        await send(newcomer, {'type': 'join'})
+        await asyncio.gather(*(negotiate(send, newcomer, peer, candidates) for peer in range(1, newcomer)))
+        await asyncio.sleep(0.01)  # let pending ICE batches go out
+    return {
+        **totals,
+        'cpu_ms': (time.process_time() - cpu_started) * 1000,
+        'elapsed_ms': (time.perf_counter() - started) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation de la signalisation d'un appel de groupe")
+    parser.add_argument("--participants", type=int, default=12)
+    parser.add_argument("--candidates", type=int, default=8, help="candidats ICE par côté et par connexion")
+    args = parser.parse_args()
+
+    pairs = args.participants * (args.participants - 1) // 2
+    print(f"{args.participants} participants, {pairs} connexions, {args.candidates} candidats par côté")
+    results = {mode: asyncio.run(simulate(mode, args.participants, args.candidates)) for mode in ('broadcast', 'ciblé')}
+    for mode, r in results.items():
+        print(f"  {mode:<10} {r['frames']:7d} trames  {r['bytes'] / 1024:9.1f} Ko  CPU {r['cpu_ms']:7.1f} ms")
+    before, after = results['broadcast'], results['ciblé']
+    print(f"  trames x{before['frames'] / after['frames']:.1f} de moins, octets x{before['bytes'] / after['bytes']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Microbenchmark: page render time with and without fragment caching
+
+    python -m bench.template_bench --contents 500 --repeat 200
+
+Renders pg_pro.html and admin_panel.html with synthetic rows; "cold"
+clears the fragment cache before every render, "warm" reuses it.
+"""
+import timeit
+import argparse
+from datetime import datetime, timedelta
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from fragment_cache import fragment_cache, install
+from static_assets import static_assets
+
+
+def page_context(contents: int, publications: int) -> dict:
+    now = datetime(2024, 6, 1, 9, 0, 0)
+    user = {'id': 1, 'first_name': 'Élève', 'last_name': 'Test', 'phone': '0340000000', 'user_type': 'pro',
+            'class_level': 'Terminale', 'filiere': None, 'profile_picture': None}
+    return {
+        'request': None,
+        'user': user,
+        'admin': {'id': 1, 'nom': 'admin'},
+        'stats': {'total_users': 5000, 'pro_users': 1500, 'total_contents': contents,
+                  'pending_groups': 3, 'pending_pro_upgrades': 2},
+        'contents': [
+            {'id': i, 'title': f"Cours {i}", 'description': f"Support de cours numéro {i} sur les suites",
+             'content_type': ('pdf', 'video', 'image', 'book', 'audio')[i % 5], 'access_type': ('free', 'pro')[i % 2],
+             'class_level': 'Terminale', 'subject': 'Analyse', 'drive_file_id': f"educational_content/c{i}.pdf",
+             'drive_link': None, 'created_at': now - timedelta(days=i)}
+            for i in range(contents)
+        ],
+        'publications': [
+            {'id': i, 'title': f"Annonce {i}", 'content': "Les corrigés du bac blanc sont en ligne. " * 4,
+             'target_audience': 'all', 'created_at': now - timedelta(days=i)}
+            for i in range(publications)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de rendu des templates")
+    parser.add_argument("--contents", type=int, default=500)
+    parser.add_argument("--publications", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    env = Environment(loader=FileSystemLoader("templates"), autoescape=select_autoescape(['html']))
+    env.globals['static_url'] = static_assets.url
+    install(env)
+    context = page_context(args.contents, args.publications)
+
+    def cold(template):
+        fragment_cache.clear()
+        return template.render(context)
+
+    print(f"{args.contents} contenus, {args.publications} annonces")
+    for name in ('pg_pro.html', 'admin_panel.html'):
+        template = env.get_template(name)
+        cold_time = min(timeit.repeat(lambda: cold(template), number=args.repeat, repeat=3)) / args.repeat
+        template.render(context)
+        warm_time = min(timeit.repeat(lambda: template.render(context), number=args.repeat, repeat=3)) / args.repeat
+        print(f"  {name:<18} sans cache {cold_time * 1000:7.3f} ms   avec cache {warm_time * 1000:7.3f} ms"
+              f"   x{cold_time / warm_time:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import time
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from database import get_db_connection
+from config import CALL_FLUSH_INTERVAL, CALL_EMPTY_GRACE, CALL_MAX_AGE
+
+
+class CallRegistry:
+    """In-memory state of the active video calls
+
+    The video_calls row is still inserted when a call starts (its id is
+    the call id), but everything after that lives here: who may join
+    (conversation members at start time, plus anyone added to the
+    conversation since, see check_member), who is connected, when the
+    room emptied. Ended calls are written back in batches by
+    flush_loop(), so /end_call and disconnects never wait on MySQL.
+    """
+
+    def __init__(self):
+        self.calls: Dict[int, dict] = {}
+        # conversation_id -> active call ids
+        self.by_conversation: Dict[int, Set[int]] = {}
+        # call_id -> ended_at, waiting to be written
+        self.pending_ends: Dict[int, datetime] = {}
+
+    def start(self, call_id: int, conversation_id: int, initiated_by: int, call_type: str,
+              members: Iterable[int], conversation_name: Optional[str] = None,
+              started_at: Optional[datetime] = None, mode: str = 'mesh'):
+        self.calls[call_id] = {
+            'id': call_id,
+            'conversation_id': conversation_id,
+            'conversation_name': conversation_name,
+            'initiated_by': initiated_by,
+            'call_type': call_type,
+            'mode': mode,
+            'status': 'active',
+            'started_at': started_at or datetime.now(),
+            'members': set(members),
+            # user_id -> joined_at
+            'participants': {},
+            'empty_since': time.monotonic(),
+        }
+        self.by_conversation.setdefault(conversation_id, set()).add(call_id)
+
+    def get(self, call_id: int) -> Optional[dict]:
+        return self.calls.get(call_id)
+
+    def is_member(self, call_id: int, user_id: int) -> bool:
+        call = self.calls.get(call_id)
+        return call is not None and user_id in call['members']
+
+    def check_member(self, call_id: int, user_id: int) -> bool:
+        """is_member, falling back to the conversation for people added during the call"""
+        call = self.calls.get(call_id)
+        if call is None:
+            return False
+        if user_id in call['members']:
+            return True
+
+        conn = get_db_connection()
+        if not conn:
+            return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT 1 FROM conversation_participants WHERE conversation_id = %s AND user_id = %s
+            """, (call['conversation_id'], user_id))
+            found = cursor.fetchone() is not None
+        finally:
+            cursor.close()
+            conn.close()
+
+        if found:
+            call['members'].add(user_id)
+        return found
+
+    def join(self, call_id: int, user_id: int) -> bool:
+        call = self.calls.get(call_id)
+        if call is None or user_id not in call['members']:
+            return False
+        call['participants'][user_id] = datetime.now()
+        call['empty_since'] = None
+        return True
+
+    def leave(self, call_id: int, user_id: int) -> bool:
+        """Remove a participant; True when nobody is left connected"""
+        call = self.calls.get(call_id)
+        if call is None:
+            return False
+        call['participants'].pop(user_id, None)
+        if not call['participants']:
+            call['empty_since'] = time.monotonic()
+            return True
+        return False
+
+    def end(self, call_id: int) -> bool:
+        """Mark a call ended; the DB update is queued for the next flush"""
+        call = self.calls.pop(call_id, None)
+        if call is None:
+            return False
+        call_ids = self.by_conversation.get(call['conversation_id'])
+        if call_ids is not None:
+            call_ids.discard(call_id)
+            if not call_ids:
+                del self.by_conversation[call['conversation_id']]
+        self.pending_ends[call_id] = datetime.now()
+        return True
+
+    def summary(self, call: dict) -> dict:
+        return {
+            'call_id': call['id'],
+            'conversation_id': call['conversation_id'],
+            'call_type': call['call_type'],
+            'mode': call['mode'],
+            'initiated_by': call['initiated_by'],
+            'started_at': call['started_at'],
+            'participants': list(call['participants']),
+        }
+
+    def active_for_conversation(self, conversation_id: int) -> List[dict]:
+        return [self.summary(self.calls[call_id]) for call_id in self.by_conversation.get(conversation_id, ())]
+
+    def end_idle_calls(self, grace=CALL_EMPTY_GRACE):
+        """End calls nobody has been connected to for `grace` seconds"""
+        now = time.monotonic()
+        idle = [call_id for call_id, call in self.calls.items()
+                if call['empty_since'] is not None and now - call['empty_since'] >= grace]
+        for call_id in idle:
+            self.end(call_id)
+
+    def flush(self) -> bool:
+        """Write queued call ends in one transaction"""
+        if not self.pending_ends:
+            return True
+        pending, self.pending_ends = self.pending_ends, {}
+
+        conn = get_db_connection()
+        if not conn:
+            self.pending_ends = {**pending, **self.pending_ends}
+            return False
+
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("""
+                UPDATE video_calls SET status = 'ended', ended_at = %s
+                WHERE id = %s AND status = 'active'
+            """, [(ended_at, call_id) for call_id, ended_at in pending.items()])
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            self.pending_ends = {**pending, **self.pending_ends}
+            print(f"❌ Erreur d'écriture des fins d'appel: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    async def flush_loop(self, interval=CALL_FLUSH_INTERVAL):
+        """Background task: end idle calls and write call ends every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            self.end_idle_calls()
+            await asyncio.to_thread(self.flush)
+
+    def load(self, max_age=CALL_MAX_AGE, select_mode: Optional[Callable[[int], str]] = None):
+        """Rebuild the registry from the DB at startup
+
+        Nobody is connected after a restart: recent active calls are kept
+        (clients reconnect, or they end after the grace period), older
+        ones are closed. The mode is not stored: `select_mode(member_count)`
+        picks it again, as start_group_call did.
+        """
+        conn = get_db_connection()
+        if not conn:
+            return False
+
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                UPDATE video_calls SET status = 'ended', ended_at = NOW()
+                WHERE status = 'active' AND started_at < NOW() - INTERVAL %s SECOND
+            """, (max_age,))
+            conn.commit()
+
+            cursor.execute("""
+                SELECT vc.id, vc.conversation_id, vc.initiated_by, vc.call_type, vc.started_at,
+                       c.name as conversation_name
+                FROM video_calls vc
+                JOIN conversations c ON vc.conversation_id = c.id
+                WHERE vc.status = 'active'
+            """)
+            calls = cursor.fetchall()
+
+            members: Dict[int, Set[int]] = {}
+            conversation_ids = list({call['conversation_id'] for call in calls})
+            if conversation_ids:
+                cursor.execute(f"""
+                    SELECT conversation_id, user_id FROM conversation_participants
+                    WHERE conversation_id IN ({', '.join(['%s'] * len(conversation_ids))})
+                """, conversation_ids)
+                for row in cursor.fetchall():
+                    members.setdefault(row['conversation_id'], set()).add(row['user_id'])
+        except Exception as e:
+            print(f"❌ Erreur de chargement des appels actifs: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+        for call in calls:
+            call_members = members.get(call['conversation_id'], set())
+            mode = select_mode(len(call_members)) if select_mode else 'mesh'
+            self.start(call['id'], call['conversation_id'], call['initiated_by'], call['call_type'],
+                       call_members, call['conversation_name'], call['started_at'], mode=mode)
+        return True
+
+
+# Global instance
+call_registry = CallRegistry()
@@ -0,0 +1,105 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from websocket_manager import manager, ConnectionManager
+from config import ICE_BATCH_WINDOW, ICE_BATCH_MAX
+
+ICE_TYPES = ('ice-candidate', 'ice-candidates')
+
+
+class SignalingRelay:
+    """Routes WebRTC signaling between the participants of a call
+
+    A message carrying `to` (offer, answer, ICE) goes to that participant
+    only; messages without it (join, older clients) are still broadcast
+    to the rest of the call. Trickle-ICE candidates are held for
+    `batch_window` seconds and delivered as one "ice-candidates" frame
+    per sender/recipient pair. Any other message from the same sender
+    flushes its pending candidates first, so ordering is preserved.
+    """
+
+    def __init__(self, connections: ConnectionManager, batch_window=ICE_BATCH_WINDOW, batch_max=ICE_BATCH_MAX):
+        self.connections = connections
+        self.batch_window = batch_window
+        self.batch_max = batch_max
+        # (call_id, from_user, to_user or None) -> candidates
+        self.pending: Dict[Tuple[int, int, Optional[int]], List] = {}
+        self.timers: Dict[Tuple[int, int, Optional[int]], asyncio.Task] = {}
+        self.direct = 0
+        self.broadcast = 0
+        self.candidates = 0
+        self.candidate_frames = 0
+
+    async def relay(self, call_id: int, from_user: int, data: dict):
+        kind = data.get("type")
+        to_user = data.get("to")
+        if not isinstance(to_user, int) or to_user == from_user:
+            to_user = None
+
+        if kind in ICE_TYPES:
+            candidates = data.get("data")
+            if kind == 'ice-candidate' or not isinstance(candidates, list):
+                candidates = [candidates]
+            await self._queue(call_id, from_user, to_user, candidates)
+            return
+
+        await self.flush_sender(call_id, from_user)
+        await self._deliver(call_id, from_user, to_user, {"from": from_user, "type": kind, "data": data.get("data")})
+
+    async def _deliver(self, call_id: int, from_user: int, to_user: Optional[int], message: dict):
+        if to_user is None:
+            self.broadcast += 1
+            await self.connections.broadcast_to_call(message, call_id, exclude_user=from_user)
+        else:
+            # A peer that already left simply misses the message
+            self.direct += 1
+            await self.connections.send_to_call_participant(message, call_id, to_user)
+
+    async def _queue(self, call_id: int, from_user: int, to_user: Optional[int], candidates: list):
+        key = (call_id, from_user, to_user)
+        batch = self.pending.setdefault(key, [])
+        batch.extend(candidates)
+        self.candidates += len(candidates)
+        if len(batch) >= self.batch_max:
+            await self._flush(key)
+        elif key not in self.timers:
+            self.timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key):
+        await asyncio.sleep(self.batch_window)
+        self.timers.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key):
+        timer = self.timers.pop(key, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        candidates = self.pending.pop(key, None)
+        if not candidates:
+            return
+        call_id, from_user, to_user = key
+        self.candidate_frames += 1
+        await self._deliver(call_id, from_user, to_user, {"from": from_user, "type": "ice-candidates", "data": candidates})
+
+    async def flush_sender(self, call_id: int, from_user: int):
+        for key in [key for key in self.pending if key[0] == call_id and key[1] == from_user]:
+            await self._flush(key)
+
+    def forget(self, call_id: int, user_id: int):
+        """Drop candidates from or to a participant who left"""
+        for key in [key for key in self.pending if key[0] == call_id and user_id in (key[1], key[2])]:
+            self.pending.pop(key, None)
+            timer = self.timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'direct': self.direct,
+            'broadcast': self.broadcast,
+            'ice_candidates': self.candidates,
+            'ice_frames': self.candidate_frames,
+        }
+
+
+# Global instance
+signaling = SignalingRelay(manager)
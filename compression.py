@@ -0,0 +1,140 @@
+import zlib
+from typing import Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from static_assets import accepted_encodings
+from config import COMPRESSION_MIN_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/x-ndjson', 'image/svg+xml',
+)
+
+
+class _Gzip:
+    coding = 'gzip'
+
+    def __init__(self, level):
+        # wbits=31: gzip container
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self.compressor.compress(data)
+        # Sync flush so every streamed chunk reaches the client right away
+        return out + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _Brotli:
+    coding = 'br'
+
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self.compressor.process(data)
+        return out + (self.compressor.finish() if final else self.compressor.flush())
+
+
+class CompressionMiddleware:
+    """Pure ASGI response compression (gzip, or brotli when installed)
+
+    Only responses whose Content-Type is in the allowlist and which are
+    at least `minimum_size` bytes are compressed; responses that already
+    carry a Content-Encoding (precompressed static files) or serve byte
+    ranges (downloads: ranges and If-Range refer to the stored bytes)
+    pass through. Streaming responses are compressed chunk by chunk.
+    HEAD gets the same headers as GET.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, gzip_level=COMPRESSION_GZIP_LEVEL,
+                 brotli_quality=COMPRESSION_BROTLI_QUALITY, content_types: Tuple[str, ...] = COMPRESSIBLE_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.content_types = content_types
+
+    def _compressor(self, scope):
+        accepted = accepted_encodings(Headers(scope=scope).get('accept-encoding', ''))
+        if brotli is not None and 'br' in accepted:
+            return _Brotli(self.brotli_quality)
+        if 'gzip' in accepted:
+            return _Gzip(self.gzip_level)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        compressor = self._compressor(scope)
+        if compressor is None:
+            await self.app(scope, receive, send)
+            return
+
+        head = scope['method'] == 'HEAD'
+        start_message = None
+        active = None  # undecided until the first body chunk
+
+        async def send_wrapper(message):
+            nonlocal start_message, active
+            if message['type'] == 'http.response.start':
+                start_message = message
+                headers = Headers(raw=message['headers'])
+                content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+                if (message['status'] in (204, 206, 304) or 'content-encoding' in headers
+                        or 'accept-ranges' in headers or content_type not in self.content_types):
+                    active = False
+                    await send(message)
+                return
+
+            if message['type'] != 'http.response.body' or active is False:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+            if active is None:
+                size = len(body)
+                if head and not body and not more_body:
+                    # Header-only HEAD (file responses): judge by the size GET would send
+                    size = int(Headers(raw=start_message['headers']).get('content-length', self.minimum_size))
+                if not more_body and size < self.minimum_size:
+                    active = False
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                active = True
+                headers = MutableHeaders(raw=start_message['headers'])
+                headers['Content-Encoding'] = compressor.coding
+                headers.add_vary_header('Accept-Encoding')
+                # The entity changed: a strong ETag would no longer be valid
+                if 'etag' in headers and not headers['etag'].startswith('W/'):
+                    headers['ETag'] = 'W/' + headers['etag']
+                if more_body or (head and not body):
+                    # Streamed, or a HEAD without the body to measure
+                    del headers['Content-Length']
+                    await send(start_message)
+                    if not more_body:
+                        await send(message)
+                        return
+                else:
+                    compressed = compressor.compress(body, final=True)
+                    headers['Content-Length'] = str(len(compressed))
+                    await send(start_message)
+                    await send({'type': 'http.response.body', 'body': b'' if head else compressed})
+                    return
+
+            await send({
+                'type': 'http.response.body',
+                'body': compressor.compress(body, final=not more_body),
+                'more_body': more_body,
+            })
+
+        await self.app(scope, receive, send_wrapper)
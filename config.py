@@ -65,12 +65,82 @@ MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "math1")
 CREDENTIALS_FILE = "conf.json"
 TOKEN_FILE = "token.json"
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
+DRIVE_TOKEN_REFRESH_MARGIN = 5 * 60  # refresh 5 minutes before expiry
 
 # Application Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 UPLOAD_FOLDER = "uploads"
 MAX_UPLOAD_SIZE = 100 * 1024 * 1024  # 100MB
 
+# Storage Configuration: "google_drive" ou "local"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "google_drive")
+# Backend local: les fichiers passent par /files, qui vérifie les droits d'accès
+MEDIA_URL = "/files"
+# Dossiers lisibles par tout utilisateur connecté (photos de profil et de groupe)
+PUBLIC_MEDIA_FOLDERS = ("profile_pictures/", "group_avatars/")
+
+# Image variants (thumbnails WebP/JPEG générés côté serveur)
+IMAGE_VARIANT_WIDTHS = (160, 480, 1080)
+IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", "2"))
+
+# Download proxy: cache disque LRU des fichiers servis par /files
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", "cache/downloads")
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # 2GB
+
+# Static assets: noms avec empreinte de contenu + variantes gzip/brotli précalculées
+STATIC_DIR = "static"
+STATIC_CACHE_DIR = os.getenv("STATIC_CACHE_DIR", "cache/static")
+
+# Compression des réponses HTML/JSON/CSV (brotli si le module est installé, sinon gzip)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Fragment cache des templates (grille de contenus, annonces)
+FRAGMENT_CACHE_MAX_ENTRIES = 256
+FRAGMENT_CACHE_TTL = 10 * 60
+
+# Video calls: état en mémoire, fins d'appel écrites en base par lots
+CALL_FLUSH_INTERVAL = 5
+CALL_EMPTY_GRACE = 60  # un appel vide depuis 1 minute est terminé
+CALL_MAX_AGE = 6 * 60 * 60  # au redémarrage, les appels "actifs" plus vieux sont clôturés
+# Signalisation: les candidats ICE d'une rafale sont regroupés en une seule trame
+ICE_BATCH_WINDOW = float(os.getenv("ICE_BATCH_MS", "40")) / 1000
+ICE_BATCH_MAX = 16
+
+# SFU (aiortc, optionnel, désactivé par défaut): les appels de plus de SFU_MIN_PARTICIPANTS
+# membres passent par le serveur; tout le monde y parle, mais seules SFU_MAX_PUBLISHERS caméras sont relayées
+SFU_ENABLED = os.getenv("SFU_ENABLED", "0") == "1"
+SFU_MIN_PARTICIPANTS = int(os.getenv("SFU_MIN_PARTICIPANTS", "12"))
+SFU_MAX_PARTICIPANTS = int(os.getenv("SFU_MAX_PARTICIPANTS", "30"))
+SFU_MAX_PUBLISHERS = int(os.getenv("SFU_MAX_PUBLISHERS", "2"))  # flux relayés par appel, l'initiateur d'abord
+SFU_CPU_BUDGET = float(os.getenv("SFU_CPU_BUDGET", "0.8"))  # en cœurs: au-delà, les nouveaux participants sont refusés
+SFU_CPU_INTERVAL = 5
+
+# Admin dashboard counters: réconciliation avec la base toutes les 5 minutes
+STATS_RECONCILE_INTERVAL = 5 * 60
+
+# User picker: reconstruction complète de l'index de recherche toutes les 10 minutes
+USER_INDEX_REFRESH_INTERVAL = 10 * 60
+
+# Admin bulk moderation: nombre maximum d'ids par requête
+BULK_MAX_IDS = 1000
+
+# Query profiler: statistiques par requête SQL, journal des requêtes lentes avec EXPLAIN
+QUERY_PROFILER_ENABLED = os.getenv("QUERY_PROFILER", "1") == "1"
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_MS", "200")) / 1000
+SLOW_QUERY_EXPLAIN_INTERVAL = 5 * 60  # un EXPLAIN par requête toutes les 5 minutes au plus
+QUERY_STATS_MAX_STATEMENTS = 500
+
+# Event loop monitor: échantillonnage du retard de la boucle et pile des appels bloquants
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR", "1") == "1"
+LOOP_MONITOR_INTERVAL = 0.5
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_MS", "250")) / 1000
+
+# /metrics (format Prometheus): si défini, le scraper doit envoyer "Authorization: Bearer <token>";
+# sinon, seul un admin connecté peut le lire
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 # Session Configuration
 SESSION_LIFETIME = 24 * 60 * 60  # 24 hours
 
@@ -1,5 +1,8 @@
+import time
 import mysql.connector
 from mysql.connector import Error
+from metrics import db_metrics
+from query_profiler import profile_connection
 
 
 
@@ -43,8 +46,12 @@ MYSQL_SSL_CA = "ca.pem"
 # ------------------------------------------------------------------------
 
 # La fonction get_db_connection est simplifiée pour retourner la connexion Aiven si elle est nécessaire ailleurs.
-def get_db_connection():
-    """Create and return a database connection to math_educ."""
+def get_db_connection(profile=True):
+    """Create and return a database connection to math_educ.
+
+    Cursors are timed by the query profiler unless profile=False.
+    """
+    start = time.perf_counter()
     try:
         connection = mysql.connector.connect(
             host=MYSQL_HOST,
@@ -54,8 +61,10 @@ def get_db_connection():
             database=MYSQL_DATABASE,
             ssl_ca=MYSQL_SSL_CA
         )
-        return connection
+        db_metrics.record_connect(time.perf_counter() - start)
+        return profile_connection(connection) if profile else connection
     except Error as e:
+        db_metrics.record_connect(time.perf_counter() - start, error=True)
         print(f"❌ Erreur de connexion à MySQL Aiven: {e}")
         return None
 
@@ -64,6 +73,29 @@ def get_db_connection():
 
 
 
+def add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table (CREATE TABLE IF NOT EXISTS won't)"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        print(f"  - Colonne '{table}.{column}' ajoutée")
+
+
+def add_index_if_missing(cursor, table, index_name, columns, unique=False):
+    """Create an index on an existing table if it isn't there yet"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index_name))
+    if cursor.fetchone()[0] == 0:
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        cursor.execute(f"CREATE {kind} {index_name} ON {table} ({columns})")
+        print(f"  - Index '{index_name}' créé sur '{table}'")
+
+
 def init_database():
     """Initialize database with all required tables on the Aiven server."""
     connection = None
@@ -265,7 +297,8 @@ def init_database():
                 reviewed_at TIMESTAMP NULL,
                 reviewed_by INT,
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY (reviewed_by) REFERENCES admin(id) ON DELETE SET NULL
+                FOREIGN KEY (reviewed_by) REFERENCES admin(id) ON DELETE SET NULL,
+                UNIQUE KEY unique_pro_upgrade_transaction (transaction_id, operator)
             )
         """)
 
@@ -287,6 +320,72 @@ def init_database():
         """)
 
         print("✅ Nouvelles tables créées: pro_upgrade_requests, group_invite_requests")
+
+        # Content-addressed file table (deduplication des uploads)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                content_hash CHAR(64) PRIMARY KEY,
+                drive_file_id VARCHAR(255) NOT NULL,
+                web_view_link VARCHAR(500),
+                web_content_link VARCHAR(500),
+                direct_image_url VARCHAR(500),
+                direct_download_url VARCHAR(500),
+                mime_type VARCHAR(100),
+                size BIGINT,
+                ref_count INT DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_file_hashes_drive_file_id (drive_file_id)
+            )
+        """)
+
+        # Image variants (thumbnails générés par image_pipeline)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS image_variants (
+                source_file_id VARCHAR(255) NOT NULL,
+                width INT NOT NULL,
+                format VARCHAR(10) NOT NULL,
+                file_id VARCHAR(255) NOT NULL,
+                url VARCHAR(500) NOT NULL,
+                size INT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source_file_id, width, format)
+            )
+        """)
+        add_column_if_missing(cursor, "users", "profile_picture_thumb", "VARCHAR(500) NULL")
+        add_column_if_missing(cursor, "conversations", "group_photo_thumb", "VARCHAR(500) NULL")
+
+        # Lookup par fichier pour le proxy de téléchargement (/files)
+        add_index_if_missing(cursor, "contents", "idx_contents_drive_file_id", "drive_file_id")
+
+        # Index des listes paginées du panneau admin (/admin/api/*)
+        add_index_if_missing(cursor, "users", "idx_users_created_at", "created_at")
+        add_index_if_missing(cursor, "users", "idx_users_type_created", "user_type, created_at")
+        add_index_if_missing(cursor, "users", "idx_users_active_created", "is_active, created_at")
+        add_index_if_missing(cursor, "users", "idx_users_name", "first_name, last_name")
+        add_index_if_missing(cursor, "contents", "idx_contents_created_at", "created_at")
+        add_index_if_missing(cursor, "contents", "idx_contents_access_created", "access_type, created_at")
+        add_index_if_missing(cursor, "contents", "idx_contents_title", "title")
+        add_index_if_missing(cursor, "group_requests", "idx_group_requests_status_created", "status, created_at")
+        add_index_if_missing(cursor, "pro_upgrade_requests", "idx_pro_upgrade_status_created", "status, created_at")
+
+        # Une transaction mobile money = une seule demande PRO (soumissions idempotentes)
+        cursor.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM pro_upgrade_requests
+                GROUP BY transaction_id, operator HAVING COUNT(*) > 1
+            ) dup
+        """)
+        duplicates = cursor.fetchone()[0]
+        if duplicates:
+            # Les doublons existants doivent être traités par un admin avant d'ajouter la contrainte
+            print(f"  ⚠️ {duplicates} transaction(s) en double dans pro_upgrade_requests: index unique non créé")
+            add_index_if_missing(cursor, "pro_upgrade_requests", "idx_pro_upgrade_transaction", "transaction_id, operator")
+        else:
+            add_index_if_missing(cursor, "pro_upgrade_requests", "unique_pro_upgrade_transaction",
+                                 "transaction_id, operator", unique=True)
+
+        # Exports filtrés par période (/admin/export/messages)
+        add_index_if_missing(cursor, "messages", "idx_messages_created_at", "created_at")
                 
                 
         
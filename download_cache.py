@@ -0,0 +1,324 @@
+import os
+import json
+import asyncio
+import hashlib
+from urllib.parse import quote
+from collections import OrderedDict
+from typing import Dict, Optional
+import aiofiles
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from config import DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MAX_BYTES
+from storage import storage
+
+STREAM_CHUNK_SIZE = 64 * 1024
+# How often a reader that caught up with a download checks for more bytes
+FILL_POLL_INTERVAL = 0.05
+
+
+class _Fill:
+    """A download in progress, written to `part_path` in storage order"""
+
+    def __init__(self, part_path: str, size: int):
+        self.part_path = part_path
+        self.size = size
+        self.written = 0
+        self.done = False
+        self.failed = False
+
+
+class _CountingWriter:
+    """File object handed to storage.download_to_file; publishes progress to readers"""
+
+    def __init__(self, f, fill: _Fill):
+        self.f = f
+        self.fill = fill
+
+    def write(self, data):
+        count = self.f.write(data)
+        self.f.flush()
+        self.fill.written += len(data)
+        return count
+
+
+class DownloadCache:
+    """Size-bounded on-disk LRU cache of files fetched from storage
+
+    Each entry is a data file plus a small JSON sidecar with its
+    metadata, so the cache survives restarts. Concurrent requests for
+    the same missing file share a single download, and when storage
+    reports the file size they are served from the .part file while it
+    is being written (entry['fill'] is set), instead of after it.
+    """
+
+    def __init__(self, root=DOWNLOAD_CACHE_DIR, max_bytes=DOWNLOAD_CACHE_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        # {file_id: entry}, least recently used first
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # {file_id: entry being downloaded}
+        self._filling: Dict[str, dict] = {}
+        os.makedirs(self.root, exist_ok=True)
+        self._load_index()
+
+    def _key(self, file_id):
+        return hashlib.sha1(file_id.encode()).hexdigest()
+
+    def _load_index(self):
+        """Rebuild the LRU order from the sidecars left on disk"""
+        found = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.root, name)) as f:
+                    entry = json.load(f)
+                mtime = os.path.getmtime(entry['path'])
+                found.append((mtime, entry))
+            except Exception:
+                continue
+        for _, entry in sorted(found, key=lambda item: item[0]):
+            self.entries[entry['file_id']] = entry
+            self.total_bytes += entry['size']
+        self._evict()
+
+    def get(self, file_id) -> Optional[dict]:
+        entry = self.entries.get(file_id)
+        if entry is None:
+            return None
+        if not os.path.exists(entry['path']):
+            self._remove(file_id)
+            return None
+        self.entries.move_to_end(file_id)
+        return entry
+
+    async def fetch(self, file_id) -> Optional[dict]:
+        """Return the cache entry for a file, starting its download on a miss"""
+        entry = self.get(file_id) or self._filling.get(file_id)
+        if entry:
+            self.hits += 1
+            return entry
+
+        lock = self._locks.setdefault(file_id, asyncio.Lock())
+        try:
+            async with lock:
+                # Another request may have started it while we waited
+                entry = self.get(file_id) or self._filling.get(file_id)
+                if entry:
+                    self.hits += 1
+                    return entry
+
+                self.misses += 1
+                metadata = await asyncio.to_thread(storage.get_file_metadata, file_id)
+                if not metadata:
+                    return None
+                entry = self._new_entry(file_id, metadata)
+                if entry['size'] is None:
+                    # Size unknown: no Content-Length to promise, serve once complete
+                    return await self._download(entry, _Fill(f"{entry['path']}.part", 0))
+
+                fill = _Fill(f"{entry['path']}.part", entry['size'])
+                entry = {**entry, 'fill': fill}
+                self._filling[file_id] = entry
+                asyncio.create_task(self._download(entry, fill))
+                return entry
+        finally:
+            self._locks.pop(file_id, None)
+
+    def _new_entry(self, file_id, metadata: dict) -> dict:
+        key = self._key(file_id)
+        size = int(metadata['size']) if metadata.get('size') is not None else None
+        return {
+            'file_id': file_id,
+            'path': os.path.join(self.root, key),
+            'size': size,
+            'name': metadata.get('name') or key,
+            'mime_type': metadata.get('mimeType') or 'application/octet-stream',
+            # Without checksum nor size, set once the download is complete
+            'etag': metadata.get('md5Checksum') or (f"{key[:16]}-{size}" if size is not None else None)
+        }
+
+    async def _download(self, entry: dict, fill: _Fill) -> Optional[dict]:
+        try:
+            ok = await asyncio.to_thread(self._download_to_part, entry['file_id'], fill)
+        finally:
+            self._filling.pop(entry['file_id'], None)
+        if not ok:
+            fill.failed = True
+            return None
+
+        entry = {key: value for key, value in entry.items() if key != 'fill'}
+        entry['size'] = fill.written
+        entry['etag'] = entry['etag'] or f"{self._key(entry['file_id'])[:16]}-{fill.written}"
+        os.replace(fill.part_path, entry['path'])
+        with open(f"{entry['path']}.json", 'w') as f:
+            json.dump(entry, f)
+        self._add(entry)
+        fill.done = True
+        return entry
+
+    def _download_to_part(self, file_id, fill: _Fill) -> bool:
+        with open(fill.part_path, 'wb') as f:
+            ok = storage.download_to_file(file_id, _CountingWriter(f, fill))
+        if not ok or (fill.size and fill.written != fill.size):
+            try:
+                os.remove(fill.part_path)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def _add(self, entry):
+        self.entries[entry['file_id']] = entry
+        self.total_bytes += entry['size']
+        self._evict()
+
+    def _remove(self, file_id):
+        entry = self.entries.pop(file_id, None)
+        if not entry:
+            return
+        self.total_bytes -= entry['size']
+        for path in (entry['path'], f"{entry['path']}.json"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            file_id = next(iter(self.entries))
+            self._remove(file_id)
+
+    def invalidate(self, file_id):
+        self._remove(file_id)
+
+
+def _parse_range(range_header: str, size: int):
+    """Parse a single "bytes=start-end" range, return (start, end) inclusive
+
+    Returns None when the header should be ignored (multi-range or
+    malformed); raises 416 when the range can't be satisfied.
+    """
+    if not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+    start_str, _, end_str = range_header[6:].strip().partition('-')
+    try:
+        if start_str == '':
+            # Suffix range: last N bytes
+            length = int(end_str)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+            end = min(end, size - 1)
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Range Not Satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def _iter_filling(entry: dict, start: int, length: int):
+    """Stream a byte range of a file still being downloaded, waiting for bytes as needed"""
+    fill = entry['fill']
+    f = None
+    while f is None:
+        try:
+            f = await aiofiles.open(fill.part_path, 'rb')
+        except FileNotFoundError:
+            # Not created yet, already renamed into place, or failed
+            if fill.done:
+                f = await aiofiles.open(entry['path'], 'rb')
+            elif fill.failed:
+                raise IOError(f"Téléchargement interrompu: {entry['file_id']}")
+            else:
+                await asyncio.sleep(FILL_POLL_INTERVAL)
+
+    try:
+        position, end = start, start + length
+        while position < end:
+            if fill.failed:
+                # Abort the response rather than send a truncated file
+                raise IOError(f"Téléchargement interrompu: {entry['file_id']}")
+            available = min(fill.written, end) - position
+            if available <= 0:
+                await asyncio.sleep(FILL_POLL_INTERVAL)
+                continue
+            await f.seek(position)
+            chunk = await f.read(min(STREAM_CHUNK_SIZE, available))
+            if not chunk:
+                await asyncio.sleep(FILL_POLL_INTERVAL)
+                continue
+            position += len(chunk)
+            yield chunk
+    finally:
+        await f.close()
+
+
+async def _iter_file(path, start, length):
+    async with aiofiles.open(path, 'rb') as f:
+        await f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request: Request, path: str, size: int, mime_type: str, etag: str, file_name: str,
+                  filling: Optional[dict] = None):
+    """Stream a file from disk honouring If-None-Match and Range
+
+    `filling` is a download cache entry still being written: bytes are
+    then sent as they arrive.
+    """
+    etag = f'"{etag}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=86400",
+        "Content-Disposition": f"inline; filename*=utf-8''{quote(file_name)}"
+    }
+
+    # If-None-Match uses the weak comparison: W/"x" (from a compressing proxy) matches "x"
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [
+            tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (not if_range or if_range == etag):
+        byte_range = _parse_range(range_header, size)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        body = _iter_filling(filling, 0, size) if filling else _iter_file(path, 0, size)
+        return StreamingResponse(body, media_type=mime_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    body = _iter_filling(filling, start, length) if filling else _iter_file(path, start, length)
+    return StreamingResponse(body, status_code=206,
+                             media_type=mime_type, headers=headers)
+
+
+# Global instance
+download_cache = DownloadCache()
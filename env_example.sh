@@ -12,4 +12,11 @@ SECRET_KEY=change-this-to-a-random-secret-key-in-production
 # 2. Create a new project or select existing
 # 3. Enable Google Drive API
 # 4. Create OAuth 2.0 credentials (Desktop app)
-# 5. Download credentials.json and place in project root
\ No newline at end of file
+# 5. Download credentials.json and place in project root
+# Storage backend: "google_drive" (par défaut) ou "local" (fichiers dans uploads/, servis par /files avec contrôle d'accès)
+STORAGE_BACKEND=google_drive
+
+# Appels de groupe: relais serveur (SFU) pour les grands groupes, nécessite `pip install aiortc`
+SFU_ENABLED=0
+SFU_MIN_PARTICIPANTS=12
+SFU_MAX_PUBLISHERS=2
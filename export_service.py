@@ -0,0 +1,183 @@
+import io
+import csv
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from fastapi import HTTPException
+from mysql.connector import Error
+from database import get_db_connection
+from json_encoder import CustomJSONEncoder
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# dataset -> select, date column, {query param: SQL column} filters, order
+EXPORT_DATASETS = {
+    'users': {
+        'select': """
+            SELECT id, first_name, last_name, phone, user_type, class_level, filiere,
+                   is_active, is_verified, created_at
+            FROM users
+        """,
+        'date_column': 'created_at',
+        'filters': {
+            'user_type': 'user_type',
+            'is_active': 'is_active',
+            'is_verified': 'is_verified',
+            'class_level': 'class_level',
+        },
+        'order': 'id',
+    },
+    'payments': {
+        'select': """
+            SELECT pur.id, pur.user_id, u.first_name, u.last_name, u.phone,
+                   pur.operator, pur.phone_number, pur.amount, pur.transaction_id,
+                   pur.status, pur.created_at, pur.reviewed_at, pur.reviewed_by
+            FROM pro_upgrade_requests pur
+            JOIN users u ON pur.user_id = u.id
+        """,
+        'date_column': 'pur.created_at',
+        'filters': {
+            'status': 'pur.status',
+            'operator': 'pur.operator',
+        },
+        'order': 'pur.id',
+    },
+    'messages': {
+        'select': """
+            SELECT m.id, m.conversation_id, m.sender_id, u.first_name, u.last_name,
+                   m.message_type, m.content, m.file_url, m.created_at
+            FROM messages m
+            JOIN users u ON m.sender_id = u.id
+        """,
+        'date_column': 'm.created_at',
+        'filters': {
+            'conversation_id': 'm.conversation_id',
+            'sender_id': 'm.sender_id',
+            'message_type': 'm.message_type',
+        },
+        'order': 'm.id',
+    },
+}
+
+
+def _parse_date(value: str, field: str) -> datetime:
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field}: format attendu AAAA-MM-JJ")
+
+
+def build_export_query(dataset: str, params: Dict[str, str],
+                       date_from: Optional[str] = None, date_to: Optional[str] = None) -> Tuple[str, List]:
+    """Build the SQL and parameters of an export from request filters
+
+    Only the filters declared for the dataset are used; date_to is
+    inclusive (whole day).
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail="Export inconnu")
+    spec = EXPORT_DATASETS[dataset]
+
+    where, values = [], []
+    for param, column in spec['filters'].items():
+        value = params.get(param)
+        if value not in (None, ''):
+            if value.lower() in ('true', 'false'):
+                value = value.lower() == 'true'
+            where.append(f"{column} = %s")
+            values.append(value)
+    if date_from:
+        where.append(f"{spec['date_column']} >= %s")
+        values.append(_parse_date(date_from, 'date_from'))
+    if date_to:
+        where.append(f"{spec['date_column']} < %s")
+        values.append(_parse_date(date_to, 'date_to') + timedelta(days=1))
+
+    sql = spec['select']
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {spec['order']}"
+    return sql, values
+
+
+def _row_batches(sql: str, params: List, batch_size: int) -> Iterator[Tuple[List[str], list]]:
+    """Yield (column names, rows) batches from an unbuffered cursor
+
+    The default mysql-connector cursor is unbuffered: rows stay on the
+    server socket until fetched, so memory use is bounded by batch_size.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Base de données indisponible")
+
+    cursor = conn.cursor()
+    finished = False
+    try:
+        cursor.execute(sql, params)
+        columns = list(cursor.column_names)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield columns, rows
+        finished = True
+    finally:
+        if finished:
+            cursor.close()
+            conn.close()
+        else:
+            # Client went away mid-stream: unread rows would make close() fail
+            try:
+                conn.shutdown()
+            except Error:
+                pass
+
+
+# Spreadsheets evaluate cells starting with these as formulas
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    """Quote user-supplied text that a spreadsheet would run as a formula"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_chunks(batches) -> Iterator[str]:
+    # BOM so Excel opens accented names as UTF-8
+    yield '\ufeff'
+    header_written = False
+    for columns, rows in batches:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows([_csv_cell(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(batches) -> Iterator[str]:
+    for columns, rows in batches:
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), cls=CustomJSONEncoder, ensure_ascii=False) + '\n'
+            for row in rows
+        )
+
+
+def stream_export(sql: str, params: List, export_format: str,
+                  batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Sync generator of export chunks
+
+    StreamingResponse iterates sync generators in the threadpool, so
+    the blocking fetches never run on the event loop.
+    """
+    batches = _row_batches(sql, params, batch_size)
+    if export_format == 'csv':
+        return _csv_chunks(batches)
+    return _jsonl_chunks(batches)
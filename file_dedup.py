@@ -0,0 +1,148 @@
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from config import MAX_UPLOAD_SIZE
+from storage import storage
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+CACHE_SIZE = 1024
+
+# Cache mémoire {sha256: upload result} devant la table file_hashes
+_hash_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+
+async def read_and_hash(upload: UploadFile, chunk_size: int = CHUNK_SIZE) -> Tuple[bytes, str]:
+    """Read an upload in chunks, hashing it on the way"""
+    hasher = hashlib.sha256()
+    chunks = []
+    size = 0
+
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_SIZE:
+            raise HTTPException(status_code=413, detail="Fichier trop volumineux")
+        hasher.update(chunk)
+        chunks.append(chunk)
+
+    return b"".join(chunks), hasher.hexdigest()
+
+
+def _cache_put(content_hash: str, result: dict):
+    _hash_cache[content_hash] = result
+    _hash_cache.move_to_end(content_hash)
+    if len(_hash_cache) > CACHE_SIZE:
+        _hash_cache.popitem(last=False)
+
+
+def _row_to_result(row: dict) -> dict:
+    return {
+        'id': row['drive_file_id'],
+        'webViewLink': row['web_view_link'],
+        'webContentLink': row['web_content_link'],
+        'directImageUrl': row['direct_image_url'],
+        'directDownloadUrl': row['direct_download_url']
+    }
+
+
+def _select_by_hash(conn, content_hash: str) -> Optional[dict]:
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM file_hashes WHERE content_hash = %s", (content_hash,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    return _row_to_result(row) if row else None
+
+
+def find_by_hash(conn, content_hash: str) -> Optional[dict]:
+    """Look up an already stored file by its SHA-256"""
+    if content_hash in _hash_cache:
+        _hash_cache.move_to_end(content_hash)
+        return _hash_cache[content_hash]
+
+    result = _select_by_hash(conn, content_hash)
+    if not result:
+        return None
+    _cache_put(content_hash, result)
+    return result
+
+
+async def upload_deduplicated(conn, upload: UploadFile, file_name: str, folder_name: str = None) -> Optional[dict]:
+    """Upload a file unless the same content is already stored
+
+    Returns the same dict as storage.upload_file_from_bytes. The
+    file_hashes row is written on `conn`, so it is committed together
+    with the caller's own insert.
+    """
+    file_bytes, content_hash = await read_and_hash(upload)
+
+    result = find_by_hash(conn, content_hash)
+    cursor = conn.cursor()
+    try:
+        if result:
+            cursor.execute("""
+                UPDATE file_hashes SET ref_count = ref_count + 1 WHERE content_hash = %s
+            """, (content_hash,))
+            if cursor.rowcount:
+                print(f"♻️ Fichier déjà stocké, réutilisé: {result['id']}")
+                return result
+            # Entrée du cache périmée (fichier supprimé entre-temps)
+            _hash_cache.pop(content_hash, None)
+
+        result = storage.upload_file_from_bytes(file_bytes, file_name, upload.content_type, folder_name)
+        if not result:
+            return None
+
+        # Deux uploads simultanés du même fichier: le second ne fait qu'incrémenter
+        cursor.execute("""
+            INSERT INTO file_hashes
+            (content_hash, drive_file_id, web_view_link, web_content_link,
+             direct_image_url, direct_download_url, mime_type, size)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+        """, (content_hash, result['id'], result.get('webViewLink'), result.get('webContentLink'),
+              result.get('directImageUrl'), result.get('directDownloadUrl'),
+              upload.content_type, len(file_bytes)))
+
+        # L'upload perdant est supprimé: seul le fichier de la ligne est référencé
+        stored = _select_by_hash(conn, content_hash)
+        if stored and stored['id'] != result['id']:
+            print(f"♻️ Upload concurrent, doublon supprimé: {result['id']}")
+            storage.delete_file(result['id'])
+            result = stored
+        _cache_put(content_hash, result)
+        return result
+    finally:
+        cursor.close()
+
+
+def release_file(conn, drive_file_id: str) -> bool:
+    """Drop one reference to a stored file
+
+    Returns True when the caller may delete the file from storage,
+    i.e. nothing else references it (or it predates deduplication).
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT content_hash, ref_count FROM file_hashes WHERE drive_file_id = %s
+        """, (drive_file_id,))
+        row = cursor.fetchone()
+        if not row:
+            return True
+
+        if row['ref_count'] > 1:
+            cursor.execute("""
+                UPDATE file_hashes SET ref_count = ref_count - 1 WHERE content_hash = %s
+            """, (row['content_hash'],))
+            return False
+
+        cursor.execute("DELETE FROM file_hashes WHERE content_hash = %s", (row['content_hash'],))
+        _hash_cache.pop(row['content_hash'], None)
+        return True
+    finally:
+        cursor.close()
@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+from config import FRAGMENT_CACHE_MAX_ENTRIES, FRAGMENT_CACHE_TTL
+
+
+class FragmentCache:
+    """Rendered template fragments, keyed by data versions
+
+    Routes that change a dataset call bump("contents"); templates put
+    data_version("contents") in the fragment key, so the next render
+    misses and the stale entry simply ages out of the LRU. The TTL
+    covers changes made outside the app (SQL console, another worker).
+    """
+
+    def __init__(self, max_entries=FRAGMENT_CACHE_MAX_ENTRIES, ttl=FRAGMENT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, name: str) -> int:
+        return self.versions.get(name, 0)
+
+    def bump(self, *names: str):
+        for name in names:
+            self.versions[name] = self.version(name) + 1
+
+    def render(self, key: tuple, render):
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = render()
+        self.entries[key] = (now, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache 'pro', data_version('contents') %}...{% endcache %}
+
+    The key is the template name and line plus the given expressions;
+    everything inside the block must depend only on those.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [nodes.Const(f"{parser.name}:{lineno}")]
+        if parser.stream.current.type != 'block_end':
+            key.append(parser.parse_expression())
+            while parser.stream.skip_if('comma'):
+                key.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key, caller):
+        return fragment_cache.render(tuple(key), caller)
+
+
+class LazyRows:
+    """Query result loaded on first use
+
+    Routes pass these to templates whose loops sit inside {% cache %}
+    blocks: on a cache hit nothing iterates them, so the query never runs.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._rows = None
+
+    @property
+    def rows(self) -> list:
+        if self._rows is None:
+            self._rows = self._load()
+        return self._rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+
+def install(env):
+    """Enable {% cache %} and data_version() on a Jinja environment"""
+    env.add_extension(FragmentCacheExtension)
+    env.globals['data_version'] = fragment_cache.version
+
+
+# Global instance
+fragment_cache = FragmentCache()
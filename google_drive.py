@@ -1,17 +1,137 @@
 import os
 import io
 import json
+import time
+import asyncio
+import threading
+from datetime import datetime
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
-from config import CREDENTIALS_FILE, TOKEN_FILE, SCOPES
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload, MediaIoBaseDownload
+from googleapiclient.errors import HttpError
+from config import CREDENTIALS_FILE, TOKEN_FILE, SCOPES, DRIVE_TOKEN_REFRESH_MARGIN
+
+# Upper bounds (seconds) of the Drive call latency histogram
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUOTA_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded', 'dailyLimitExceeded')
+
+
+def is_quota_error(error):
+    """Check whether a Drive error is a rate-limit / quota rejection"""
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    content = error.content.decode(errors='ignore') if isinstance(error.content, bytes) else str(error.content)
+    return error.resp.status == 403 and any(reason in content for reason in QUOTA_REASONS)
+
+
+class DriveMetrics:
+    """Per-method latency, error and quota counters for Drive API calls"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}
+
+    def record(self, method, seconds, error=None):
+        with self.lock:
+            stats = self.methods.setdefault(method, {
+                'calls': 0,
+                'errors': 0,
+                'quota_errors': 0,
+                'total_seconds': 0.0,
+                'max_seconds': 0.0,
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1)
+            })
+            stats['calls'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+            stats['buckets'][index] += 1
+            if error is not None:
+                stats['errors'] += 1
+                if is_quota_error(error):
+                    stats['quota_errors'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            result = {}
+            for method, stats in self.methods.items():
+                result[method] = dict(stats, buckets=list(stats['buckets']))
+                result[method]['avg_seconds'] = stats['total_seconds'] / stats['calls'] if stats['calls'] else 0.0
+            return result
+
 
 class GoogleDriveManager:
     def __init__(self):
         self.service = None
+        self.creds = None
         self.folder_ids = {}
+        self.metrics = DriveMetrics()
+        self.refresh_lock = threading.Lock()
+
+    def _execute(self, method, request):
+        """Execute a Drive API request, recording its latency and outcome"""
+        start = time.perf_counter()
+        try:
+            result = request.execute()
+        except Exception as e:
+            self.metrics.record(method, time.perf_counter() - start, e)
+            raise
+        self.metrics.record(method, time.perf_counter() - start)
+        return result
+
+    def _save_token(self, creds):
+        """Write token.json atomically so a crash never leaves it truncated"""
+        tmp_path = f"{TOKEN_FILE}.tmp"
+        with open(tmp_path, 'w') as token:
+            token.write(creds.to_json())
+        os.replace(tmp_path, TOKEN_FILE)
+
+    def seconds_until_expiry(self):
+        """Seconds before the access token expires (None if unknown)"""
+        if not self.creds or not self.creds.expiry:
+            return None
+        # google-auth stores expiry as naive UTC
+        return (self.creds.expiry - datetime.utcnow()).total_seconds()
+
+    def refresh_credentials(self, margin=DRIVE_TOKEN_REFRESH_MARGIN):
+        """Refresh the access token if it expires within `margin` seconds
+
+        The service keeps a reference to self.creds, so refreshing in
+        place is enough: no need to rebuild it.
+        """
+        with self.refresh_lock:
+            remaining = self.seconds_until_expiry()
+            if not self.creds or not self.creds.refresh_token:
+                return False
+            if remaining is not None and remaining > margin and self.creds.valid:
+                return True
+
+            start = time.perf_counter()
+            try:
+                self.creds.refresh(Request())
+                self._save_token(self.creds)
+                self.metrics.record('token.refresh', time.perf_counter() - start)
+                print("✅ Token refreshed")
+                return True
+            except Exception as e:
+                self.metrics.record('token.refresh', time.perf_counter() - start, e)
+                print(f"❌ Error refreshing token: {e}")
+                return False
+
+    async def token_refresh_loop(self, margin=DRIVE_TOKEN_REFRESH_MARGIN):
+        """Background task: refresh the token shortly before it expires"""
+        while True:
+            remaining = self.seconds_until_expiry()
+            if remaining is not None and remaining <= margin:
+                await asyncio.to_thread(self.refresh_credentials, margin)
+                remaining = self.seconds_until_expiry()
+            # Wake up just before the refresh window, at most every 10 minutes
+            delay = 60 if remaining is None else remaining - margin
+            await asyncio.sleep(min(max(delay, 30), 600))
         
     def authenticate(self):
         """Authenticate with Google Drive API using web flow"""
@@ -29,19 +149,15 @@ class GoogleDriveManager:
         # If no valid credentials, return None (user needs to auth via web)
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                    # Save refreshed credentials
-                    with open(TOKEN_FILE, 'w') as token:
-                        token.write(creds.to_json())
-                    print("✅ Token refreshed")
-                except Exception as e:
-                    print(f"❌ Error refreshing token: {e}")
+                self.creds = creds
+                if not self.refresh_credentials():
                     return None
             else:
                 print("❌ No valid credentials - need web authentication")
                 return None
         
+        self.creds = creds
+        
         try:
             self.service = build('drive', 'v3', credentials=creds)
             print("✅ Google Drive service built successfully")
@@ -76,9 +192,9 @@ class GoogleDriveManager:
             creds = flow.credentials
             
             # Save credentials
-            with open(TOKEN_FILE, 'w') as token:
-                token.write(creds.to_json())
+            self._save_token(creds)
             
+            self.creds = creds
             self.service = build('drive', 'v3', credentials=creds)
             print("✅ OAuth callback handled successfully")
             return True
@@ -90,6 +206,9 @@ class GoogleDriveManager:
         """Ensure service is authenticated before any operation"""
         if not self.service:
             return self.authenticate()
+        # Expired token (background refresh missed): refresh now instead of failing the call
+        if self.creds and not self.creds.valid:
+            return self.refresh_credentials()
         return True
     
     def create_folder(self, folder_name, parent_id=None):
@@ -106,10 +225,10 @@ class GoogleDriveManager:
             file_metadata['parents'] = [parent_id]
         
         try:
-            folder = self.service.files().create(
+            folder = self._execute('files.create', self.service.files().create(
                 body=file_metadata,
                 fields='id'
-            ).execute()
+            ))
             
             folder_id = folder.get('id')
             self.folder_ids[folder_name] = folder_id
@@ -130,11 +249,11 @@ class GoogleDriveManager:
         # Search for folder
         try:
             query = f"name='{folder_path}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-            results = self.service.files().list(
+            results = self._execute('files.list', self.service.files().list(
                 q=query,
                 spaces='drive',
                 fields='files(id, name)'
-            ).execute()
+            ))
             
             files = results.get('files', [])
             
@@ -168,11 +287,11 @@ class GoogleDriveManager:
                 resumable=True
             )
             
-            file = self.service.files().create(
+            file = self._execute('files.create', self.service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id, webViewLink, webContentLink'
-            ).execute()
+            ))
             
             file_id = file.get('id')
             self.make_file_public(file_id)
@@ -202,18 +321,63 @@ class GoogleDriveManager:
             return False
         
         try:
-            self.service.permissions().create(
+            self._execute('permissions.create', self.service.permissions().create(
                 fileId=file_id,
                 body={
                     'type': 'anyone',
                     'role': 'reader'
                 }
-            ).execute()
+            ))
             return True
         except Exception as e:
             print(f"Error making file public: {e}")
             return False
 
+    def delete_file(self, file_id):
+        """Delete a file from Google Drive"""
+        if not self.ensure_authenticated():
+            return False
+
+        try:
+            self._execute('files.delete', self.service.files().delete(fileId=file_id))
+            return True
+        except Exception as e:
+            print(f"Error deleting file: {e}")
+            return False
+
+    def get_file_metadata(self, file_id):
+        """Get name, mime type, size and checksum of a file"""
+        if not self.ensure_authenticated():
+            return None
+
+        try:
+            return self._execute('files.get', self.service.files().get(
+                fileId=file_id,
+                fields='name, mimeType, size, md5Checksum'
+            ))
+        except Exception as e:
+            print(f"Error getting file metadata: {e}")
+            return None
+
+    def download_to_file(self, file_id, file_obj, chunk_size=8 * 1024 * 1024):
+        """Download a file in chunks into a writable file object"""
+        if not self.ensure_authenticated():
+            return False
+
+        start = time.perf_counter()
+        try:
+            request = self.service.files().get_media(fileId=file_id)
+            downloader = MediaIoBaseDownload(file_obj, request, chunksize=chunk_size)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+            self.metrics.record('files.get_media', time.perf_counter() - start)
+            return True
+        except Exception as e:
+            self.metrics.record('files.get_media', time.perf_counter() - start, e)
+            print(f"Error downloading file: {e}")
+            return False
+
     def get_direct_image_url(self, file_id, size='w500'):
         """Get direct image URL for HTML display
         Args:
@@ -0,0 +1,206 @@
+import io
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from PIL import Image, ImageOps
+from config import IMAGE_VARIANT_WIDTHS, IMAGE_POOL_WORKERS
+from database import get_db_connection
+from storage import storage
+
+# Smallest variant used for avatars in lists, medium one for chat previews
+AVATAR_WIDTH = IMAGE_VARIANT_WIDTHS[0]
+PREVIEW_WIDTH = IMAGE_VARIANT_WIDTHS[1]
+
+# format -> (Pillow format, mime type, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def is_image(upload) -> bool:
+    """Check whether an UploadFile looks like an image"""
+    return bool(upload and upload.content_type and upload.content_type.startswith('image/'))
+
+
+def render_variants(file_bytes: bytes, widths: Tuple[int, ...]) -> List[Tuple[int, str, bytes]]:
+    """Decode an image once and encode it at several widths
+
+    Runs inside the process pool. EXIF orientation is applied and every
+    variant is re-encoded from raw pixels, so EXIF/GPS/ICC metadata is
+    not carried over. Returns [(width, format, bytes), ...] with one
+    entry per requested width: an image narrower than a width is stored
+    unscaled under it, so lookups by width always find a variant.
+    """
+    with Image.open(io.BytesIO(file_bytes)) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = []
+    # actual width -> [(format, bytes)]
+    encoded = {}
+    # Largest first: each variant is downscaled from the previous one
+    for requested in sorted(widths, reverse=True):
+        width = min(requested, image.width)
+        if width in encoded:
+            variants.extend((requested, fmt, data) for fmt, data in encoded[width])
+            continue
+        encoded[width] = []
+
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+
+        for fmt, (pil_format, _, options) in VARIANT_FORMATS.items():
+            frame = image
+            if pil_format == 'JPEG' and image.mode == 'RGBA':
+                frame = Image.new('RGB', image.size, (255, 255, 255))
+                frame.paste(image, mask=image.getchannel('A'))
+            buffer = io.BytesIO()
+            frame.save(buffer, pil_format, **options)
+            encoded[width].append((fmt, buffer.getvalue()))
+            variants.append((requested, fmt, encoded[width][-1][1]))
+
+    return variants
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_POOL_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def generate_variants(file_bytes: bytes, widths=IMAGE_VARIANT_WIDTHS):
+    """Render variants in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), render_variants, file_bytes, tuple(widths))
+
+
+def _load_variants(cursor, source_file_id) -> Dict[Tuple[int, str], str]:
+    cursor.execute("""
+        SELECT width, format, url FROM image_variants WHERE source_file_id = %s
+    """, (source_file_id,))
+    return {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+
+async def store_variants(source_file_id: str, file_bytes: bytes, file_name: str, folder_name: str):
+    """Generate and store the variants of an uploaded image
+
+    Variants live next to the original ("<folder>/variants"), named after
+    the source file id (never the user's file name, which is not unique),
+    and are recorded in image_variants. A deduplicated upload already has them,
+    so they are only built once per source file.
+    Returns {(width, format): url}.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    cursor = conn.cursor()
+
+    try:
+        existing = _load_variants(cursor, source_file_id)
+        if existing:
+            return existing
+
+        variants = await generate_variants(file_bytes)
+        base_name = os.path.splitext(os.path.basename(source_file_id))[0]
+        urls = {}
+        rows = []
+        # Small images share the same bytes across widths: upload them once
+        uploaded = {}
+        for width, fmt, data in variants:
+            _, mime_type, _ = VARIANT_FORMATS[fmt]
+            result = uploaded.get(id(data))
+            if result is None:
+                result = await asyncio.to_thread(
+                    storage.upload_file_from_bytes,
+                    data,
+                    f"{base_name}_w{width}.{fmt}",
+                    mime_type,
+                    f"{folder_name}/variants"
+                )
+                uploaded[id(data)] = result
+            if not result:
+                continue
+            urls[(width, fmt)] = result['directImageUrl']
+            rows.append((source_file_id, width, fmt, result['id'], result['directImageUrl'], len(data)))
+
+        if rows:
+            cursor.executemany("""
+                INSERT IGNORE INTO image_variants (source_file_id, width, format, file_id, url, size)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, rows)
+            conn.commit()
+        print(f"🖼️ {len(rows)} variantes générées pour {file_name}")
+        return urls
+    except Exception as e:
+        print(f"❌ Erreur pipeline image: {e}")
+        return {}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def smallest_url(variants: Dict[Tuple[int, str], str], fmt='webp') -> Optional[str]:
+    """Pick the smallest variant URL in a format"""
+    candidates = sorted((width, url) for (width, f), url in variants.items() if f == fmt)
+    return candidates[0][1] if candidates else None
+
+
+async def process_profile_picture(user_id: int, source_file_id: str, file_bytes: bytes, file_name: str):
+    """Background task: build avatar variants and store the thumbnail URL"""
+    variants = await store_variants(source_file_id, file_bytes, file_name, "profile_pictures")
+    thumb_url = smallest_url(variants)
+    if not thumb_url:
+        return
+
+    conn = get_db_connection()
+    if not conn:
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE users SET profile_picture_thumb = %s WHERE id = %s
+        """, (thumb_url, user_id))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def process_group_photo(group_id: int, source_file_id: str, file_bytes: bytes, file_name: str):
+    """Background task: build group photo variants and store the thumbnail URL"""
+    variants = await store_variants(source_file_id, file_bytes, file_name, "group_avatars")
+    thumb_url = smallest_url(variants)
+    if not thumb_url:
+        return
+
+    conn = get_db_connection()
+    if not conn:
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE conversations SET group_photo_thumb = %s WHERE id = %s
+        """, (thumb_url, group_id))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def process_message_image(source_file_id: str, file_bytes: bytes, file_name: str):
+    """Background task: build preview variants for an image sent in a chat"""
+    await store_variants(source_file_id, file_bytes, file_name, "shared_files/images")
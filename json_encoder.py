@@ -1,6 +1,12 @@
 import json
 from datetime import datetime, date
 from decimal import Decimal
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
 
 class CustomJSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -27,4 +33,29 @@ def convert_datetime_to_string(obj):
     elif isinstance(obj, Decimal):
         return float(obj)
     else:
-        return obj
\ No newline at end of file
+        return obj
+
+
+def _orjson_default(obj):
+    """Types orjson doesn't handle natively (datetime and date it does)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    elif hasattr(obj, '__dict__'):
+        return obj.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(data) -> bytes:
+    """Serialize to compact UTF-8 JSON in a single pass
+
+    datetime/date become ISO strings and Decimal a float, as with
+    convert_datetime_to_string, without rebuilding the data first.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=CustomJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that accepts raw DB rows (datetime, Decimal) directly"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,130 @@
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from typing import List, Optional
+from metrics import Histogram, metric_header, render_gauge
+from config import LOOP_MONITOR_INTERVAL, LOOP_BLOCK_THRESHOLD
+
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+STALL_HISTORY = 20
+
+
+class LoopMonitor:
+    """Event-loop lag sampler and blocking-call detector
+
+    A task sleeps in a loop (at most `interval`, and no more than half
+    the blocking threshold); how late it wakes up is the lag every other
+    coroutine (websockets included) suffered. Each wake-up is a
+    heartbeat: a watchdog thread checks how far past its sleep the task
+    is, and when the loop has not come back for `block_threshold` seconds
+    beyond it, the loop thread's current stack is captured, which names
+    the sync call that is blocking it.
+    """
+
+    def __init__(self, interval=LOOP_MONITOR_INTERVAL, block_threshold=LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lag = Histogram(LOOP_LAG_BUCKETS)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked = 0
+        self.stalls = deque(maxlen=STALL_HISTORY)
+        self.task: Optional[asyncio.Task] = None
+        self.stop_event = threading.Event()
+        self.loop_thread_id = None
+        self.heartbeat = time.monotonic()
+        self.sleeping_for = 0.0
+        self.pending_stall = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.task is not None
+
+    def start(self):
+        """Start sampling; must be called from the event loop"""
+        if self.task is not None:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stop_event = threading.Event()
+        self.task = asyncio.create_task(self._sample_loop())
+        threading.Thread(target=self._watch, args=(self.stop_event,), name='loop-watchdog', daemon=True).start()
+
+    def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
+        self.stop_event.set()
+
+    def _step(self) -> float:
+        """Heartbeat period: short enough that no stall over the threshold goes unseen"""
+        return min(self.interval, self.block_threshold / 2)
+
+    async def _sample_loop(self):
+        while True:
+            step = self.sleeping_for = self._step()
+            await asyncio.sleep(step)
+            now = time.monotonic()
+            # Time past the requested sleep is how long the loop was held up
+            lag = max(now - self.heartbeat - step, 0.0)
+            self.heartbeat = now
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.lag.observe(lag)
+
+            if lag >= self.block_threshold:
+                self.blocked += 1
+                if self.pending_stall is not None:
+                    self.pending_stall['blocked_seconds'] = round(lag, 3)
+            self.pending_stall = None
+
+    def _watch(self, stop_event: threading.Event):
+        """Watchdog thread: dump the loop thread's stack once per stall"""
+        # Recomputed every time: /admin/loop_monitor can change the threshold
+        while not stop_event.wait(self._step() / 2):
+            # The sampler's own sleep is not a stall, only the time past it
+            late = time.monotonic() - self.heartbeat - self.sleeping_for
+            if late < self.block_threshold or self.pending_stall is not None:
+                continue
+
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            stall = {
+                'detected_at': time.time(),
+                'blocked_seconds': round(late, 3),
+                'stack': [line.rstrip() for line in stack],
+            }
+            self.pending_stall = stall
+            self.stalls.append(stall)
+            print(f"⏱️ Boucle asyncio bloquée depuis {late * 1000:.0f} ms, pile courante:\n{''.join(stack[-12:])}")
+
+    def snapshot(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'interval': self.interval,
+            'block_threshold': self.block_threshold,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'avg_lag': self.lag.sum / self.lag.count if self.lag.count else 0.0,
+            'samples': self.lag.count,
+            'blocked': self.blocked,
+            'stalls': list(self.stalls),
+        }
+
+    def render(self) -> List[str]:
+        lines = metric_header('event_loop_lag_seconds', 'histogram', 'Delay of the event loop waking up a sleeping task')
+        lines += self.lag.render('event_loop_lag_seconds', {})
+        lines += render_gauge('event_loop_lag_last_seconds', 'Most recent event loop lag sample', self.last_lag)
+        lines += render_gauge('event_loop_lag_max_seconds', 'Largest event loop lag seen', self.max_lag)
+        lines += render_gauge('event_loop_blocked_total', 'Samples where the loop was blocked past the threshold',
+                              self.blocked, kind='counter')
+        lines += render_gauge('event_loop_monitor_enabled', 'Whether the loop monitor is running', int(self.enabled))
+        return lines
+
+
+# Global instance
+loop_monitor = LoopMonitor()
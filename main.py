@@ -1,42 +1,101 @@
-from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi.responses import RedirectResponse, StreamingResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from typing import Optional, List, Any
 import os
 import json
 import uuid
+import asyncio
 from datetime import datetime
+from urllib.parse import quote
+from mysql.connector import IntegrityError
 
 # Importations locales
 from database import get_db_connection, init_database
+from json_encoder import FastJSONResponse
+from static_assets import static_assets, HashedStaticFiles
+from compression import CompressionMiddleware
+from fragment_cache import fragment_cache, LazyRows, install as install_fragment_cache
 from google_drive import drive_manager
+from storage import storage, GoogleDriveStorage
+from file_dedup import upload_deduplicated, release_file
+from download_cache import download_cache, file_response
+from stats_service import stats
+from pagination import paginate, order_clause, DEFAULT_PER_PAGE
+from export_service import build_export_query, stream_export, EXPORT_FORMATS
+from user_import import import_users, IMPORT_MAX_BYTES
+from user_search import user_index
+from call_registry import call_registry
+from call_signaling import signaling
+from sfu import sfu
+from image_pipeline import (
+    is_image, process_profile_picture, process_group_photo,
+    process_message_image, shutdown_executor, PREVIEW_WIDTH
+)
 
 from auth import (
     hash_password, verify_password, create_session, 
     get_session, delete_session, get_current_user,
-    require_auth, require_admin
+    require_auth, require_admin, sessions
 )
 from websocket_manager import manager
-from config import MAX_UPLOAD_SIZE
+from loop_monitor import loop_monitor
+from query_profiler import query_profiler, SORT_FIELDS as QUERY_SORT_FIELDS
+from metrics import MetricsMiddleware, MOUNT_PREFIXES, request_metrics, db_metrics, render_gauge, render_labeled
+from config import PUBLIC_MEDIA_FOLDERS, BULK_MAX_IDS, METRICS_TOKEN, LOOP_MONITOR_ENABLED
 
 # Initialize FastAPI app
-app = FastAPI(title="Educational Platform")
+app = FastAPI(title="Educational Platform", default_response_class=FastJSONResponse)
+# Added first = innermost: metrics time the compressed response
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
+static_assets.build()
+app.mount("/static", HashedStaticFiles(static_assets), name="static")
+MOUNT_PREFIXES.append("/static")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["static_url"] = static_assets.url
+install_fragment_cache(templates.env)
+
+# Background tasks started at startup (Drive token refresh, stats reconciliation, user index, calls)
+drive_refresh_task = None
+stats_task = None
+user_index_task = None
+call_flush_task = None
 
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
+    global drive_refresh_task, stats_task, user_index_task, call_flush_task
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
     init_database()
+    stats.reconcile()
+    stats_task = asyncio.create_task(stats.reconcile_loop())
+    user_index.load()
+    user_index_task = asyncio.create_task(user_index.refresh_loop())
+    call_registry.load(select_mode=sfu.select_mode)
+    call_flush_task = asyncio.create_task(call_registry.flush_loop())
+    sfu.start()
     try:
-        drive_manager.authenticate()
-        print("Google Drive authenticated successfully!")
+        storage.authenticate()
+        print(f"Storage backend ready: {storage.name}")
     except Exception as e:
-        print(f"Google Drive authentication failed: {e}")
+        print(f"Storage backend authentication failed: {e}")
+    if isinstance(storage, GoogleDriveStorage):
+        drive_refresh_task = asyncio.create_task(drive_manager.token_refresh_loop())
     print("Application started successfully!")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in (drive_refresh_task, stats_task, user_index_task, call_flush_task):
+        if task:
+            task.cancel()
+    call_registry.flush()
+    sfu.stop()
+    loop_monitor.stop()
+    shutdown_executor()
     
 @app.get("/drive")
 async def auth_drive_manual():
@@ -62,6 +121,109 @@ async def drive_callback(code: str):
         return RedirectResponse("/admin_panel")
     else:
         return {"error": "OAuth callback failed"}
+
+@app.get("/admin/drive_stats")
+async def drive_stats(request: Request):
+    """Drive API latency / error / quota counters per method"""
+    admin = require_admin(request)
+    return FastJSONResponse({
+        "success": True,
+        "token_expires_in": drive_manager.seconds_until_expiry(),
+        "stats": drive_manager.metrics.snapshot()
+    })
+
+@app.get("/admin/query_stats")
+async def query_stats(request: Request, limit: int = 20, sort: str = "total_seconds"):
+    """Top SQL statements by total time (or calls, rows...) since startup or last reset"""
+    admin = require_admin(request)
+    if sort not in QUERY_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort doit être parmi: {', '.join(QUERY_SORT_FIELDS)}")
+    return FastJSONResponse({
+        "success": True,
+        "enabled": query_profiler.enabled,
+        "slow_threshold_ms": query_profiler.slow_threshold * 1000,
+        "statements": query_profiler.top(min(max(limit, 1), 200), sort)
+    })
+
+@app.post("/admin/query_stats/reset")
+async def reset_query_stats(request: Request):
+    """Start a fresh profiling window"""
+    admin = require_admin(request)
+    query_profiler.reset()
+    return {"success": True}
+
+@app.get("/admin/loop_monitor")
+async def loop_monitor_status(request: Request):
+    """Event loop lag and the stacks of the latest blocking calls"""
+    admin = require_admin(request)
+    return FastJSONResponse({"success": True, "monitor": loop_monitor.snapshot()})
+
+@app.get("/admin/sfu")
+async def sfu_status(request: Request):
+    """Calls routed through the SFU, with participants and the CPU time charged to each"""
+    admin = require_admin(request)
+    return FastJSONResponse({"success": True, "sfu": sfu.snapshot()})
+
+@app.post("/admin/loop_monitor")
+async def toggle_loop_monitor(
+    request: Request,
+    enabled: bool = Form(...),
+    block_threshold_ms: Optional[int] = Form(None)
+):
+    """Start/stop the loop monitor at runtime, optionally changing the blocking threshold"""
+    admin = require_admin(request)
+    if block_threshold_ms is not None:
+        if block_threshold_ms < 10:
+            raise HTTPException(status_code=400, detail="Seuil minimum: 10 ms")
+        loop_monitor.block_threshold = block_threshold_ms / 1000
+    if enabled:
+        loop_monitor.start()
+    else:
+        loop_monitor.stop()
+    return {"success": True, "enabled": loop_monitor.enabled, "block_threshold": loop_monitor.block_threshold}
+
+@app.get("/metrics")
+async def prometheus_metrics(request: Request):
+    """Prometheus text exposition: HTTP, websockets, sessions, DB, Drive and caches
+
+    Scrapers authenticate with METRICS_TOKEN; without a token configured,
+    only a logged-in admin can read it.
+    """
+    if METRICS_TOKEN:
+        if request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+            raise HTTPException(status_code=401, detail="Unauthorized")
+    else:
+        require_admin(request)
+    
+    lines = request_metrics.render()
+    lines += render_labeled('websocket_connections', 'Open websocket connections and tracked rooms',
+                            [({'kind': kind}, count) for kind, count in manager.connection_counts().items()])
+    lines += render_gauge('auth_sessions', 'In-memory login sessions', len(sessions))
+    lines += render_gauge('video_calls_active', 'Calls tracked by the call registry', len(call_registry.calls))
+    lines += sfu.render()
+    lines += render_labeled('call_signaling_total', 'Call signaling frames and ICE candidates relayed',
+                            [({'kind': kind}, count) for kind, count in signaling.stats().items()], kind='counter')
+    lines += db_metrics.render()
+    lines += loop_monitor.render()
+    
+    drive = drive_manager.metrics.snapshot()
+    for field, name, help_text in (
+        ('calls', 'drive_api_calls_total', 'Google Drive API calls'),
+        ('errors', 'drive_api_errors_total', 'Google Drive API errors'),
+        ('quota_errors', 'drive_api_quota_errors_total', 'Google Drive API quota rejections'),
+        ('total_seconds', 'drive_api_seconds_total', 'Time spent in Google Drive API calls'),
+    ):
+        lines += render_labeled(name, help_text, [({'method': method}, s[field]) for method, s in drive.items()],
+                                kind='counter')
+    
+    lines += render_gauge('download_cache_hits_total', 'Download cache hits', download_cache.hits, kind='counter')
+    lines += render_gauge('download_cache_misses_total', 'Download cache misses', download_cache.misses, kind='counter')
+    lines += render_gauge('download_cache_bytes', 'Bytes held in the download cache', download_cache.total_bytes)
+    lines += render_gauge('download_cache_entries', 'Files held in the download cache', len(download_cache.entries))
+    lines += render_labeled('app_entities', 'Admin dashboard counters',
+                            [({'counter': name}, value) for name, value in stats.snapshot().items()])
+    
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 # ============================================================================
 # AUTHENTICATION ROUTES
 # ============================================================================
@@ -87,6 +249,7 @@ async def inscription_page(request: Request):
 
 @app.post("/inscription")
 async def register(
+    background_tasks: BackgroundTasks,
     first_name: str = Form(...),
     last_name: str = Form(None),
     phone: str = Form(...),
@@ -118,16 +281,17 @@ async def register(
         
         # Upload profile picture if provided
         profile_pic_url = None
+        profile_pic_result = None
         if profile_picture and profile_picture.filename:
-            file_bytes = await profile_picture.read()
             file_name = f"{uuid.uuid4()}_{profile_picture.filename}"
-            result = drive_manager.upload_file_from_bytes(
-                file_bytes, 
-                file_name, 
-                profile_picture.content_type,
+            result = await upload_deduplicated(
+                conn,
+                profile_picture,
+                file_name,
                 "profile_pictures"
             )
             if result:
+                profile_pic_result = result
                 #profile_pic_url = result['webContentLink']
                 #profile_pic_url = drive_manager.get_direct_image_url(result['id'])
                 profile_pic_url = result['directImageUrl']  # Utilise l'URL d'image directe
@@ -140,10 +304,27 @@ async def register(
             INSERT INTO users (first_name, last_name, phone, password, class_level, filiere, profile_picture)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
         """, (first_name, last_name, phone, hashed_pwd, class_level, filiere, profile_pic_url))
+        user_id = cursor.lastrowid
         
         conn.commit()
+        stats.incr('total_users')
+        user_index.upsert({
+            'id': user_id,
+            'first_name': first_name,
+            'last_name': last_name,
+            'class_level': class_level,
+            'profile_picture': profile_pic_url
+        })
         
-        return JSONResponse({"success": True, "message": "Inscription réussie!"})
+        # Thumbnails generated after the response, in the image process pool
+        if profile_pic_result and is_image(profile_picture):
+            await profile_picture.seek(0)
+            background_tasks.add_task(
+                process_profile_picture, user_id, profile_pic_result['id'],
+                await profile_picture.read(), profile_picture.filename
+            )
+        
+        return FastJSONResponse({"success": True, "message": "Inscription réussie!"})
     
     except Exception as e:
         conn.rollback()
@@ -169,7 +350,7 @@ async def login(
         raise HTTPException(status_code=500, detail="Database connection failed")
     
     cursor = conn.cursor(dictionary=True)
-    response = JSONResponse({"success": False})
+    response = FastJSONResponse({"success": False})
     
     try:
         if user_type == "admin":
@@ -181,7 +362,7 @@ async def login(
                 raise HTTPException(status_code=401, detail="Identifiants incorrects")
             
             session_id = create_session(admin['id'], 'admin', admin)
-            response = JSONResponse({"success": True, "redirect": "/admin_panel"})
+            response = FastJSONResponse({"success": True, "redirect": "/admin_panel"})
             response.set_cookie(key="admin_session_id", value=session_id, httponly=True)
         else:
             # User login
@@ -197,7 +378,7 @@ async def login(
             session_id = create_session(user['id'], user['user_type'], user)
             
             redirect_url = "/pg_pro" if user['user_type'] == 'pro' else "/pg_gr"
-            response = JSONResponse({"success": True, "redirect": redirect_url})
+            response = FastJSONResponse({"success": True, "redirect": redirect_url})
             response.set_cookie(key="session_id", value=session_id, httponly=True)
         
         return response
@@ -230,33 +411,36 @@ async def logout(request: Request):
 # USER PROFILE ROUTES
 # ============================================================================
 
+def lazy_query(query: str, params: tuple = ()) -> LazyRows:
+    """Rows of a SELECT, run only if a template iterates them"""
+    def load():
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+    return LazyRows(load)
+
 @app.get("/pg_pro")
 async def page_pro(request: Request):
     """Pro user page"""
     user = require_auth(request, ['pro', 'admin'])
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Get contents for pro users
-    cursor.execute("""
+    # Queried only when the cached fragments are stale
+    contents = lazy_query("""
         SELECT * FROM contents 
         WHERE access_type IN ('free', 'pro')
         ORDER BY created_at DESC
     """)
-    contents = cursor.fetchall()
-    
-    # Get publications
-    cursor.execute("""
+    publications = lazy_query("""
         SELECT * FROM admin_publications 
         WHERE target_audience IN ('all', 'pro')
         ORDER BY created_at DESC
         LIMIT 10
     """)
-    publications = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
     
     return templates.TemplateResponse("pg_pro.html", {
         "request": request,
@@ -270,28 +454,18 @@ async def page_free(request: Request):
     """Free user page"""
     user = require_auth(request, ['free'])
     
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Get free contents only
-    cursor.execute("""
+    # Free contents only, queried only when the cached fragments are stale
+    contents = lazy_query("""
         SELECT * FROM contents 
         WHERE access_type = 'free'
         ORDER BY created_at DESC
     """)
-    contents = cursor.fetchall()
-    
-    # Get publications
-    cursor.execute("""
+    publications = lazy_query("""
         SELECT * FROM admin_publications 
         WHERE target_audience IN ('all', 'free')
         ORDER BY created_at DESC
         LIMIT 10
     """)
-    publications = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
     
     return templates.TemplateResponse("pg_gr.html", {
         "request": request,
@@ -305,6 +479,7 @@ async def page_free(request: Request):
 @app.post("/update_profile")
 async def update_profile(
     request: Request,
+    background_tasks: BackgroundTasks,
     first_name: str = Form(None),
     last_name: str = Form(None),
     phone: str = Form(None),
@@ -340,26 +515,34 @@ async def update_profile(
         
         # Handle profile picture - PARTIE MODIFIÉE
         if profile_picture and profile_picture.filename:
-            file_bytes = await profile_picture.read()
             file_name = f"{uuid.uuid4()}_{profile_picture.filename}"
-            result = drive_manager.upload_file_from_bytes(
-                file_bytes,
+            result = await upload_deduplicated(
+                conn,
+                profile_picture,
                 file_name,
-                profile_picture.content_type,
                 "profile_pictures"
             )
             if result:
                 updates.append("profile_picture = %s")
                 # Utilisez directImageUrl pour l'affichage dans le HTML
                 params.append(result['directImageUrl'])
+                # Old thumbnail is stale until the new one is generated
+                updates.append("profile_picture_thumb = NULL")
+                if is_image(profile_picture):
+                    await profile_picture.seek(0)
+                    background_tasks.add_task(
+                        process_profile_picture, user['id'], result['id'],
+                        await profile_picture.read(), profile_picture.filename
+                    )
         
         if updates:
             params.append(user['id'])
             query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s"
             cursor.execute(query, params)
             conn.commit()
+            user_index.refresh_user(user['id'], conn)
         
-        return JSONResponse({"success": True, "message": "Profil mis à jour"})
+        return FastJSONResponse({"success": True, "message": "Profil mis à jour"})
     
     except Exception as e:
         conn.rollback()
@@ -392,7 +575,7 @@ async def change_password(
         cursor.execute("UPDATE users SET password = %s WHERE id = %s", (new_hash, user['id']))
         conn.commit()
         
-        return JSONResponse({"success": True, "message": "Mot de passe changé"})
+        return FastJSONResponse({"success": True, "message": "Mot de passe changé"})
     
     except Exception as e:
         conn.rollback()
@@ -412,13 +595,14 @@ async def delete_account(request: Request):
     try:
         cursor.execute("UPDATE users SET is_active = FALSE WHERE id = %s", (user['id'],))
         conn.commit()
+        user_index.remove(user['id'])
         
         # Logout user
         session_id = request.cookies.get('session_id')
         if session_id:
             delete_session(session_id)
         
-        response = JSONResponse({"success": True, "message": "Compte supprimé"})
+        response = FastJSONResponse({"success": True, "message": "Compte supprimé"})
         response.delete_cookie("session_id")
         return response
     
@@ -454,7 +638,7 @@ async def start_private_chat(request: Request, other_user_id: int = Form(...)):
         
         existing = cursor.fetchone()
         if existing:
-            return JSONResponse({"success": True, "conversation_id": existing['id']})
+            return FastJSONResponse({"success": True, "conversation_id": existing['id']})
         
         # Create new conversation
         cursor.execute("""
@@ -475,7 +659,7 @@ async def start_private_chat(request: Request, other_user_id: int = Form(...)):
         manager.add_to_conversation(conversation_id, user['id'])
         manager.add_to_conversation(conversation_id, other_user_id)
         
-        return JSONResponse({"success": True, "conversation_id": conversation_id})
+        return FastJSONResponse({"success": True, "conversation_id": conversation_id})
     
     except Exception as e:
         conn.rollback()
@@ -485,11 +669,11 @@ async def start_private_chat(request: Request, other_user_id: int = Form(...)):
         conn.close()
 
 
-from json_encoder import convert_datetime_to_string
 
 @app.post("/send_private_message")
 async def send_private_message(
     request: Request,
+    background_tasks: BackgroundTasks,
     conversation_id: int = Form(...),
     message_type: str = Form("text"),
     content: str = Form(None),
@@ -516,7 +700,6 @@ async def send_private_message(
         
         # Handle file upload
         if file and file.filename:
-            file_bytes = await file.read()
             file_name = f"{uuid.uuid4()}_{file.filename}"
             
             # Determine folder based on file type
@@ -526,16 +709,22 @@ async def send_private_message(
             elif message_type == "video":
                 folder = "shared_files/videos"
             
-            result = drive_manager.upload_file_from_bytes(
-                file_bytes,
+            # Same content already sent somewhere: reuse it instead of re-uploading
+            result = await upload_deduplicated(
+                conn,
+                file,
                 file_name,
-                file.content_type,
                 folder
             )
             
             if result:
                 file_url = result['webContentLink']
                 drive_file_id = result['id']
+                if message_type == "image" and is_image(file):
+                    await file.seek(0)
+                    background_tasks.add_task(
+                        process_message_image, drive_file_id, await file.read(), file.filename
+                    )
         
         # Insert message
         cursor.execute("""
@@ -548,23 +737,21 @@ async def send_private_message(
         
         # Get full message data
         cursor.execute("""
-            SELECT m.*, u.first_name, u.last_name, u.profile_picture
+            SELECT m.*, u.first_name, u.last_name,
+                   COALESCE(u.profile_picture_thumb, u.profile_picture) as profile_picture
             FROM messages m
             JOIN users u ON m.sender_id = u.id
             WHERE m.id = %s
         """, (message_id,))
         message_data = cursor.fetchone()
         
-        # Convert datetime to string for JSON serialization
-        message_data_serializable = convert_datetime_to_string(message_data)
-        
         # Broadcast to conversation participants
         await manager.broadcast_to_conversation({
             "type": "new_message",
-            "message": message_data_serializable
+            "message": message_data
         }, conversation_id)
         
-        return JSONResponse({"success": True, "message": message_data_serializable})
+        return FastJSONResponse({"success": True, "message": message_data})
     
     except Exception as e:
         conn.rollback()
@@ -595,19 +782,20 @@ async def get_private_messages(request: Request, conversation_id: int):
         
         # Get messages
         cursor.execute("""
-            SELECT m.*, u.first_name, u.last_name, u.profile_picture
+            SELECT m.*, u.first_name, u.last_name,
+                   COALESCE(u.profile_picture_thumb, u.profile_picture) as profile_picture,
+                   iv.url as thumbnail_url
             FROM messages m
             JOIN users u ON m.sender_id = u.id
+            LEFT JOIN image_variants iv
+                   ON iv.source_file_id = m.drive_file_id AND iv.width = %s AND iv.format = 'webp'
             WHERE m.conversation_id = %s
             ORDER BY m.created_at ASC
-        """, (conversation_id,))
+        """, (PREVIEW_WIDTH, conversation_id))
         
         messages = cursor.fetchall()
         
-        # Convert datetime objects to strings
-        messages_serializable = convert_datetime_to_string(messages)
-        
-        return JSONResponse({"success": True, "messages": messages_serializable})
+        return FastJSONResponse({"success": True, "messages": messages})
     
     finally:
         cursor.close()
@@ -727,7 +915,7 @@ async def groupe_free_page(request: Request):
             
 #             conn.commit()
             
-#             return JSONResponse({"success": True, "message": "Groupe créé", "group_id": group_id})
+#             return FastJSONResponse({"success": True, "message": "Groupe créé", "group_id": group_id})
 #         else:
 #             # Free users need approval
 #             cursor.execute("""
@@ -737,7 +925,7 @@ async def groupe_free_page(request: Request):
             
 #             conn.commit()
             
-#             return JSONResponse({"success": True, "message": "Demande envoyée pour approbation"})
+#             return FastJSONResponse({"success": True, "message": "Demande envoyée pour approbation"})
     
 #     except Exception as e:
 #         conn.rollback()
@@ -749,6 +937,7 @@ async def groupe_free_page(request: Request):
 @app.post("/create_group_request")
 async def create_group_request(
     request: Request,
+    background_tasks: BackgroundTasks,
     group_name: str = Form(...),
     description: str = Form(None),
     group_photo: UploadFile = File(None)
@@ -763,16 +952,17 @@ async def create_group_request(
         if user['user_type'] == 'pro':
             # Pro users can create groups directly - PARTIE MODIFIÉE
             group_photo_url = None
+            group_photo_result = None
             if group_photo and group_photo.filename:
-                file_bytes = await group_photo.read()
                 file_name = f"{uuid.uuid4()}_{group_photo.filename}"
-                result = drive_manager.upload_file_from_bytes(
-                    file_bytes,
+                result = await upload_deduplicated(
+                    conn,
+                    group_photo,
                     file_name,
-                    group_photo.content_type,
                     "group_avatars"
                 )
                 if result:
+                    group_photo_result = result
                     group_photo_url = result['directImageUrl']  # ← CHANGÉ ICI
             
             cursor.execute("""
@@ -790,7 +980,14 @@ async def create_group_request(
             
             conn.commit()
             
-            return JSONResponse({"success": True, "message": "Groupe créé", "group_id": group_id})
+            if group_photo_result and is_image(group_photo):
+                await group_photo.seek(0)
+                background_tasks.add_task(
+                    process_group_photo, group_id, group_photo_result['id'],
+                    await group_photo.read(), group_photo.filename
+                )
+            
+            return FastJSONResponse({"success": True, "message": "Groupe créé", "group_id": group_id})
         else:
             # Free users need approval
             cursor.execute("""
@@ -799,8 +996,9 @@ async def create_group_request(
             """, (group_name, description, user['id']))
             
             conn.commit()
+            stats.incr('pending_groups')
             
-            return JSONResponse({"success": True, "message": "Demande envoyée pour approbation"})
+            return FastJSONResponse({"success": True, "message": "Demande envoyée pour approbation"})
     
     except Exception as e:
         conn.rollback()
@@ -831,7 +1029,8 @@ async def group_chat_page(request: Request, group_id: int):
     
     # Get members
     cursor.execute("""
-        SELECT u.id, u.first_name, u.last_name, u.profile_picture, cp.role
+        SELECT u.id, u.first_name, u.last_name,
+               COALESCE(u.profile_picture_thumb, u.profile_picture) as profile_picture, cp.role
         FROM users u
         JOIN conversation_participants cp ON u.id = cp.user_id
         WHERE cp.conversation_id = %s
@@ -851,13 +1050,14 @@ async def group_chat_page(request: Request, group_id: int):
 @app.post("/send_group_message")
 async def send_group_message(
     request: Request,
+    background_tasks: BackgroundTasks,
     conversation_id: int = Form(...),
     message_type: str = Form("text"),
     content: str = Form(None),
     file: UploadFile = File(None)
 ):
     """Send message in group"""
-    return await send_private_message(request, conversation_id, message_type, content, file)
+    return await send_private_message(request, background_tasks, conversation_id, message_type, content, file)
 
 # @app.post("/invite_members")
 # async def invite_members(
@@ -897,7 +1097,7 @@ async def send_group_message(
 #                 pass  # Skip if already member
         
 #         conn.commit()
-#         return JSONResponse({"success": True, "message": "Membres invités"})
+#         return FastJSONResponse({"success": True, "message": "Membres invités"})
     
 #     except Exception as e:
 #         conn.rollback()
@@ -994,8 +1194,9 @@ async def toggle_user_active(request: Request, user_id: int):
             UPDATE users SET is_active = NOT is_active WHERE id = %s
         """, (user_id,))
         conn.commit()
+        user_index.refresh_user(user_id, conn)
         
-        return JSONResponse({"success": True, "message": "Statut modifié"})
+        return FastJSONResponse({"success": True, "message": "Statut modifié"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1017,7 +1218,7 @@ async def verify_user(request: Request, user_id: int):
         """, (user_id,))
         conn.commit()
         
-        return JSONResponse({"success": True, "message": "Utilisateur vérifié"})
+        return FastJSONResponse({"success": True, "message": "Utilisateur vérifié"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1045,7 +1246,7 @@ async def issue_warning(
         """, (user_id, admin['id'], reason, warning_type))
         conn.commit()
         
-        return JSONResponse({"success": True, "message": "Avertissement envoyé"})
+        return FastJSONResponse({"success": True, "message": "Avertissement envoyé"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1072,16 +1273,15 @@ async def admin_upload_content(
     
     try:
         # Upload to Drive
-        file_bytes = await file.read()
         file_name = f"{uuid.uuid4()}_{file.filename}"
         
         # Determine folder
         folder = f"educational_content/{content_type}"
         
-        result = drive_manager.upload_file_from_bytes(
-            file_bytes,
+        result = await upload_deduplicated(
+            conn,
+            file,
             file_name,
-            file.content_type,
             folder
         )
         
@@ -1097,8 +1297,10 @@ async def admin_upload_content(
               content_type, access_type, class_level, subject, admin['id']))
         
         conn.commit()
+        stats.incr('total_contents')
+        fragment_cache.bump('contents')
         
-        return JSONResponse({"success": True, "message": "Contenu uploadé"})
+        return FastJSONResponse({"success": True, "message": "Contenu uploadé"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1119,14 +1321,19 @@ async def delete_content(request: Request, content_id: int):
         cursor.execute("SELECT drive_file_id FROM contents WHERE id = %s", (content_id,))
         content = cursor.fetchone()
         
-        if content and content['drive_file_id']:
-            drive_manager.delete_file(content['drive_file_id'])
+        # Only delete the stored file if no other row still shares it
+        if content and content['drive_file_id'] and release_file(conn, content['drive_file_id']):
+            storage.delete_file(content['drive_file_id'])
+            download_cache.invalidate(content['drive_file_id'])
         
         # Delete from database
         cursor.execute("DELETE FROM contents WHERE id = %s", (content_id,))
+        deleted = cursor.rowcount
         conn.commit()
+        stats.decr('total_contents', deleted)
+        fragment_cache.bump('contents')
         
-        return JSONResponse({"success": True, "message": "Contenu supprimé"})
+        return FastJSONResponse({"success": True, "message": "Contenu supprimé"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1152,8 +1359,9 @@ async def toggle_content_access(request: Request, content_id: int):
             WHERE id = %s
         """, (content_id,))
         conn.commit()
+        fragment_cache.bump('contents')
         
-        return JSONResponse({"success": True, "message": "Accès modifié"})
+        return FastJSONResponse({"success": True, "message": "Accès modifié"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1180,8 +1388,9 @@ async def create_publication(
             VALUES (%s, %s, %s, %s)
         """, (admin['id'], title, content, target_audience))
         conn.commit()
+        fragment_cache.bump('publications')
         
-        return JSONResponse({"success": True, "message": "Publication créée"})
+        return FastJSONResponse({"success": True, "message": "Publication créée"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1200,8 +1409,9 @@ async def delete_publication(request: Request, pub_id: int):
     try:
         cursor.execute("DELETE FROM admin_publications WHERE id = %s", (pub_id,))
         conn.commit()
+        fragment_cache.bump('publications')
         
-        return JSONResponse({"success": True, "message": "Publication supprimée"})
+        return FastJSONResponse({"success": True, "message": "Publication supprimée"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1227,6 +1437,15 @@ async def approve_group(request: Request, request_id: int):
         if not req:
             raise HTTPException(status_code=404, detail="Request not found")
         
+        # Claim the request first: a concurrent approval finds nothing left to update
+        cursor.execute("""
+            UPDATE group_requests SET status = 'approved', reviewed_at = NOW()
+            WHERE id = %s AND status = 'pending'
+        """, (request_id,))
+        approved = cursor.rowcount
+        if not approved:
+            raise HTTPException(status_code=404, detail="Request not found")
+        
         # Create group
         cursor.execute("""
             INSERT INTO conversations (name, conversation_type, created_by, description)
@@ -1241,15 +1460,10 @@ async def approve_group(request: Request, request_id: int):
             VALUES (%s, %s, 'admin')
         """, (group_id, req['requested_by']))
         
-        # Update request status
-        cursor.execute("""
-            UPDATE group_requests SET status = 'approved', reviewed_at = NOW()
-            WHERE id = %s
-        """, (request_id,))
-        
         conn.commit()
+        stats.decr('pending_groups', approved)
         
-        return JSONResponse({"success": True, "message": "Groupe approuvé"})
+        return FastJSONResponse({"success": True, "message": "Groupe approuvé"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1268,11 +1482,13 @@ async def reject_group(request: Request, request_id: int):
     try:
         cursor.execute("""
             UPDATE group_requests SET status = 'rejected', reviewed_at = NOW()
-            WHERE id = %s
+            WHERE id = %s AND status = 'pending'
         """, (request_id,))
+        rejected = cursor.rowcount
         conn.commit()
+        stats.decr('pending_groups', rejected)
         
-        return JSONResponse({"success": True, "message": "Demande rejetée"})
+        return FastJSONResponse({"success": True, "message": "Demande rejetée"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1280,6 +1496,92 @@ async def reject_group(request: Request, request_id: int):
         cursor.close()
         conn.close()
 
+# ============================================================================
+# FILE DOWNLOAD PROXY
+# ============================================================================
+
+def check_file_access(cursor, user: dict, file_id: str):
+    """Raise unless the user may read a stored file
+
+    Profile and group photos are readable by everyone logged in,
+    educational contents by their audience (PRO ones by PRO users),
+    attachments by the members of their conversation; an image variant
+    follows its source file. Anything else is reported as not found.
+    """
+    cursor.execute("""
+        SELECT source_file_id FROM image_variants WHERE file_id = %s LIMIT 1
+    """, (file_id,))
+    variant = cursor.fetchone()
+    if variant:
+        file_id = variant['source_file_id']
+    
+    if file_id.startswith(PUBLIC_MEDIA_FOLDERS):
+        return
+    
+    cursor.execute("""
+        SELECT access_type FROM contents WHERE drive_file_id = %s LIMIT 1
+    """, (file_id,))
+    content = cursor.fetchone()
+    if content:
+        # PRO content stays reserved to PRO users
+        if content['access_type'] == 'pro' and user['user_type'] not in ('pro', 'admin'):
+            raise HTTPException(status_code=403, detail="Contenu réservé aux membres PRO")
+        return
+    
+    cursor.execute("""
+        SELECT m.id FROM messages m
+        JOIN conversation_participants cp
+            ON cp.conversation_id = m.conversation_id AND cp.user_id = %s
+        WHERE m.drive_file_id = %s LIMIT 1
+    """, (user['id'], file_id))
+    if cursor.fetchone():
+        return
+    
+    # Unknown ids and other conversations' attachments look the same: not found
+    raise HTTPException(status_code=404, detail="Fichier introuvable")
+
+@app.get("/media/{file_id:path}")
+async def legacy_media_file(file_id: str):
+    """Local-storage URLs saved before /files checked access"""
+    return RedirectResponse(url=f"/files/{quote(file_id)}", status_code=301)
+
+@app.get("/files/{file_id:path}")
+async def download_file(request: Request, file_id: str):
+    """Stream a stored file through the local cache (Range + ETag support)
+
+    This is the only route serving uploads, local backend included.
+    Admins (payment proofs, contents) can read every file; users only
+    what check_file_access allows.
+    On a cache miss the response follows the download as it is written
+    to the cache, so the first viewer does not wait for the whole file.
+    """
+    admin_session = get_session(request.cookies.get('admin_session_id') or '')
+    if not admin_session or admin_session['user_type'] != 'admin':
+        user = require_auth(request)
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            check_file_access(cursor, user, file_id)
+        finally:
+            cursor.close()
+            conn.close()
+    
+    # Local backend: the file is already on disk, no need to cache it
+    path = storage.local_path(file_id)
+    if path:
+        metadata = storage.get_file_metadata(file_id)
+        stat = os.stat(path)
+        return file_response(request, path, stat.st_size, metadata['mimeType'],
+                             f"{int(stat.st_mtime)}-{stat.st_size}", metadata['name'])
+    
+    entry = await download_cache.fetch(file_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+    
+    return file_response(request, entry['path'], entry['size'], entry['mime_type'],
+                         entry['etag'], entry['name'], filling=entry if 'fill' in entry else None)
+
 # ============================================================================
 # VIDEO CALL ROUTES
 # ============================================================================
@@ -1299,11 +1601,13 @@ async def start_group_call(
     try:
         # Verify user is in conversation
         cursor.execute("""
-            SELECT id FROM conversation_participants 
-            WHERE conversation_id = %s AND user_id = %s
+            SELECT c.name FROM conversation_participants cp
+            JOIN conversations c ON c.id = cp.conversation_id
+            WHERE cp.conversation_id = %s AND cp.user_id = %s
         """, (conversation_id, user['id']))
         
-        if not cursor.fetchone():
+        conversation = cursor.fetchone()
+        if not conversation:
             raise HTTPException(status_code=403, detail="Not in this conversation")
         
         # Create call
@@ -1321,6 +1625,10 @@ async def start_group_call(
         """, (conversation_id,))
         
         participants = [row['user_id'] for row in cursor.fetchall()]
+        # Large groups go through the SFU when it is available
+        mode = sfu.select_mode(len(participants))
+        call_registry.start(call_id, conversation_id, user['id'], call_type, participants, conversation['name'],
+                            mode=mode)
         
         # Send notifications
         await manager.broadcast_to_multiple({
@@ -1328,12 +1636,14 @@ async def start_group_call(
             "call_id": call_id,
             "conversation_id": conversation_id,
             "initiated_by": user['first_name'],
-            "call_type": call_type
+            "call_type": call_type,
+            "mode": mode
         }, participants)
         
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True, 
             "call_id": call_id,
+            "mode": mode,
             "message": "Appel démarré"
         })
     except Exception as e:
@@ -1348,6 +1658,18 @@ async def video_call_page(request: Request, call_id: int):
     """Video call page"""
     user = require_auth(request)
     
+    active_call = call_registry.get(call_id)
+    if active_call:
+        if not call_registry.check_member(call_id, user['id']):
+            raise HTTPException(status_code=403, detail="Not in this conversation")
+        return templates.TemplateResponse("video_call.html", {
+            "request": request,
+            "user": user,
+            "call": {**call_registry.summary(active_call), "id": call_id,
+                     "conversation_name": active_call['conversation_name'], "status": "active"}
+        })
+    
+    # Ended (or unknown) call: details come from the database
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
@@ -1375,51 +1697,87 @@ async def video_call_page(request: Request, call_id: int):
 @app.websocket("/ws/call/{call_id}/{user_id}")
 async def websocket_call_endpoint(websocket: WebSocket, call_id: int, user_id: int):
     """WebSocket for WebRTC signaling"""
+    # The path user_id must be the logged-in user, and a member of the call's conversation
+    user = get_current_user(websocket)
+    if not user or user['id'] != user_id or not call_registry.check_member(call_id, user_id):
+        await websocket.close(code=4403)
+        return
+    
+    call = call_registry.get(call_id)
+    if call['mode'] == 'sfu':
+        refused = sfu.admit(call_id, user_id)
+        if refused:
+            await websocket.accept()
+            await websocket.send_json({"type": refused})
+            await websocket.close(code=4409)
+            return
+    
     await manager.connect_call(websocket, call_id, user_id)
+    call_registry.join(call_id, user_id)
     
     try:
         while True:
             data = await websocket.receive_json()
             
-            # Broadcast signaling data to other participants
-            await manager.broadcast_to_call(
-                {
-                    "from": user_id,
-                    "type": data.get("type"),
-                    "data": data.get("data")
-                },
-                call_id,
-                exclude_user=user_id
-            )
+            if call['mode'] == 'sfu':
+                # The server is the only peer: it answers join and sfu-answer itself
+                try:
+                    await sfu.handle(call_id, call['initiated_by'], user_id, data)
+                except Exception as e:
+                    # Bad SDP from one client must not end its session
+                    print(f"⚠️ SFU: message {data.get('type')} de {user_id} rejeté (appel {call_id}): {e}")
+            else:
+                # Offers, answers and ICE go to data["to"] only; join is broadcast
+                await signaling.relay(call_id, user_id, data)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any exit (disconnect, invalid JSON, ...) frees the participant's slot
         manager.disconnect_call(call_id, user_id)
+        call_registry.leave(call_id, user_id)
+        signaling.forget(call_id, user_id)
+        if call['mode'] == 'sfu':
+            await sfu.leave(call_id, user_id)
         await manager.broadcast_to_call({
             "type": "user_left",
+            "from": user_id,
             "user_id": user_id
         }, call_id)
 
 @app.post("/end_call")
 async def end_call(request: Request, call_id: int = Form(...)):
-    """End a video call"""
+    """Leave a video call; it ends when its initiator leaves or the last participant does
+
+    The end is written to the database by the registry's next flush.
+    """
     user = require_auth(request)
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    call = call_registry.get(call_id)
+    if call is None:
+        # Ending an already ended call is a no-op
+        return FastJSONResponse({"success": True, "message": "Appel terminé"})
+    if not call_registry.check_member(call_id, user['id']):
+        raise HTTPException(status_code=403, detail="Not in this conversation")
+    
+    empty = call_registry.leave(call_id, user['id'])
+    if user['id'] != call['initiated_by'] and not empty:
+        if call['mode'] == 'sfu':
+            await sfu.leave(call_id, user['id'])
+        return FastJSONResponse({"success": True, "message": "Vous avez quitté l'appel"})
+    
+    call_registry.end(call_id)
+    await sfu.close_call(call_id)
+    await manager.broadcast_to_call({"type": "call_ended", "from": user['id']}, call_id)
+    return FastJSONResponse({"success": True, "message": "Appel terminé"})
+
+@app.get("/active_calls/{conversation_id}")
+async def active_calls(request: Request, conversation_id: int):
+    """Calls in progress in a conversation, with who is connected (served from memory)"""
+    user = require_auth(request)
     
-    try:
-        cursor.execute("""
-            UPDATE video_calls SET status = 'ended', ended_at = NOW()
-            WHERE id = %s
-        """, (call_id,))
-        conn.commit()
-        
-        return JSONResponse({"success": True, "message": "Appel terminé"})
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
+    calls = [call for call in call_registry.active_for_conversation(conversation_id)
+             if call_registry.check_member(call['call_id'], user['id'])]
+    return FastJSONResponse({"success": True, "calls": calls})
 
 # ============================================================================
 # WEBSOCKET FOR NOTIFICATIONS
@@ -1471,19 +1829,30 @@ async def submit_pro_upgrade(
     transaction_id: str = Form(...),
     proof_image: UploadFile = File(...)
 ):
-    """Soumettre une demande d'upgrade PRO"""
+    """Soumettre une demande d'upgrade PRO
+
+    The (transaction_id, operator) pair is the idempotency key: a retry
+    of the same submission returns the request already recorded.
+    """
     user = require_auth(request, ['free'])
+    transaction_id = transaction_id.strip()
     
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(dictionary=True)
     
     try:
+        # Retry (double tap, mobile network resend): answer without re-uploading the proof
+        existing = find_pro_upgrade_request(cursor, transaction_id, operator)
+        if existing:
+            return pro_upgrade_retry_response(existing, user)
+        
         # Upload proof image to Google Drive
         proof_url = None
+        proof_file_id = None
         if proof_image and proof_image.filename:
             file_bytes = await proof_image.read()
             file_name = f"proof_{user['id']}_{uuid.uuid4()}_{proof_image.filename}"
-            result = drive_manager.upload_file_from_bytes(
+            result = storage.upload_file_from_bytes(
                 file_bytes,
                 file_name,
                 proof_image.content_type,
@@ -1491,21 +1860,38 @@ async def submit_pro_upgrade(
             )
             if result:
                 proof_url = result['webContentLink']
+                proof_file_id = result['id']
         
         # Insert request
-        cursor.execute("""
-            INSERT INTO pro_upgrade_requests 
-            (user_id, operator, phone_number, amount, transaction_id, proof_image)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (user['id'], operator, phone_number, amount, transaction_id, proof_url))
-        
+        try:
+            cursor.execute("""
+                INSERT INTO pro_upgrade_requests 
+                (user_id, operator, phone_number, amount, transaction_id, proof_image)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (user['id'], operator, phone_number, amount, transaction_id, proof_url))
+        except IntegrityError:
+            # A concurrent retry won the race on the unique index
+            conn.rollback()
+            if proof_file_id:
+                storage.delete_file(proof_file_id)
+            existing = find_pro_upgrade_request(cursor, transaction_id, operator)
+            if not existing:
+                raise
+            return pro_upgrade_retry_response(existing, user)
+        
+        request_id = cursor.lastrowid
         conn.commit()
+        stats.incr('pending_pro_upgrades')
         
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True, 
-            "message": "Demande envoyée avec succès! Un admin va la vérifier."
+            "message": "Demande envoyée avec succès! Un admin va la vérifier.",
+            "request_id": request_id
         })
     
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1513,6 +1899,32 @@ async def submit_pro_upgrade(
         cursor.close()
         conn.close()
 
+def find_pro_upgrade_request(cursor, transaction_id, operator):
+    """Look up a PRO request by its idempotency key (unique index)"""
+    cursor.execute("""
+        SELECT id, user_id, status, created_at FROM pro_upgrade_requests
+        WHERE transaction_id = %s AND operator = %s
+    """, (transaction_id, operator))
+    return cursor.fetchone()
+
+def pro_upgrade_retry_response(existing, user):
+    """Answer a resubmitted transaction: same user gets its request back"""
+    if existing['user_id'] != user['id']:
+        raise HTTPException(status_code=409, detail="Cet ID de transaction a déjà été utilisé")
+    
+    messages = {
+        'pending': "Demande déjà reçue, elle est en cours de vérification.",
+        'approved': "Cette transaction a déjà été validée.",
+        'rejected': "Cette transaction a déjà été rejetée."
+    }
+    return FastJSONResponse({
+        "success": True,
+        "duplicate": True,
+        "message": messages.get(existing['status'], messages['pending']),
+        "request_id": existing['id'],
+        "status": existing['status']
+    })
+
 @app.get("/my_pro_requests")
 async def my_pro_requests(request: Request):
     """Voir mes demandes d'upgrade PRO"""
@@ -1530,10 +1942,7 @@ async def my_pro_requests(request: Request):
         
         requests = cursor.fetchall()
         
-        # Convert datetime objects to strings for JSON serialization
-        requests_serializable = convert_datetime_to_string(requests)
-        
-        return JSONResponse({"success": True, "requests": requests_serializable})
+        return FastJSONResponse({"success": True, "requests": requests})
     finally:
         cursor.close()
         conn.close()
@@ -1605,21 +2014,27 @@ async def approve_pro_upgrade(request: Request, request_id: int):
         if not upgrade_request:
             raise HTTPException(status_code=404, detail="Demande non trouvée ou déjà traitée")
         
-        # Update user to PRO
+        # Update user to PRO (no-op if they already are)
         cursor.execute("""
-            UPDATE users SET user_type = 'pro' WHERE id = %s
+            UPDATE users SET user_type = 'pro' WHERE id = %s AND user_type != 'pro'
         """, (upgrade_request['user_id'],))
+        became_pro = cursor.rowcount > 0
         
-        # Update request status
+        # Update request status (a concurrent approval leaves nothing to update)
         cursor.execute("""
             UPDATE pro_upgrade_requests 
             SET status = 'approved', reviewed_at = NOW(), reviewed_by = %s
-            WHERE id = %s
+            WHERE id = %s AND status = 'pending'
         """, (admin['id'], request_id))
+        was_pending = cursor.rowcount > 0
         
         conn.commit()
+        if was_pending:
+            stats.decr('pending_pro_upgrades')
+        if became_pro:
+            stats.incr('pro_users')
         
-        return JSONResponse({
+        return FastJSONResponse({
             "success": True, 
             "message": "Utilisateur passé en PRO avec succès!"
         })
@@ -1649,16 +2064,18 @@ async def reject_pro_upgrade(request: Request, request_id: int):
         if not cursor.fetchone():
             raise HTTPException(status_code=404, detail="Demande non trouvée ou déjà traitée")
         
-        # Update request status
+        # Update request status (a concurrent review leaves nothing to update)
         cursor.execute("""
             UPDATE pro_upgrade_requests 
             SET status = 'rejected', reviewed_at = NOW(), reviewed_by = %s
-            WHERE id = %s
+            WHERE id = %s AND status = 'pending'
         """, (admin['id'], request_id))
+        rejected = cursor.rowcount
         
         conn.commit()
+        stats.decr('pending_pro_upgrades', rejected)
         
-        return JSONResponse({"success": True, "message": "Demande rejetée"})
+        return FastJSONResponse({"success": True, "message": "Demande rejetée"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1666,6 +2083,396 @@ async def reject_pro_upgrade(request: Request, request_id: int):
         cursor.close()
         conn.close()
 
+# ============================================================================
+# ADMIN BULK OPERATIONS
+# ============================================================================
+
+def parse_id_list(ids: str) -> List[int]:
+    """Parse a comma-separated id list ("1,2,3"), deduplicated, order kept"""
+    try:
+        id_list = list(dict.fromkeys(int(i) for i in ids.split(',') if i.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Liste d'identifiants invalide")
+    if not id_list:
+        raise HTTPException(status_code=400, detail="Aucun identifiant fourni")
+    if len(id_list) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Maximum {BULK_MAX_IDS} identifiants par requête")
+    return id_list
+
+def in_placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+async def notify_users(message: dict, user_ids: List[int]):
+    """Background task: push the same notification to many users"""
+    await manager.broadcast_to_multiple(message, user_ids)
+
+BULK_USER_ACTIONS = {
+    'activate': ("is_active = TRUE", "Comptes activés"),
+    'deactivate': ("is_active = FALSE", "Comptes désactivés"),
+    'verify': ("is_verified = TRUE", "Utilisateurs vérifiés"),
+}
+
+@app.post("/admin/bulk/users")
+async def bulk_update_users(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    ids: str = Form(...),
+    action: str = Form(...)
+):
+    """Activate, deactivate or verify many users in one statement"""
+    admin = require_admin(request)
+    
+    if action not in BULK_USER_ACTIONS:
+        raise HTTPException(status_code=400, detail="Action invalide")
+    
+    id_list = parse_id_list(ids)
+    assignment, message = BULK_USER_ACTIONS[action]
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f"""
+            UPDATE users SET {assignment} WHERE id IN ({in_placeholders(id_list)})
+        """, id_list)
+        updated = cursor.rowcount
+        conn.commit()
+        if action in ('activate', 'deactivate'):
+            user_index.refresh_users(id_list, conn)
+        
+        background_tasks.add_task(notify_users, {"type": "account_update", "action": action}, id_list)
+        
+        return FastJSONResponse({"success": True, "message": message, "updated": updated})
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.post("/admin/bulk/approve_pro_upgrades")
+async def bulk_approve_pro_upgrades(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    ids: str = Form(...)
+):
+    """Approve many PRO upgrade requests in one transaction"""
+    admin = require_admin(request)
+    id_list = parse_id_list(ids)
+    placeholders = in_placeholders(id_list)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        # Lock the pending requests so a concurrent review can't process them twice
+        cursor.execute(f"""
+            SELECT pur.id, pur.user_id, u.user_type
+            FROM pro_upgrade_requests pur
+            JOIN users u ON pur.user_id = u.id
+            WHERE pur.id IN ({placeholders}) AND pur.status = 'pending'
+            FOR UPDATE
+        """, id_list)
+        pending = cursor.fetchall()
+        
+        if not pending:
+            raise HTTPException(status_code=404, detail="Aucune demande en attente")
+        
+        pending_ids = [row['id'] for row in pending]
+        user_ids = list({row['user_id'] for row in pending})
+        new_pro_users = len({row['user_id'] for row in pending if row['user_type'] != 'pro'})
+        
+        cursor.execute(f"""
+            UPDATE users SET user_type = 'pro' WHERE id IN ({in_placeholders(user_ids)})
+        """, user_ids)
+        
+        cursor.execute(f"""
+            UPDATE pro_upgrade_requests 
+            SET status = 'approved', reviewed_at = NOW(), reviewed_by = %s
+            WHERE id IN ({in_placeholders(pending_ids)})
+        """, [admin['id']] + pending_ids)
+        
+        conn.commit()
+        stats.decr('pending_pro_upgrades', len(pending_ids))
+        stats.incr('pro_users', new_pro_users)
+        
+        background_tasks.add_task(notify_users, {"type": "pro_upgrade", "status": "approved"}, user_ids)
+        
+        return FastJSONResponse({
+            "success": True,
+            "message": f"{len(pending_ids)} demande(s) approuvée(s)",
+            "processed": pending_ids,
+            "skipped": sorted(set(id_list) - set(pending_ids))
+        })
+    except HTTPException:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.post("/admin/bulk/reject_pro_upgrades")
+async def bulk_reject_pro_upgrades(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    ids: str = Form(...)
+):
+    """Reject many PRO upgrade requests in one statement"""
+    admin = require_admin(request)
+    id_list = parse_id_list(ids)
+    placeholders = in_placeholders(id_list)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        cursor.execute(f"""
+            SELECT id, user_id FROM pro_upgrade_requests
+            WHERE id IN ({placeholders}) AND status = 'pending'
+            FOR UPDATE
+        """, id_list)
+        pending = cursor.fetchall()
+        
+        if not pending:
+            raise HTTPException(status_code=404, detail="Aucune demande en attente")
+        
+        pending_ids = [row['id'] for row in pending]
+        
+        cursor.execute(f"""
+            UPDATE pro_upgrade_requests 
+            SET status = 'rejected', reviewed_at = NOW(), reviewed_by = %s
+            WHERE id IN ({in_placeholders(pending_ids)})
+        """, [admin['id']] + pending_ids)
+        
+        conn.commit()
+        stats.decr('pending_pro_upgrades', len(pending_ids))
+        
+        background_tasks.add_task(notify_users, {"type": "pro_upgrade", "status": "rejected"},
+                                  [row['user_id'] for row in pending])
+        
+        return FastJSONResponse({
+            "success": True,
+            "message": f"{len(pending_ids)} demande(s) rejetée(s)",
+            "processed": pending_ids,
+            "skipped": sorted(set(id_list) - set(pending_ids))
+        })
+    except HTTPException:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.post("/admin/bulk/approve_groups")
+async def bulk_approve_groups(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    ids: str = Form(...)
+):
+    """Approve many group creation requests in one transaction"""
+    admin = require_admin(request)
+    id_list = parse_id_list(ids)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        cursor.execute(f"""
+            SELECT * FROM group_requests
+            WHERE id IN ({in_placeholders(id_list)}) AND status = 'pending'
+            FOR UPDATE
+        """, id_list)
+        pending = cursor.fetchall()
+        
+        if not pending:
+            raise HTTPException(status_code=404, detail="Aucune demande en attente")
+        
+        # One INSERT per group: each needs its own id for the creator row
+        creators = []
+        for req in pending:
+            cursor.execute("""
+                INSERT INTO conversations (name, conversation_type, created_by, description)
+                VALUES (%s, 'group', %s, %s)
+            """, (req['group_name'], req['requested_by'], req['description']))
+            creators.append((cursor.lastrowid, req['requested_by']))
+        
+        # executemany turns this into a single multi-row INSERT
+        cursor.executemany("""
+            INSERT INTO conversation_participants (conversation_id, user_id, role)
+            VALUES (%s, %s, 'admin')
+        """, creators)
+        
+        pending_ids = [req['id'] for req in pending]
+        cursor.execute(f"""
+            UPDATE group_requests SET status = 'approved', reviewed_at = NOW()
+            WHERE id IN ({in_placeholders(pending_ids)})
+        """, pending_ids)
+        
+        conn.commit()
+        stats.decr('pending_groups', len(pending_ids))
+        
+        for group_id, creator_id in creators:
+            manager.add_to_conversation(group_id, creator_id)
+        background_tasks.add_task(notify_users, {"type": "group_request", "status": "approved"},
+                                  [creator_id for _, creator_id in creators])
+        
+        return FastJSONResponse({
+            "success": True,
+            "message": f"{len(pending_ids)} groupe(s) approuvé(s)",
+            "processed": pending_ids,
+            "skipped": sorted(set(id_list) - set(pending_ids))
+        })
+    except HTTPException:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.post("/admin/bulk/reject_groups")
+async def bulk_reject_groups(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    ids: str = Form(...)
+):
+    """Reject many group creation requests in one statement"""
+    admin = require_admin(request)
+    id_list = parse_id_list(ids)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        cursor.execute(f"""
+            SELECT id, requested_by FROM group_requests
+            WHERE id IN ({in_placeholders(id_list)}) AND status = 'pending'
+            FOR UPDATE
+        """, id_list)
+        pending = cursor.fetchall()
+        
+        if not pending:
+            raise HTTPException(status_code=404, detail="Aucune demande en attente")
+        
+        pending_ids = [row['id'] for row in pending]
+        cursor.execute(f"""
+            UPDATE group_requests SET status = 'rejected', reviewed_at = NOW()
+            WHERE id IN ({in_placeholders(pending_ids)})
+        """, pending_ids)
+        
+        conn.commit()
+        stats.decr('pending_groups', len(pending_ids))
+        
+        background_tasks.add_task(notify_users, {"type": "group_request", "status": "rejected"},
+                                  [row['requested_by'] for row in pending])
+        
+        return FastJSONResponse({
+            "success": True,
+            "message": f"{len(pending_ids)} demande(s) rejetée(s)",
+            "processed": pending_ids,
+            "skipped": sorted(set(id_list) - set(pending_ids))
+        })
+    except HTTPException:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.post("/admin/import_users")
+async def admin_import_users(
+    request: Request,
+    file: UploadFile = File(...),
+    class_level: str = Form(None),
+    dry_run: bool = Form(False)
+):
+    """Create users from a CSV file (first_name, last_name, phone, password, class_level, filiere)"""
+    admin = require_admin(request)
+    
+    content = await file.read(IMPORT_MAX_BYTES + 1)
+    if len(content) > IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Fichier trop volumineux (max 5MB)")
+    
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    try:
+        result = await import_users(conn, content, class_level, dry_run)
+        stats.incr('total_users', result['created'])
+        if result['created']:
+            await asyncio.to_thread(user_index.load)
+        
+        return FastJSONResponse({
+            "success": True,
+            "message": f"{result['created']} utilisateur(s) créé(s), {result['skipped']} ignoré(s), {result['errors']} erreur(s)",
+            **result
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        conn.close()
+
+@app.get("/admin/pro_upgrade_requests/lookup")
+async def lookup_pro_upgrade_requests(
+    request: Request,
+    transaction_ids: str,
+    operator: Optional[str] = None
+):
+    """Match operator transaction ids (comma-separated) against PRO requests
+
+    Exact lookups on the (transaction_id, operator) index, so a whole
+    operator statement can be reconciled in one query.
+    """
+    admin = require_admin(request)
+    
+    ids = list(dict.fromkeys(t.strip() for t in transaction_ids.split(',') if t.strip()))
+    if not ids:
+        raise HTTPException(status_code=400, detail="Aucun ID de transaction fourni")
+    if len(ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Maximum {BULK_MAX_IDS} identifiants par requête")
+    
+    query = f"""
+        SELECT pur.*, u.first_name, u.last_name, u.phone
+        FROM pro_upgrade_requests pur
+        JOIN users u ON pur.user_id = u.id
+        WHERE pur.transaction_id IN ({in_placeholders(ids)})
+    """
+    params = list(ids)
+    if operator:
+        query += " AND pur.operator = %s"
+        params.append(operator)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        cursor.execute(query, params)
+        matches = cursor.fetchall()
+        found = {row['transaction_id'].lower() for row in matches}
+        
+        return FastJSONResponse({
+            "success": True,
+            "requests": matches,
+            "not_found": [t for t in ids if t.lower() not in found]
+        })
+    finally:
+        cursor.close()
+        conn.close()
+
 
 
 
@@ -1676,6 +2483,7 @@ async def reject_pro_upgrade(request: Request, request_id: int):
 @app.post("/invite_members")
 async def invite_members(
     request: Request,
+    background_tasks: BackgroundTasks,
     group_id: int = Form(...),
     user_ids: str = Form(...)
 ):
@@ -1697,43 +2505,90 @@ async def invite_members(
             raise HTTPException(status_code=403, detail="Vous n'êtes pas membre de ce groupe")
         
         user_role = result['role']
-        user_id_list = [int(uid) for uid in user_ids.split(',')]
+        user_id_list = parse_id_list(user_ids)
+        placeholders = in_placeholders(user_id_list)
+        
+        # One query to classify every invited user (unknown, member, already invited)
+        cursor.execute(f"""
+            SELECT u.id,
+                   cp.user_id IS NOT NULL AS is_member,
+                   gir.id IS NOT NULL AS is_invited
+            FROM users u
+            LEFT JOIN conversation_participants cp
+                ON cp.conversation_id = %s AND cp.user_id = u.id
+            LEFT JOIN group_invite_requests gir
+                ON gir.group_id = %s AND gir.invited_user_id = u.id AND gir.status = 'pending'
+            WHERE u.id IN ({placeholders})
+        """, [group_id, group_id] + user_id_list)
+        found = {row['id']: row for row in cursor.fetchall()}
+        
+        to_add, skipped = [], []
+        for uid in user_id_list:
+            row = found.get(uid)
+            if not row:
+                skipped.append({"user_id": uid, "reason": "not_found"})
+            elif row['is_member']:
+                skipped.append({"user_id": uid, "reason": "already_member"})
+            elif row['is_invited'] and user_role != 'admin':
+                skipped.append({"user_id": uid, "reason": "already_invited"})
+            else:
+                to_add.append(uid)
         
         if user_role == 'admin':
-            # Admin peut ajouter directement
-            for uid in user_id_list:
-                try:
-                    cursor.execute("""
-                        INSERT INTO conversation_participants (conversation_id, user_id, role)
-                        VALUES (%s, %s, 'member')
-                    """, (group_id, uid))
-                    manager.add_to_conversation(group_id, uid)
-                except:
-                    pass  # Skip if already member
-            
+            # Admin peut ajouter directement: un seul INSERT multi-lignes
+            if to_add:
+                cursor.executemany("""
+                    INSERT IGNORE INTO conversation_participants (conversation_id, user_id, role)
+                    VALUES (%s, %s, 'member')
+                """, [(group_id, uid) for uid in to_add])
             conn.commit()
-            return JSONResponse({
+            
+            manager.add_many_to_conversation(group_id, to_add)
+            background_tasks.add_task(notify_users, {
+                "type": "group_added",
+                "group_id": group_id,
+                "added_by": user['first_name']
+            }, to_add)
+            
+            return FastJSONResponse({
                 "success": True, 
-                "message": "Membres ajoutés directement"
+                "message": f"{len(to_add)} membre(s) ajouté(s) directement",
+                "added": to_add,
+                "skipped": skipped
             })
         else:
             # Non-admin: créer des demandes d'invitation
-            for uid in user_id_list:
-                try:
-                    cursor.execute("""
-                        INSERT INTO group_invite_requests 
-                        (group_id, invited_user_id, invited_by)
-                        VALUES (%s, %s, %s)
-                    """, (group_id, uid, user['id']))
-                except:
-                    pass  # Skip if already invited
+            if to_add:
+                cursor.executemany("""
+                    INSERT IGNORE INTO group_invite_requests 
+                    (group_id, invited_user_id, invited_by)
+                    VALUES (%s, %s, %s)
+                """, [(group_id, uid, user['id']) for uid in to_add])
             
+            cursor.execute("""
+                SELECT user_id FROM conversation_participants
+                WHERE conversation_id = %s AND role = 'admin'
+            """, (group_id,))
+            group_admins = [row['user_id'] for row in cursor.fetchall()]
             conn.commit()
-            return JSONResponse({
+            
+            if to_add:
+                background_tasks.add_task(notify_users, {
+                    "type": "group_invite_request",
+                    "group_id": group_id,
+                    "count": len(to_add)
+                }, group_admins)
+            
+            return FastJSONResponse({
                 "success": True, 
-                "message": "Demandes d'invitation envoyées aux admins du groupe"
+                "message": "Demandes d'invitation envoyées aux admins du groupe",
+                "invited": to_add,
+                "skipped": skipped
             })
     
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1775,10 +2630,7 @@ async def get_group_invite_requests(request: Request, group_id: int):
         
         requests = cursor.fetchall()
         
-        # Convert datetime objects to strings for JSON serialization
-        requests_serializable = convert_datetime_to_string(requests)
-        
-        return JSONResponse({"success": True, "requests": requests_serializable})
+        return FastJSONResponse({"success": True, "requests": requests})
     finally:
         cursor.close()
         conn.close()
@@ -1828,7 +2680,7 @@ async def approve_group_invite(request: Request, request_id: int):
         
         manager.add_to_conversation(invite_request['group_id'], invite_request['invited_user_id'])
         
-        return JSONResponse({"success": True, "message": "Membre ajouté au groupe"})
+        return FastJSONResponse({"success": True, "message": "Membre ajouté au groupe"})
     
     except Exception as e:
         conn.rollback()
@@ -1873,7 +2725,7 @@ async def reject_group_invite(request: Request, request_id: int):
         
         conn.commit()
         
-        return JSONResponse({"success": True, "message": "Invitation rejetée"})
+        return FastJSONResponse({"success": True, "message": "Invitation rejetée"})
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1907,13 +2759,13 @@ async def message_pro_page(request: Request):
                END as display_name,
                CASE 
                    WHEN c.conversation_type = 'private' THEN (
-                       SELECT u.profile_picture 
+                       SELECT COALESCE(u.profile_picture_thumb, u.profile_picture)
                        FROM conversation_participants cp
                        JOIN users u ON cp.user_id = u.id
                        WHERE cp.conversation_id = c.id AND cp.user_id != %s
                        LIMIT 1
                    )
-                   ELSE c.group_photo
+                   ELSE COALESCE(c.group_photo_thumb, c.group_photo)
                END as display_photo
         FROM conversations c
         JOIN conversation_participants cp ON c.id = cp.conversation_id
@@ -1922,24 +2774,14 @@ async def message_pro_page(request: Request):
     """, (user['id'], user['id'], user['id']))
     conversations = cursor.fetchall()
     
-    # Get all users for starting new chats
-    cursor.execute("""
-        SELECT id, first_name, last_name, profile_picture 
-        FROM users 
-        WHERE id != %s AND is_active = TRUE
-    """, (user['id'],))
-    users = cursor.fetchall()
-    for u in users:
-        print(f"Utilisateur: {u['first_name']} {u['last_name']}, profile_picture: {u['profile_picture']}")
-    
+    # Users for new chats are searched on demand (/search_users)
     cursor.close()
     conn.close()
     
     return templates.TemplateResponse("message_pro.html", {
         "request": request,
         "user": user,
-        "conversations": conversations,
-        "users": users
+        "conversations": conversations
     })
 
 @app.get("/message_prive")
@@ -1961,7 +2803,7 @@ async def message_prive_page(request: Request):
                    LIMIT 1
                ) as other_user_name,
                (
-                   SELECT u.profile_picture 
+                   SELECT COALESCE(u.profile_picture_thumb, u.profile_picture)
                    FROM conversation_participants cp
                    JOIN users u ON cp.user_id = u.id
                    WHERE cp.conversation_id = c.id AND cp.user_id != %s
@@ -1974,22 +2816,14 @@ async def message_prive_page(request: Request):
     """, (user['id'], user['id'], user['id']))
     conversations = cursor.fetchall()
     
-    # Get all users for starting new chats
-    cursor.execute("""
-        SELECT id, first_name, last_name, profile_picture 
-        FROM users 
-        WHERE id != %s AND is_active = TRUE
-    """, (user['id'],))
-    users = cursor.fetchall()
-    
+    # Users for new chats are searched on demand (/search_users)
     cursor.close()
     conn.close()
     
     return templates.TemplateResponse("message_prive.html", {
         "request": request,
         "user": user,
-        "conversations": conversations,
-        "users": users
+        "conversations": conversations
     })
 
 
@@ -1999,117 +2833,274 @@ async def admin_panel(request: Request):
     """Admin dashboard with Pro upgrade requests"""
     admin = require_admin(request)
     
+    # Users, contents and requests are loaded per tab from /admin/api/*
+    
+    # Publications: queried only when the cached table body is stale
+    publications = lazy_query("""
+        SELECT * FROM admin_publications ORDER BY created_at DESC LIMIT 20
+    """)
+    
+    return templates.TemplateResponse("admin_panel.html", {
+        "request": request,
+        "admin": admin,
+        # Counters maintained in memory by stats_service
+        "stats": stats.snapshot(),
+        "publications": publications
+    })
+
+
+
+@app.get("/admin/get_stats")
+async def admin_get_stats(request: Request):
+    """Dashboard counters polled by admin.js"""
+    admin = require_admin(request)
+    return FastJSONResponse({"success": True, "stats": stats.snapshot()})
+
+
+# ============================================================================
+# ADMIN LIST API (paginated tables loaded per tab by admin.js)
+# ============================================================================
+
+@app.get("/admin/api/users")
+async def admin_list_users(
+    request: Request,
+    page: int = 1,
+    per_page: int = DEFAULT_PER_PAGE,
+    sort: str = "created_at",
+    order: str = "desc",
+    q: Optional[str] = None,
+    user_type: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    is_verified: Optional[bool] = None,
+    class_level: Optional[str] = None
+):
+    """Paginated user list for the admin panel"""
+    admin = require_admin(request)
+    
+    where, params = [], []
+    if q:
+        # Prefix match so the name/phone indexes can be used
+        where.append("(first_name LIKE %s OR last_name LIKE %s OR phone LIKE %s)")
+        params += [f"{q}%"] * 3
+    if user_type:
+        where.append("user_type = %s")
+        params.append(user_type)
+    if is_active is not None:
+        where.append("is_active = %s")
+        params.append(is_active)
+    if is_verified is not None:
+        where.append("is_verified = %s")
+        params.append(is_verified)
+    if class_level:
+        where.append("class_level = %s")
+        params.append(class_level)
+    
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get statistics
-    cursor.execute("SELECT COUNT(*) as count FROM users")
-    total_users = cursor.fetchone()['count']
+    try:
+        result = paginate(cursor, """
+            SELECT id, first_name, last_name, phone, user_type, class_level, is_active, is_verified,
+                   COALESCE(profile_picture_thumb, profile_picture) as profile_picture, created_at
+            FROM users
+        """, where, params, order_clause(sort, order, {
+            "id": "id", "created_at": "created_at", "first_name": "first_name", "user_type": "user_type"
+        }, "created_at", "id"), page, per_page)
+        
+        return FastJSONResponse({"success": True, **result})
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.get("/admin/api/contents")
+async def admin_list_contents(
+    request: Request,
+    page: int = 1,
+    per_page: int = DEFAULT_PER_PAGE,
+    sort: str = "created_at",
+    order: str = "desc",
+    q: Optional[str] = None,
+    content_type: Optional[str] = None,
+    access_type: Optional[str] = None,
+    class_level: Optional[str] = None
+):
+    """Paginated content list for the admin panel"""
+    admin = require_admin(request)
     
-    cursor.execute("SELECT COUNT(*) as count FROM users WHERE user_type = 'pro'")
-    pro_users = cursor.fetchone()['count']
+    where, params = [], []
+    if q:
+        where.append("c.title LIKE %s")
+        params.append(f"{q}%")
+    if content_type:
+        where.append("c.content_type = %s")
+        params.append(content_type)
+    if access_type:
+        where.append("c.access_type = %s")
+        params.append(access_type)
+    if class_level:
+        where.append("c.class_level = %s")
+        params.append(class_level)
     
-    cursor.execute("SELECT COUNT(*) as count FROM contents")
-    total_contents = cursor.fetchone()['count']
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
     
-    cursor.execute("SELECT COUNT(*) as count FROM group_requests WHERE status = 'pending'")
-    pending_groups = cursor.fetchone()['count']
+    try:
+        result = paginate(cursor, """
+            SELECT c.id, c.title, c.content_type, c.access_type, c.class_level, c.subject,
+                   c.drive_file_id, c.created_at, a.nom as admin_name
+            FROM contents c
+            LEFT JOIN admin a ON c.uploaded_by = a.id
+        """, where, params, order_clause(sort, order, {
+            "id": "c.id", "created_at": "c.created_at", "title": "c.title"
+        }, "created_at", "c.id"), page, per_page)
+        
+        return FastJSONResponse({"success": True, **result})
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.get("/admin/api/group_requests")
+async def admin_list_group_requests(
+    request: Request,
+    page: int = 1,
+    per_page: int = DEFAULT_PER_PAGE,
+    sort: str = "created_at",
+    order: str = "desc",
+    status: str = "pending",
+    q: Optional[str] = None
+):
+    """Paginated group creation requests for the admin panel"""
+    admin = require_admin(request)
     
-    cursor.execute("SELECT COUNT(*) as count FROM pro_upgrade_requests WHERE status = 'pending'")
-    pending_pro_upgrades = cursor.fetchone()['count']
+    where, params = ["gr.status = %s"], [status]
+    if q:
+        where.append("gr.group_name LIKE %s")
+        params.append(f"{q}%")
     
-    # Get all users
-    cursor.execute("""
-        SELECT id, first_name, last_name, phone, user_type, is_active, is_verified, 
-               profile_picture, created_at
-        FROM users ORDER BY created_at DESC
-    """)
-    users = cursor.fetchall()
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
     
-    # Get all contents
-    cursor.execute("""
-        SELECT c.*, a.nom as admin_name 
-        FROM contents c
-        LEFT JOIN admin a ON c.uploaded_by = a.id
-        ORDER BY c.created_at DESC
-    """)
-    contents = cursor.fetchall()
+    try:
+        result = paginate(cursor, """
+            SELECT gr.*, u.first_name, u.last_name
+            FROM group_requests gr
+            JOIN users u ON gr.requested_by = u.id
+        """, where, params, order_clause(sort, order, {
+            "id": "gr.id", "created_at": "gr.created_at", "group_name": "gr.group_name"
+        }, "created_at", "gr.id"), page, per_page)
+        
+        return FastJSONResponse({"success": True, **result})
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.get("/admin/api/pro_upgrade_requests")
+async def admin_list_pro_upgrade_requests(
+    request: Request,
+    page: int = 1,
+    per_page: int = DEFAULT_PER_PAGE,
+    sort: str = "created_at",
+    order: str = "desc",
+    status: str = "pending",
+    operator: Optional[str] = None,
+    q: Optional[str] = None
+):
+    """Paginated PRO upgrade requests for the admin panel"""
+    admin = require_admin(request)
     
-    # Get group requests
-    cursor.execute("""
-        SELECT gr.*, u.first_name, u.last_name
-        FROM group_requests gr
-        JOIN users u ON gr.requested_by = u.id
-        WHERE gr.status = 'pending'
-        ORDER BY gr.created_at DESC
-    """)
-    group_requests = cursor.fetchall()
+    where, params = ["pur.status = %s"], [status]
+    if operator:
+        where.append("pur.operator = %s")
+        params.append(operator)
+    if q:
+        where.append("pur.transaction_id LIKE %s")
+        params.append(f"{q}%")
     
-    # Get Pro upgrade requests
-    cursor.execute("""
-        SELECT pur.*, u.first_name, u.last_name, u.phone
-        FROM pro_upgrade_requests pur
-        JOIN users u ON pur.user_id = u.id
-        WHERE pur.status = 'pending'
-        ORDER BY pur.created_at DESC
-    """)
-    pro_upgrade_requests = cursor.fetchall()
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
     
-    # Get publications
-    cursor.execute("""
-        SELECT * FROM admin_publications ORDER BY created_at DESC LIMIT 20
-    """)
-    publications = cursor.fetchall()
+    try:
+        result = paginate(cursor, """
+            SELECT pur.*, u.first_name, u.last_name, u.phone
+            FROM pro_upgrade_requests pur
+            JOIN users u ON pur.user_id = u.id
+        """, where, params, order_clause(sort, order, {
+            "id": "pur.id", "created_at": "pur.created_at", "amount": "pur.amount"
+        }, "created_at", "pur.id"), page, per_page)
+        
+        return FastJSONResponse({"success": True, **result})
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@app.get("/admin/export/{dataset}")
+async def admin_export(
+    request: Request,
+    dataset: str,
+    format: str = "csv",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    """Stream users, payments or messages as CSV or JSONL
+
+    Dataset filters (status, user_type, conversation_id...) are read
+    from the query string, see export_service.EXPORT_DATASETS.
+    """
+    admin = require_admin(request)
     
-    cursor.close()
-    conn.close()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format invalide (csv ou jsonl)")
     
-    return templates.TemplateResponse("admin_panel.html", {
-        "request": request,
-        "admin": admin,
-        "stats": {
-            "total_users": total_users,
-            "pro_users": pro_users,
-            "total_contents": total_contents,
-            "pending_groups": pending_groups,
-            "pending_pro_upgrades": pending_pro_upgrades
-        },
-        "users": users,
-        "contents": contents,
-        "group_requests": group_requests,
-        "pro_upgrade_requests": pro_upgrade_requests,
-        "publications": publications
-    })
+    sql, params = build_export_query(dataset, dict(request.query_params), date_from, date_to)
+    file_name = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    
+    return StreamingResponse(
+        stream_export(sql, params, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
 
 
+@app.get("/search_users")
+async def search_users(
+    request: Request,
+    q: str = "",
+    limit: int = 20,
+    class_level: Optional[str] = None
+):
+    """Prefix search over active users' names for the new chat picker"""
+    user = require_auth(request)
+    
+    users = user_index.search(q, limit, class_level, exclude=[user['id']])
+    return FastJSONResponse({"success": True, "users": users})
 
 @app.get("/get_available_users_for_group/{group_id}")
-async def get_available_users_for_group(request: Request, group_id: int):
-    """Get users not in the group"""
+async def get_available_users_for_group(
+    request: Request,
+    group_id: int,
+    q: str = "",
+    limit: int = 20,
+    class_level: Optional[str] = None
+):
+    """Search users not in the group (prefix match on names)"""
     user = require_auth(request)
     
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
     
     try:
+        # Members are read from the unique (conversation_id, user_id) key
         cursor.execute("""
-            SELECT u.id, u.first_name, u.last_name, u.profile_picture
-            FROM users u
-            WHERE u.is_active = TRUE 
-            AND u.id NOT IN (
-                SELECT user_id FROM conversation_participants WHERE conversation_id = %s
-            )
+            SELECT user_id FROM conversation_participants WHERE conversation_id = %s
         """, (group_id,))
-        
-        users = cursor.fetchall()
-        
-        # Convert datetime objects to strings for JSON serialization
-        users_serializable = convert_datetime_to_string(users)
-        
-        return JSONResponse({"success": True, "users": users_serializable})
+        members = [row[0] for row in cursor.fetchall()]
     finally:
         cursor.close()
         conn.close()
+    
+    users = user_index.search(q, limit, class_level, exclude=members)
+    return FastJSONResponse({"success": True, "users": users})
 
 
 @app.get("/get_group_members/{group_id}")
@@ -2132,7 +3123,8 @@ async def get_group_members(request: Request, group_id: int):
         
         # Get members
         cursor.execute("""
-            SELECT u.id, u.first_name, u.last_name, u.profile_picture, cp.role
+            SELECT u.id, u.first_name, u.last_name,
+                   COALESCE(u.profile_picture_thumb, u.profile_picture) as profile_picture, cp.role
             FROM users u
             JOIN conversation_participants cp ON u.id = cp.user_id
             WHERE cp.conversation_id = %s
@@ -2148,7 +3140,7 @@ async def get_group_members(request: Request, group_id: int):
                     file_id = member['profile_picture'].split('id=')[1].split('&')[0]
                     member['profile_picture'] = drive_manager.get_direct_image_url(file_id)
         
-        return JSONResponse({"success": True, "members": members})
+        return FastJSONResponse({"success": True, "members": members})
     finally:
         cursor.close()
         conn.close()
@@ -0,0 +1,182 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histograms
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_CONNECT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Mounted apps (/static) have no APIRoute: their requests are labelled by prefix
+MOUNT_PREFIXES: List[str] = []
+
+# ASGI scope of the request being served; copied into to_thread() workers,
+# so code deep in the call stack (SQL profiler) can tell which route it serves
+current_scope: ContextVar[Optional[dict]] = ContextVar('current_scope', default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def metric_header(name: str, kind: str, help_text: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def render_gauge(name: str, help_text: str, value, labels: Optional[Dict[str, object]] = None,
+                 kind: str = 'gauge') -> List[str]:
+    return metric_header(name, kind, help_text) + [f"{name}{_labels(labels or {})} {value}"]
+
+
+def render_labeled(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, object], float]],
+                   kind: str = 'gauge') -> List[str]:
+    return metric_header(name, kind, help_text) + [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+
+
+class Histogram:
+    """Latency histogram rendered with cumulative Prometheus buckets"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: Dict[str, object]) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {self.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+def route_label(scope) -> str:
+    """Route template ("/group_chat/{group_id}") instead of the raw path,
+    so the number of series stays bounded"""
+    route = scope.get('route')
+    if route is not None:
+        return route.path
+    # Mount moves its prefix from "path" to "root_path" before calling the sub-app
+    root_path = scope.get('root_path', '')
+    for prefix in MOUNT_PREFIXES:
+        if root_path.endswith(prefix) or scope['path'].startswith(prefix + '/'):
+            return prefix
+    return 'unmatched'
+
+
+class RequestMetrics:
+    """Per-route HTTP counters and latency histograms
+
+    Only touched from the event loop, so plain dicts are enough: the
+    hot path is two perf_counter() calls and a few dict updates.
+    """
+
+    def __init__(self):
+        # (method, route) -> Histogram
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        # (method, route, status) -> count
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.in_flight = 0
+
+    def record(self, method: str, route: str, status: int, seconds: float):
+        key = (method, route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram(REQUEST_BUCKETS)
+        histogram.observe(seconds)
+
+        status_key = (method, route, status)
+        self.responses[status_key] = self.responses.get(status_key, 0) + 1
+
+    def render(self) -> List[str]:
+        lines = metric_header('http_requests_total', 'counter', 'HTTP responses by route and status')
+        for (method, route, status), count in sorted(self.responses.items()):
+            lines.append(f"http_requests_total{_labels({'method': method, 'route': route, 'status': status})} {count}")
+
+        lines += metric_header('http_request_duration_seconds', 'histogram', 'HTTP request latency by route')
+        for (method, route), histogram in sorted(self.latency.items()):
+            lines += histogram.render('http_request_duration_seconds', {'method': method, 'route': route})
+
+        lines += render_gauge('http_requests_in_flight', 'HTTP requests currently being served', self.in_flight)
+        return lines
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware feeding RequestMetrics
+
+    Unlike BaseHTTPMiddleware it does not buffer or re-wrap the
+    response, so streaming downloads and exports are unaffected. The
+    latency covers the whole response, body included.
+    """
+
+    def __init__(self, app, metrics: Optional[RequestMetrics] = None):
+        self.app = app
+        self.metrics = metrics or request_metrics
+
+    async def __call__(self, scope, receive, send):
+        current_scope.set(scope)
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        self.metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.in_flight -= 1
+            # The router stored the matched route in the scope
+            self.metrics.record(scope['method'], route_label(scope), status, time.perf_counter() - start)
+
+
+class DBMetrics:
+    """Connection statistics for get_db_connection
+
+    The app opens one MySQL connection per request (there is no pool),
+    so connect latency and failures are what matter here.
+    """
+
+    def __init__(self):
+        self.connect_latency = Histogram(DB_CONNECT_BUCKETS)
+        self.connect_errors = 0
+
+    def record_connect(self, seconds: float, error: bool = False):
+        self.connect_latency.observe(seconds)
+        if error:
+            self.connect_errors += 1
+
+    def render(self) -> List[str]:
+        lines = metric_header('db_connect_duration_seconds', 'histogram', 'Time to open a MySQL connection')
+        lines += self.connect_latency.render('db_connect_duration_seconds', {})
+        lines += render_gauge('db_connections_opened_total', 'MySQL connection attempts',
+                              self.connect_latency.count, kind='counter')
+        lines += render_gauge('db_connect_errors_total', 'Failed MySQL connection attempts',
+                              self.connect_errors, kind='counter')
+        return lines
+
+
+# Global instances
+request_metrics = RequestMetrics()
+db_metrics = DBMetrics()
@@ -0,0 +1,43 @@
+from typing import Dict, List
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def order_clause(sort: str, order: str, allowed: Dict[str, str], default: str, tie_breaker: str) -> str:
+    """Build a safe ORDER BY from a whitelist {param value: SQL column}
+
+    The tie breaker (usually the primary key) keeps pages stable when
+    many rows share the sort value.
+    """
+    column = allowed.get(sort, allowed[default])
+    direction = "ASC" if (order or "").lower() == "asc" else "DESC"
+    if column == tie_breaker:
+        return f" ORDER BY {column} {direction}"
+    return f" ORDER BY {column} {direction}, {tie_breaker} {direction}"
+
+
+def paginate(cursor, select_sql: str, where: List[str], params: List, order_sql: str,
+             page: int = 1, per_page: int = DEFAULT_PER_PAGE) -> dict:
+    """Run a filtered, sorted, LIMIT/OFFSET query and return one page
+
+    One extra row is fetched to know whether a next page exists, so no
+    COUNT(*) over the whole table is needed.
+    """
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += order_sql + " LIMIT %s OFFSET %s"
+
+    cursor.execute(sql, list(params) + [per_page + 1, (page - 1) * per_page])
+    rows = cursor.fetchall()
+
+    return {
+        "items": rows[:per_page],
+        "page": page,
+        "per_page": per_page,
+        "has_more": len(rows) > per_page
+    }
@@ -0,0 +1,231 @@
+import re
+import time
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+from mysql.connector import Error
+from metrics import current_scope, route_label
+from config import (
+    QUERY_PROFILER_ENABLED, SLOW_QUERY_THRESHOLD, SLOW_QUERY_EXPLAIN_INTERVAL, QUERY_STATS_MAX_STATEMENTS
+)
+
+OTHER_STATEMENTS = '<other>'
+SORT_FIELDS = ('total_seconds', 'calls', 'avg_seconds', 'max_seconds', 'rows', 'slow_calls')
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_RE = re.compile(r"\bVALUES\s*\([^()]*\)(?:\s*,\s*\([^()]*\))*", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """Normalize a statement so calls differing only by values group together
+
+    Literals and placeholders become '?', IN lists and multi-row VALUES
+    collapse, so "IN (%s, %s)" and "IN (%s, %s, %s)" are one statement.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = ' '.join(sql.split())
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _VALUES_RE.sub('VALUES (...)', sql)
+    return sql
+
+
+def current_route() -> str:
+    scope = current_scope.get()
+    return route_label(scope) if scope is not None else 'startup/background'
+
+
+class QueryProfiler:
+    """Per-statement totals for every query run through get_db_connection
+
+    Queries run both on the event loop and in worker threads (exports,
+    to_thread), hence the lock. The number of fingerprints is bounded;
+    beyond QUERY_STATS_MAX_STATEMENTS new ones are counted as '<other>'.
+    """
+
+    def __init__(self, slow_threshold=SLOW_QUERY_THRESHOLD):
+        self.enabled = QUERY_PROFILER_ENABLED
+        self.slow_threshold = slow_threshold
+        self.lock = threading.Lock()
+        self.statements: Dict[str, dict] = {}
+        self.explained_at: Dict[str, float] = {}
+
+    def record(self, sql: str, params, seconds: float, rows: int, route: str):
+        key = fingerprint(sql)
+        with self.lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                if len(self.statements) >= QUERY_STATS_MAX_STATEMENTS:
+                    key = OTHER_STATEMENTS
+                    stats = self.statements.get(key)
+                if stats is None:
+                    stats = self.statements[key] = {
+                        'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                        'rows': 0, 'slow_calls': 0, 'routes': {}, 'explain': None
+                    }
+            stats['calls'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['rows'] += max(rows, 0)
+            stats['routes'][route] = stats['routes'].get(route, 0) + 1
+
+            slow = seconds >= self.slow_threshold
+            explain = False
+            if slow:
+                stats['slow_calls'] += 1
+                now = time.monotonic()
+                # One EXPLAIN per statement per interval, not one per slow call
+                if key != OTHER_STATEMENTS and now - self.explained_at.get(key, -SLOW_QUERY_EXPLAIN_INTERVAL) >= SLOW_QUERY_EXPLAIN_INTERVAL:
+                    self.explained_at[key] = now
+                    explain = True
+
+        if slow:
+            print(f"🐢 Requête lente ({seconds * 1000:.0f} ms, {rows} lignes, route {route}): {key}")
+        if explain and sql.lstrip()[:6].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+            threading.Thread(target=self._explain, args=(key, sql, params), daemon=True).start()
+
+    def _explain(self, key: str, sql: str, params):
+        """Run EXPLAIN on a separate connection and keep the plan with the stats"""
+        from database import get_db_connection
+
+        conn = get_db_connection(profile=False)
+        if not conn:
+            return
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = [
+                {col: val.decode() if isinstance(val, (bytes, bytearray)) else val for col, val in row.items()}
+                for row in cursor.fetchall()
+            ]
+        except Error as e:
+            print(f"⚠️ EXPLAIN impossible pour {key}: {e}")
+            return
+        finally:
+            cursor.close()
+            conn.close()
+
+        with self.lock:
+            if key in self.statements:
+                self.statements[key]['explain'] = plan
+        for row in plan:
+            print(f"   ↳ table={row.get('table')} type={row.get('type')} key={row.get('key')} "
+                  f"rows={row.get('rows')} extra={row.get('Extra')}")
+
+    def top(self, limit: int = 20, sort: str = 'total_seconds') -> List[dict]:
+        """The `limit` most expensive statements, by one of SORT_FIELDS"""
+        with self.lock:
+            items = [
+                dict(stats, statement=key, routes=dict(stats['routes']),
+                     avg_seconds=stats['total_seconds'] / stats['calls'])
+                for key, stats in self.statements.items()
+            ]
+        items.sort(key=lambda item: item[sort], reverse=True)
+        return items[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.statements.clear()
+            self.explained_at.clear()
+
+
+class ProfiledCursor:
+    """Cursor proxy timing execute() and the fetches that follow it
+
+    The default cursor is unbuffered, so most of a SELECT's cost is paid
+    while fetching: a statement is recorded once its rows are consumed
+    (fetchall), or when the next statement starts or the cursor closes.
+    """
+
+    def __init__(self, cursor, profiler: 'QueryProfiler'):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._pending = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _finish(self):
+        if self._pending is not None:
+            self._profiler.record(*self._pending)
+            self._pending = None
+
+    def _run(self, method, sql, params, explain_params, rows=None):
+        self._finish()
+        route = current_route()
+        start = time.perf_counter()
+        result = method(sql, params)
+        seconds = time.perf_counter() - start
+        if rows is None:
+            rows = 0 if self._cursor.with_rows else self._cursor.rowcount
+        self._pending = [sql, explain_params, seconds, rows, route]
+        if not self._cursor.with_rows:
+            self._finish()
+        return result
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._run(lambda sql, p: self._cursor.execute(sql, p, *args, **kwargs), operation, params, params)
+
+    def executemany(self, operation, seq_params):
+        seq_params = list(seq_params)
+        # A slow batch is explained with the parameters of its first row
+        return self._run(self._cursor.executemany, operation, seq_params,
+                         seq_params[0] if seq_params else None, rows=len(seq_params))
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - start
+            if isinstance(result, list):
+                self._pending[3] += len(result)
+            elif result is not None:
+                self._pending[3] += 1
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        result = self._fetch(self._cursor.fetchall)
+        self._finish()
+        return result
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+
+class ProfiledConnection:
+    """Connection proxy whose cursors are ProfiledCursor"""
+
+    def __init__(self, conn, profiler: 'QueryProfiler'):
+        self._conn = conn
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return ProfiledCursor(self._conn.cursor(*args, **kwargs), self._profiler)
+
+
+def profile_connection(conn, profiler: Optional[QueryProfiler] = None):
+    profiler = profiler or query_profiler
+    if conn is None or not profiler.enabled:
+        return conn
+    return ProfiledConnection(conn, profiler)
+
+
+# Global instance
+query_profiler = QueryProfiler()
@@ -0,0 +1,352 @@
+import time
+import asyncio
+from typing import Dict, List, Optional
+from websocket_manager import manager, ConnectionManager
+from metrics import render_gauge, render_labeled
+from config import (
+    SFU_ENABLED, SFU_MIN_PARTICIPANTS, SFU_MAX_PARTICIPANTS, SFU_MAX_PUBLISHERS,
+    SFU_CPU_BUDGET, SFU_CPU_INTERVAL
+)
+
+try:
+    from aiortc import (RTCPeerConnection, RTCSessionDescription, RTCConfiguration, RTCBundlePolicy,
+                        MediaStreamTrack)
+    from aiortc.contrib.media import MediaRelay
+    from aiortc.mediastreams import MediaStreamError
+except ImportError:  # mesh calls only
+    RTCPeerConnection = None
+    MediaStreamTrack = object
+
+
+class ForwardedTrack(MediaStreamTrack):
+    """A publisher's track as sent to one subscriber, counting frames for CPU accounting
+
+    aiortc's sender stops for good once its track ends, so when the
+    publisher leaves the track is detached instead, and waits for the
+    next publisher forwarded on the same m-line.
+    """
+
+    def __init__(self, source, room: "SFURoom"):
+        super().__init__()
+        self.kind = source.kind
+        self.room = room
+        self.source = None
+        self.attached = asyncio.Event()
+        self.attach(source)
+
+    def attach(self, source):
+        self.source = source
+        self.attached.set()
+
+    def detach(self):
+        # Must happen before the publisher's track stops: its end is then not ours
+        self.source = None
+        self.attached.clear()
+
+    async def recv(self):
+        while True:
+            if self.readyState != 'live':
+                raise MediaStreamError
+            source = self.source
+            if source is None:
+                await self.attached.wait()
+                continue
+            try:
+                frame = await source.recv()
+            except MediaStreamError:
+                if source is self.source:
+                    raise
+                continue
+            if source is self.source:
+                self.room.frames += 1
+                return frame
+
+    def stop(self):
+        super().stop()
+        if self.source is not None:
+            self.source.stop()
+
+
+class SFURoom:
+    """Server side of one call: a peer connection per participant"""
+
+    def __init__(self, call_id: int, initiated_by: int):
+        self.call_id = call_id
+        self.initiated_by = initiated_by
+        self.relay = MediaRelay()
+        self.peers: Dict[int, "RTCPeerConnection"] = {}
+        # publisher user_id -> tracks received from them (everyone sends audio)
+        self.publishers: Dict[int, list] = {}
+        # participants with a video slot, at most SFU_MAX_PUBLISHERS
+        self.presenters: set = set()
+        # subscriber user_id -> {forwarded track: publisher user_id}
+        self.forwarded: Dict[int, dict] = {}
+        # user_id -> transceivers the participant uploads on
+        self.uploads: Dict[int, list] = {}
+        # subscriber user_id -> send transceivers freed by a publisher who left
+        self.idle: Dict[int, list] = {}
+        self.renegotiate: set = set()
+        self.frames = 0
+        self.cpu_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def may_present(self, user_id: int) -> bool:
+        """Video slots: the initiator (the teacher) always, then the first to join"""
+        if user_id in self.presenters or user_id == self.initiated_by:
+            return True
+        # Keep a slot for the initiator until they join
+        reserved = 0 if self.initiated_by in self.presenters else 1
+        return len(self.presenters) + reserved < SFU_MAX_PUBLISHERS
+
+
+class SelectiveForwardingUnit:
+    """Optional server-side forwarding for large group calls (requires aiortc)
+
+    In mesh mode every browser uploads its stream once per participant.
+    Calls routed through the SFU upload once to the server, which
+    forwards everyone's microphone but the camera of at most
+    SFU_MAX_PUBLISHERS participants; the others join with audio only
+    (the call page tells them). aiortc re-encodes each
+    forwarded track per subscriber, so the process CPU usage is sampled
+    and charged to calls by forwarded frames, and new participants are
+    refused above SFU_CPU_BUDGET.
+    """
+
+    def __init__(self, connections: ConnectionManager, enabled=SFU_ENABLED, cpu_interval=SFU_CPU_INTERVAL):
+        self.connections = connections
+        self.enabled = enabled
+        self.cpu_interval = cpu_interval
+        self.rooms: Dict[int, SFURoom] = {}
+        self.cpu_usage = 0.0
+        self.refused = 0
+        self.task = None
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and RTCPeerConnection is not None
+
+    def select_mode(self, member_count: int) -> str:
+        """'sfu' for calls too large for a mesh, when the server can take them"""
+        if self.available and member_count > SFU_MIN_PARTICIPANTS and self.cpu_usage < SFU_CPU_BUDGET:
+            return 'sfu'
+        return 'mesh'
+
+    def admit(self, call_id: int, user_id: int) -> Optional[str]:
+        """None if the participant can join, else the reason for refusing"""
+        room = self.rooms.get(call_id)
+        if room is not None and user_id in room.peers:
+            return None
+        if room is not None and len(room.peers) >= SFU_MAX_PARTICIPANTS:
+            self.refused += 1
+            return 'call_full'
+        if self.cpu_usage >= SFU_CPU_BUDGET:
+            self.refused += 1
+            return 'server_busy'
+        return None
+
+    async def handle(self, call_id: int, initiated_by: int, user_id: int, data: dict):
+        kind = data.get("type")
+        if kind == 'join':
+            await self._join(call_id, initiated_by, user_id)
+        elif kind == 'sfu-answer':
+            await self._answer(call_id, user_id, data.get("data") or {})
+
+    async def _join(self, call_id: int, initiated_by: int, user_id: int):
+        room = self.rooms.get(call_id)
+        if room is None:
+            room = self.rooms[call_id] = SFURoom(call_id, initiated_by)
+        if user_id in room.peers:
+            await self._close_peer(room, user_id)
+
+        # One transport for every m-line: under aiortc's default "balanced" policy a
+        # second audio/video m-line in the first offer is left on a dropped transport
+        pc = RTCPeerConnection(RTCConfiguration(bundlePolicy=RTCBundlePolicy.MAX_BUNDLE))
+        room.peers[user_id] = pc
+        room.forwarded[user_id] = {}
+        room.idle[user_id] = []
+
+        uploads = room.uploads[user_id] = [pc.addTransceiver('audio', direction='recvonly')]
+        if room.may_present(user_id):
+            room.presenters.add(user_id)
+            uploads.append(pc.addTransceiver('video', direction='recvonly'))
+
+        @pc.on("track")
+        def on_track(track):
+            room.publishers.setdefault(user_id, []).append(track)
+            asyncio.create_task(self._publish(room, user_id, track))
+
+        @pc.on("connectionstatechange")
+        async def on_state():
+            if pc.connectionState in ('failed', 'closed') and room.peers.get(user_id) is pc:
+                await self.leave(call_id, user_id)
+
+        for publisher_id, tracks in room.publishers.items():
+            if publisher_id != user_id:
+                for track in tracks:
+                    self._forward(room, user_id, publisher_id, track)
+        await self._negotiate(room, user_id)
+
+    def _forward(self, room: SFURoom, subscriber_id: int, publisher_id: int, track):
+        source = room.relay.subscribe(track)
+        # m-lines can't be removed from a session: reuse one a departed publisher freed
+        idle = room.idle[subscriber_id]
+        transceiver = next((t for t in idle if t.kind == track.kind and t.sender.track is not None), None)
+        if transceiver is not None:
+            idle.remove(transceiver)
+            forwarded = transceiver.sender.track
+            forwarded.attach(source)
+            transceiver.direction = 'sendonly'
+        else:
+            forwarded = ForwardedTrack(source, room)
+            room.peers[subscriber_id].addTransceiver(forwarded, direction='sendonly')
+        room.forwarded[subscriber_id][forwarded] = publisher_id
+
+    async def _publish(self, room: SFURoom, publisher_id: int, track):
+        """Send a new publisher track to every other participant"""
+        for subscriber_id in list(room.peers):
+            if subscriber_id != publisher_id:
+                self._forward(room, subscriber_id, publisher_id, track)
+                await self._negotiate(room, subscriber_id)
+
+    async def _negotiate(self, room: SFURoom, user_id: int):
+        """Server-initiated offer; queued if an offer is already waiting for its answer"""
+        pc = room.peers.get(user_id)
+        if pc is None:
+            return
+        if pc.signalingState != 'stable':
+            room.renegotiate.add(user_id)
+            return
+
+        await pc.setLocalDescription(await pc.createOffer())
+        forwarded = room.forwarded[user_id]
+        streams = {t.mid: forwarded[t.sender.track] for t in pc.getTransceivers()
+                   if t.mid is not None and t.sender.track in forwarded}
+        await self.connections.send_to_call_participant({
+            "type": "sfu-offer",
+            "data": {"type": pc.localDescription.type, "sdp": pc.localDescription.sdp},
+            "streams": streams,
+            "uploads": [t.mid for t in room.uploads.get(user_id, [])],
+            "presenter": user_id in room.presenters,
+            "video_slots": SFU_MAX_PUBLISHERS,
+        }, room.call_id, user_id)
+
+    async def _answer(self, call_id: int, user_id: int, answer: dict):
+        room = self.rooms.get(call_id)
+        pc = room.peers.get(user_id) if room else None
+        if pc is None or pc.signalingState != 'have-local-offer':
+            return
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=answer.get("sdp", ""), type="answer"))
+        if user_id in room.renegotiate:
+            room.renegotiate.discard(user_id)
+            await self._negotiate(room, user_id)
+
+    async def _close_peer(self, room: SFURoom, user_id: int, unpublish: bool = True):
+        pc = room.peers.pop(user_id, None)
+        # A leaving publisher's tracks end for everyone; clients drop the tile on user_left
+        changed = self._unpublish(room, user_id) if unpublish else []
+        for track in room.forwarded.pop(user_id, {}):
+            track.stop()
+        room.idle.pop(user_id, None)
+        room.uploads.pop(user_id, None)
+        room.presenters.discard(user_id)
+        room.renegotiate.discard(user_id)
+        for track in room.publishers.pop(user_id, []):
+            track.stop()
+        if pc is not None:
+            await pc.close()
+
+        for subscriber_id in changed:
+            await self._negotiate(room, subscriber_id)
+
+    def _unpublish(self, room: SFURoom, publisher_id: int) -> List[int]:
+        """Detach a publisher's forwarded tracks; returns the subscribers to renegotiate"""
+        changed = []
+        for subscriber_id, forwarded in room.forwarded.items():
+            dead = [track for track, owner in forwarded.items() if owner == publisher_id]
+            if not dead:
+                continue
+            for transceiver in room.peers[subscriber_id].getTransceivers():
+                if transceiver.sender.track in dead:
+                    transceiver.sender.track.detach()
+                    transceiver.direction = 'inactive'
+                    room.idle[subscriber_id].append(transceiver)
+            for track in dead:
+                del forwarded[track]
+            changed.append(subscriber_id)
+        return changed
+
+    async def leave(self, call_id: int, user_id: int):
+        room = self.rooms.get(call_id)
+        if room is None:
+            return
+        await self._close_peer(room, user_id)
+        if not room.peers:
+            del self.rooms[call_id]
+
+    async def close_call(self, call_id: int):
+        room = self.rooms.pop(call_id, None)
+        if room is not None:
+            for user_id in list(room.peers):
+                await self._close_peer(room, user_id, unpublish=False)
+
+    def start(self):
+        """Start CPU accounting; must be called from the event loop"""
+        if self.available and self.task is None:
+            self.task = asyncio.create_task(self._account_loop())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _account_loop(self):
+        last_cpu, last_wall = time.process_time(), time.monotonic()
+        while True:
+            await asyncio.sleep(self.cpu_interval)
+            cpu, wall = time.process_time(), time.monotonic()
+            used = cpu - last_cpu
+            self.cpu_usage = used / max(wall - last_wall, 1e-6)
+            last_cpu, last_wall = cpu, wall
+
+            # Charge the interval's CPU to calls by share of forwarded frames
+            total = sum(room.frames for room in self.rooms.values())
+            for room in self.rooms.values():
+                if total:
+                    room.cpu_seconds += used * room.frames / total
+                room.frames = 0
+
+    def snapshot(self) -> dict:
+        return {
+            'available': self.available,
+            'cpu_usage': self.cpu_usage,
+            'cpu_budget': SFU_CPU_BUDGET,
+            'refused': self.refused,
+            'calls': [
+                {
+                    'call_id': room.call_id,
+                    'participants': len(room.peers),
+                    'publishers': list(room.publishers),
+                    'presenters': list(room.presenters),
+                    'cpu_seconds': round(room.cpu_seconds, 3),
+                    'duration': round(time.monotonic() - room.started_at, 1),
+                }
+                for room in self.rooms.values()
+            ],
+        }
+
+    def render(self) -> List[str]:
+        lines = render_gauge('sfu_available', 'Whether calls can be routed through the SFU', int(self.available))
+        lines += render_gauge('sfu_cpu_usage', 'Process CPU usage (cores) over the last accounting interval',
+                              self.cpu_usage)
+        lines += render_gauge('sfu_refused_total', 'Participants refused by the SFU (call full or CPU budget)',
+                              self.refused, kind='counter')
+        lines += render_labeled('sfu_call_participants', 'Participants connected to each SFU call',
+                                [({'call_id': room.call_id}, len(room.peers)) for room in self.rooms.values()])
+        lines += render_labeled('sfu_call_cpu_seconds', 'CPU time charged to each SFU call',
+                                [({'call_id': room.call_id}, room.cpu_seconds) for room in self.rooms.values()],
+                                kind='counter')
+        return lines
+
+
+# Global instance
+sfu = SelectiveForwardingUnit(manager)
@@ -127,6 +127,57 @@ if (uploadContentForm) {
     });
 }
 
+// Bulk user import (CSV)
+const importUsersForm = document.getElementById('importUsersForm');
+if (importUsersForm) {
+    importUsersForm.addEventListener('submit', async (e) => {
+        e.preventDefault();
+
+        const formData = new FormData(e.target);
+        const submitBtn = e.target.querySelector('button[type="submit"]');
+        const reportDiv = document.getElementById('importUsersReport');
+        const originalHTML = submitBtn.innerHTML;
+        submitBtn.disabled = true;
+        submitBtn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Import...';
+
+        try {
+            const response = await fetch('/admin/import_users', {
+                method: 'POST',
+                body: formData
+            });
+
+            const data = await response.json();
+
+            if (response.ok && data.success) {
+                showAlert('✅ ' + data.message, 'success');
+                const problems = data.report.filter(entry => entry.error);
+                reportDiv.innerHTML = problems.length === 0 ? '' : `
+                    <div class="table-responsive" style="max-height: 300px;">
+                        <table class="table table-sm">
+                            <thead><tr><th>Ligne</th><th>Téléphone</th><th>Problème</th></tr></thead>
+                            <tbody>
+                                ${problems.map(entry => `
+                                <tr class="${entry.status === 'error' ? 'table-danger' : 'table-warning'}">
+                                    <td>${entry.line}</td>
+                                    <td>${escapeHtml(entry.phone)}</td>
+                                    <td>${escapeHtml(entry.error)}</td>
+                                </tr>`).join('')}
+                            </tbody>
+                        </table>
+                    </div>`;
+                if (data.created > 0) loadAdminList('users', true);
+            } else {
+                showAlert('❌ ' + (data.detail || 'Erreur lors de l\'import'), 'danger');
+            }
+        } catch (error) {
+            showAlert('❌ Erreur de connexion', 'danger');
+        } finally {
+            submitBtn.disabled = false;
+            submitBtn.innerHTML = originalHTML;
+        }
+    });
+}
+
 // Delete Content
 async function deleteContent(contentId) {
     if (!confirm('Supprimer ce contenu? Cette action est irréversible.')) return;
@@ -362,7 +413,8 @@ function updateStatisticsDisplay(stats) {
         'total_users': stats.total_users,
         'pro_users': stats.pro_users,
         'total_contents': stats.total_contents,
-        'pending_groups': stats.pending_groups
+        'pending_groups': stats.pending_groups,
+        'pending_pro_upgrades': stats.pending_pro_upgrades
     };
 
     Object.entries(statsElements).forEach(([key, value]) => {
@@ -408,11 +460,272 @@ function updateBulkActionsUI() {
     }
 }
 
+// Paginated admin lists (loaded per tab from /admin/api/*)
+function formatDate(value, withTime = false) {
+    if (!value) return '-';
+    const date = new Date(value);
+    const day = date.toLocaleDateString('fr-FR');
+    return withTime ? `${day} ${date.toLocaleTimeString('fr-FR', { hour: '2-digit', minute: '2-digit' })}` : day;
+}
+
+function badge(color, text) {
+    return `<span class="badge bg-${color}">${escapeHtml(text)}</span>`;
+}
+
+function rowCheckbox(name, id) {
+    return `<input type="checkbox" class="form-check-input row-checkbox" value="${id}" onchange="updateListSelection('${name}')">`;
+}
+
+const adminLists = {
+    users: {
+        url: '/admin/api/users',
+        renderRow: u => `
+            <tr>
+                <td>${rowCheckbox('users', u.id)}</td>
+                <td>${u.id}</td>
+                <td>${escapeHtml(u.first_name)} ${escapeHtml(u.last_name)}</td>
+                <td>${escapeHtml(u.phone)}</td>
+                <td>${badge(u.user_type === 'pro' ? 'success' : 'secondary', String(u.user_type).toUpperCase())}</td>
+                <td>${badge(u.is_active ? 'success' : 'danger', u.is_active ? 'Actif' : 'Inactif')}</td>
+                <td>${badge(u.is_verified ? 'primary' : 'warning', u.is_verified ? 'Vérifié' : 'Non vérifié')}</td>
+                <td>
+                    <div class="btn-group" role="group">
+                        <button class="btn btn-sm btn-outline-primary" onclick="toggleUserActive(${u.id})" title="Activer/Désactiver">
+                            <i class="bi bi-toggle-on"></i>
+                        </button>
+                        ${u.is_verified ? '' : `
+                        <button class="btn btn-sm btn-outline-success" onclick="verifyUser(${u.id})" title="Vérifier">
+                            <i class="bi bi-check-circle"></i>
+                        </button>`}
+                        <button class="btn btn-sm btn-outline-warning" onclick="issueWarning(${u.id}, ${escapeHtml(JSON.stringify(u.first_name || ''))})" title="Avertir">
+                            <i class="bi bi-exclamation-triangle"></i>
+                        </button>
+                    </div>
+                </td>
+            </tr>`
+    },
+    contents: {
+        url: '/admin/api/contents',
+        renderRow: c => `
+            <tr>
+                <td>${c.id}</td>
+                <td>${escapeHtml(c.title)}</td>
+                <td>${badge('info', String(c.content_type).toUpperCase())}</td>
+                <td>${badge(c.access_type === 'pro' ? 'warning' : 'success', String(c.access_type).toUpperCase())}</td>
+                <td>${escapeHtml(c.class_level || '-')}</td>
+                <td>${formatDate(c.created_at)}</td>
+                <td>
+                    <div class="btn-group" role="group">
+                        <button class="btn btn-sm btn-outline-warning" onclick="toggleContentAccess(${c.id})" title="Changer accès">
+                            <i class="bi bi-arrow-repeat"></i>
+                        </button>
+                        <button class="btn btn-sm btn-outline-danger" onclick="deleteContent(${c.id})" title="Supprimer">
+                            <i class="bi bi-trash"></i>
+                        </button>
+                    </div>
+                </td>
+            </tr>`
+    },
+    groups: {
+        url: '/admin/api/group_requests',
+        renderRow: gr => `
+            <tr>
+                <td>${gr.status === 'pending' ? rowCheckbox('groups', gr.id) : ''}</td>
+                <td><strong>${escapeHtml(gr.group_name)}</strong></td>
+                <td>${escapeHtml(gr.first_name)} ${escapeHtml(gr.last_name)}</td>
+                <td>${escapeHtml(gr.description || '-')}</td>
+                <td>${formatDate(gr.created_at)}</td>
+                <td>
+                    ${gr.status !== 'pending' ? badge('secondary', gr.status) : `
+                    <div class="btn-group" role="group">
+                        <button class="btn btn-sm btn-success" onclick="approveGroup(${gr.id})">
+                            <i class="bi bi-check-circle"></i> Approuver
+                        </button>
+                        <button class="btn btn-sm btn-danger" onclick="rejectGroup(${gr.id})">
+                            <i class="bi bi-x-circle"></i> Rejeter
+                        </button>
+                    </div>`}
+                </td>
+            </tr>`
+    },
+    proUpgrades: {
+        url: '/admin/api/pro_upgrade_requests',
+        renderRow: req => `
+            <tr>
+                <td>${req.status === 'pending' ? rowCheckbox('proUpgrades', req.id) : ''}</td>
+                <td>${escapeHtml(req.first_name)} ${escapeHtml(req.last_name)}</td>
+                <td>${escapeHtml(req.phone)}</td>
+                <td>${badge('info', req.operator)}</td>
+                <td><strong>${escapeHtml(req.amount)} Ar</strong></td>
+                <td><code>${escapeHtml(req.transaction_id)}</code></td>
+                <td>
+                    ${req.proof_image ? `
+                    <a href="${escapeHtml(req.proof_image)}" target="_blank" class="btn btn-sm btn-outline-primary">
+                        <i class="bi bi-image"></i> Voir
+                    </a>` : '<span class="text-muted">-</span>'}
+                </td>
+                <td>${formatDate(req.created_at, true)}</td>
+                <td>
+                    ${req.status !== 'pending' ? badge('secondary', req.status) : `
+                    <div class="btn-group" role="group">
+                        <button class="btn btn-sm btn-success" onclick="approveProUpgrade(${req.id})">
+                            <i class="bi bi-check-circle"></i> Approuver
+                        </button>
+                        <button class="btn btn-sm btn-danger" onclick="rejectProUpgrade(${req.id})">
+                            <i class="bi bi-x-circle"></i> Rejeter
+                        </button>
+                    </div>`}
+                </td>
+            </tr>`
+    }
+};
+
+// {list name: {page, sort, order, loading, loaded}}
+const adminListState = {};
+
+function getAdminListFilters(name) {
+    const params = {};
+    document.querySelectorAll(`.admin-list-filters[data-list="${name}"] [name]`).forEach(input => {
+        if (input.value !== '') params[input.name] = input.value.trim();
+    });
+    return params;
+}
+
+async function loadAdminList(name, reset = false) {
+    const list = adminLists[name];
+    const state = adminListState[name] ||= { page: 0, sort: 'created_at', order: 'desc' };
+    if (state.loading) return;
+
+    const body = document.getElementById(`${name}Body`);
+    if (reset) {
+        state.page = 0;
+        body.innerHTML = '';
+        document.querySelectorAll(`#${name}Table thead input[type="checkbox"]`).forEach(cb => cb.checked = false);
+        updateListSelection(name);
+    }
+
+    const params = new URLSearchParams({
+        ...getAdminListFilters(name),
+        page: state.page + 1,
+        sort: state.sort,
+        order: state.order
+    });
+
+    state.loading = true;
+    try {
+        const response = await fetch(`${list.url}?${params}`);
+        const data = await response.json();
+
+        if (response.ok && data.success) {
+            state.page = data.page;
+            state.loaded = true;
+            body.insertAdjacentHTML('beforeend', data.items.map(list.renderRow).join(''));
+            document.getElementById(`${name}More`).classList.toggle('d-none', !data.has_more);
+            document.getElementById(`${name}Empty`).classList.toggle('d-none', body.children.length > 0);
+        } else {
+            showAlert('❌ Erreur lors du chargement', 'danger');
+        }
+    } catch (error) {
+        showAlert('❌ Erreur de connexion', 'danger');
+    } finally {
+        state.loading = false;
+    }
+}
+
+// Bulk moderation on the selected rows of a list
+function getSelectedIds(name) {
+    return Array.from(document.querySelectorAll(`#${name}Body .row-checkbox:checked`)).map(cb => cb.value);
+}
+
+function updateListSelection(name) {
+    const counter = document.getElementById(`${name}SelectedCount`);
+    if (counter) counter.textContent = getSelectedIds(name).length;
+}
+
+function toggleListSelection(checkbox, name) {
+    document.querySelectorAll(`#${name}Body .row-checkbox`).forEach(cb => {
+        cb.checked = checkbox.checked;
+    });
+    updateListSelection(name);
+}
+
+async function runBulkAction(name, url, confirmMessage, extraFields = {}) {
+    const ids = getSelectedIds(name);
+    if (ids.length === 0) {
+        showAlert('⚠️ Aucune ligne sélectionnée', 'warning');
+        return;
+    }
+    if (!confirm(`${confirmMessage} (${ids.length})`)) return;
+
+    const formData = new FormData();
+    formData.append('ids', ids.join(','));
+    Object.entries(extraFields).forEach(([key, value]) => formData.append(key, value));
+
+    try {
+        const response = await fetch(url, {
+            method: 'POST',
+            body: formData
+        });
+
+        const data = await response.json();
+
+        if (response.ok && data.success) {
+            showAlert('✅ ' + data.message, 'success');
+            loadAdminList(name, true);
+            updateListSelection(name);
+        } else {
+            showAlert('❌ ' + (data.detail || 'Erreur lors du traitement'), 'danger');
+        }
+    } catch (error) {
+        showAlert('❌ Erreur de connexion', 'danger');
+    }
+}
+
+// Streamed export (CSV/JSONL) using the filters of a list
+function exportAdminList(name, dataset, format) {
+    const { q, ...filters } = getAdminListFilters(name);
+    const params = new URLSearchParams({ ...filters, format });
+    window.location.href = `/admin/export/${dataset}?${params}`;
+}
+
+function setupAdminList(name) {
+    const filters = document.querySelector(`.admin-list-filters[data-list="${name}"]`);
+    if (filters) {
+        filters.querySelectorAll('input').forEach(input => {
+            input.addEventListener('input', debounce(() => loadAdminList(name, true), 300));
+        });
+        filters.querySelectorAll('select').forEach(select => {
+            select.addEventListener('change', () => loadAdminList(name, true));
+        });
+    }
+
+    document.querySelectorAll(`#${name}Table th.sortable`).forEach(th => {
+        th.addEventListener('click', () => {
+            const state = adminListState[name] ||= { page: 0, sort: 'created_at', order: 'desc' };
+            state.order = state.sort === th.dataset.sort && state.order === 'desc' ? 'asc' : 'desc';
+            state.sort = th.dataset.sort;
+            document.querySelectorAll(`#${name}Table th.sortable`).forEach(other => other.classList.remove('asc', 'desc'));
+            th.classList.add(state.order);
+            loadAdminList(name, true);
+        });
+    });
+
+    // Lazy load: fetch the first page the first time the tab is shown
+    const tab = document.querySelector(`[data-bs-toggle="tab"][href="#${name}"]`);
+    if (tab) {
+        tab.addEventListener('shown.bs.tab', () => {
+            if (!adminListState[name]?.loaded) loadAdminList(name, true);
+        });
+        if (tab.classList.contains('active')) loadAdminList(name, true);
+    }
+}
+
 // Initialize admin panel
 document.addEventListener('DOMContentLoaded', () => {
     // Start stats refresh if on admin panel
     if (document.getElementById('admin_panel')) {
         startStatsRefresh();
+        Object.keys(adminLists).forEach(setupAdminList);
     }
 
     // Cleanup on page unload
@@ -164,6 +164,13 @@ function debounce(func, wait) {
     };
 }
 
+// Escape text before inserting it into HTML templates
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    }[c]));
+}
+
 // Format file size
 function formatFileSize(bytes) {
     if (bytes === 0) return '0 Bytes';
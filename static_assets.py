@@ -0,0 +1,143 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, Optional
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from config import STATIC_DIR, STATIC_CACHE_DIR
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+COMPRESS_MIN_SIZE = 512
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings from an Accept-Encoding header, minus those refused with q=0"""
+    codings = set()
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if name:
+            codings.add(name.strip().lower())
+    return codings
+
+
+class StaticAssets:
+    """Content-hashed names and precompressed variants of the static files
+
+    build() runs once at startup: "js/main.js" is published as
+    "js/main.<hash>.js" and its gzip (and brotli, if installed) variants
+    are written once to STATIC_CACHE_DIR, named after the hash. Templates
+    call static_url(), so a changed file gets a new URL and everything
+    else can be cached forever.
+    """
+
+    def __init__(self, directory=STATIC_DIR, cache_dir=STATIC_CACHE_DIR, prefix="/static"):
+        self.directory = os.path.abspath(directory)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.prefix = prefix
+        # "js/main.js" -> "js/main.<hash>.js"
+        self.urls: Dict[str, str] = {}
+        # "js/main.<hash>.js" -> {'path', 'media_type', 'variants': {coding: path}}
+        self.files: Dict[str, dict] = {}
+
+    def build(self):
+        urls, files = {}, {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                stem, ext = os.path.splitext(rel_path)
+                hashed = f"{stem}.{digest}{ext}"
+                media_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                urls[rel_path] = hashed
+                files[hashed] = {
+                    'path': path,
+                    'media_type': media_type,
+                    'variants': self._precompress(data, digest, media_type),
+                }
+        self.urls, self.files = urls, files
+        print(f"✅ {len(files)} fichiers statiques indexés")
+
+    def _precompress(self, data: bytes, digest: str, media_type: str) -> Dict[str, str]:
+        if len(data) < COMPRESS_MIN_SIZE or not media_type.startswith(COMPRESSIBLE_TYPES):
+            return {}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        compressors = {'gzip': lambda d: gzip.compress(d, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressors['br'] = lambda d: brotli.compress(d, quality=11)
+
+        variants = {}
+        for coding, compress in compressors.items():
+            path = os.path.join(self.cache_dir, f"{digest}.{coding}")
+            if not os.path.exists(path):
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    continue
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+            variants[coding] = path
+        return variants
+
+    def url(self, rel_path: str) -> str:
+        """Public URL of a static file, fingerprinted when it is known"""
+        rel_path = rel_path.lstrip('/')
+        return f"{self.prefix}/{self.urls.get(rel_path, rel_path)}"
+
+
+class HashedStaticFiles(StaticFiles):
+    """StaticFiles serving fingerprinted names with immutable caching
+
+    Hashed URLs get the precompressed variant the client accepts (br,
+    then gzip). Plain names keep working for old pages and bookmarks,
+    but are revalidated (ETag) on every use.
+    """
+
+    def __init__(self, assets: StaticAssets, **kwargs):
+        super().__init__(directory=assets.directory, **kwargs)
+        self.assets = assets
+
+    async def get_response(self, path: str, scope):
+        asset = self.assets.files.get(path.replace(os.sep, '/'))
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            response = await super().get_response(path, scope)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        headers = {"Cache-Control": IMMUTABLE}
+        file_path = asset['path']
+        if asset['variants']:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            coding = self._pick_coding(asset['variants'], accepted)
+            if coding:
+                file_path = asset['variants'][coding]
+                headers["Content-Encoding"] = coding
+
+        return FileResponse(file_path, media_type=asset['media_type'], headers=headers, method=scope["method"])
+
+    @staticmethod
+    def _pick_coding(variants: Dict[str, str], accepted: set) -> Optional[str]:
+        for coding in ('br', 'gzip'):
+            if coding in variants and coding in accepted:
+                return coding
+        return None
+
+
+# Global instance
+static_assets = StaticAssets()
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime
+from database import get_db_connection
+from config import STATS_RECONCILE_INTERVAL
+
+# counter name -> COUNT query used to reconcile it with the database
+COUNTER_QUERIES = {
+    'total_users': "SELECT COUNT(*) FROM users",
+    'pro_users': "SELECT COUNT(*) FROM users WHERE user_type = 'pro'",
+    'total_contents': "SELECT COUNT(*) FROM contents",
+    'pending_groups': "SELECT COUNT(*) FROM group_requests WHERE status = 'pending'",
+    'pending_pro_upgrades': "SELECT COUNT(*) FROM pro_upgrade_requests WHERE status = 'pending'",
+}
+
+
+class StatsService:
+    """In-memory admin dashboard counters
+
+    Routes bump the counters after committing their change, and a
+    background loop periodically resets them from the database to
+    correct any drift (manual SQL, another worker, a failed request...).
+    """
+
+    def __init__(self):
+        self.counters = {name: 0 for name in COUNTER_QUERIES}
+        self.reconciled_at = None
+
+    def incr(self, name, delta=1):
+        self.counters[name] = max(self.counters[name] + delta, 0)
+
+    def decr(self, name, delta=1):
+        self.incr(name, -delta)
+
+    def snapshot(self):
+        return dict(self.counters)
+
+    def reconcile(self):
+        """Recompute every counter from the database in one round trip"""
+        conn = get_db_connection()
+        if not conn:
+            return False
+
+        cursor = conn.cursor()
+        try:
+            names = list(COUNTER_QUERIES)
+            query = "SELECT " + ", ".join(f"({COUNTER_QUERIES[name]})" for name in names)
+            cursor.execute(query)
+            row = cursor.fetchone()
+            self.counters = dict(zip(names, (int(value) for value in row)))
+            self.reconciled_at = datetime.now()
+            return True
+        except Exception as e:
+            print(f"❌ Erreur de réconciliation des statistiques: {e}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    async def reconcile_loop(self, interval=STATS_RECONCILE_INTERVAL):
+        """Background task: reconcile the counters every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.reconcile)
+
+
+# Global instance
+stats = StatsService()
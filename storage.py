@@ -0,0 +1,184 @@
+import os
+import shutil
+import mimetypes
+from typing import Optional
+from config import STORAGE_BACKEND, UPLOAD_FOLDER, MEDIA_URL
+from google_drive import drive_manager
+
+
+class StorageBackend:
+    """Common interface for file storage (Google Drive, local disk...)
+
+    upload_file_from_bytes returns the same dict shape as
+    GoogleDriveManager.upload_file_from_bytes so routes don't care
+    which backend is active.
+    """
+
+    name = "base"
+
+    def authenticate(self):
+        return True
+
+    def upload_file_from_bytes(self, file_bytes, file_name, mime_type, folder_name=None) -> Optional[dict]:
+        raise NotImplementedError
+
+    def delete_file(self, file_id) -> bool:
+        raise NotImplementedError
+
+    def get_direct_image_url(self, file_id, size='w500'):
+        raise NotImplementedError
+
+    def get_direct_download_url(self, file_id):
+        raise NotImplementedError
+
+    def get_file_metadata(self, file_id) -> Optional[dict]:
+        """Return {'name', 'mimeType', 'size', 'md5Checksum'} for a stored file"""
+        raise NotImplementedError
+
+    def download_to_file(self, file_id, file_obj) -> bool:
+        raise NotImplementedError
+
+    def local_path(self, file_id) -> Optional[str]:
+        """Path on disk when the backend keeps files locally, else None"""
+        return None
+
+
+class GoogleDriveStorage(StorageBackend):
+    """Storage backed by the Google Drive API"""
+
+    name = "google_drive"
+
+    def __init__(self, manager=drive_manager):
+        self.manager = manager
+
+    def authenticate(self):
+        return self.manager.authenticate()
+
+    def upload_file_from_bytes(self, file_bytes, file_name, mime_type, folder_name=None):
+        return self.manager.upload_file_from_bytes(file_bytes, file_name, mime_type, folder_name)
+
+    def delete_file(self, file_id):
+        return self.manager.delete_file(file_id)
+
+    def get_direct_image_url(self, file_id, size='w500'):
+        return self.manager.get_direct_image_url(file_id, size)
+
+    def get_direct_download_url(self, file_id):
+        return self.manager.get_direct_download_url(file_id)
+
+    def get_file_metadata(self, file_id):
+        return self.manager.get_file_metadata(file_id)
+
+    def download_to_file(self, file_id, file_obj):
+        return self.manager.download_to_file(file_id, file_obj)
+
+
+class LocalStorage(StorageBackend):
+    """Storage on the local filesystem, served by the /files route (access-checked)
+
+    File ids are paths relative to the root folder, e.g.
+    "profile_pictures/<uuid>_photo.jpg".
+    """
+
+    name = "local"
+
+    def __init__(self, root=UPLOAD_FOLDER, base_url=MEDIA_URL):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/')
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, file_id):
+        """Resolve a file id to an absolute path inside the root folder"""
+        path = os.path.abspath(os.path.join(self.root, file_id))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"Invalid file id: {file_id}")
+        return path
+
+    def upload_file_from_bytes(self, file_bytes, file_name, mime_type, folder_name=None):
+        """Write a file from bytes under the root folder"""
+        file_name = os.path.basename(file_name)
+        file_id = f"{folder_name}/{file_name}" if folder_name else file_name
+
+        try:
+            path = self._path(file_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Write to a temp file then rename so readers never see a partial file
+            tmp_path = f"{path}.part"
+            with open(tmp_path, 'wb') as f:
+                f.write(file_bytes)
+            os.replace(tmp_path, path)
+
+            url = self.get_direct_download_url(file_id)
+            return {
+                'id': file_id,
+                'webViewLink': url,
+                'webContentLink': url,
+                'directImageUrl': self.get_direct_image_url(file_id),
+                'directDownloadUrl': url
+            }
+        except Exception as e:
+            print(f"Error writing local file: {e}")
+            return None
+
+    def delete_file(self, file_id):
+        """Delete a file from the root folder"""
+        try:
+            os.remove(self._path(file_id))
+            return True
+        except Exception as e:
+            print(f"Error deleting local file: {e}")
+            return False
+
+    def get_direct_image_url(self, file_id, size='w500'):
+        # Pas de redimensionnement côté serveur: l'original est servi tel quel
+        return f"{self.base_url}/{file_id}"
+
+    def get_direct_download_url(self, file_id):
+        return f"{self.base_url}/{file_id}"
+
+    def get_file_metadata(self, file_id):
+        try:
+            path = self._path(file_id)
+            return {
+                'name': os.path.basename(path),
+                'mimeType': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                'size': os.path.getsize(path),
+                'md5Checksum': None
+            }
+        except Exception as e:
+            print(f"Error getting local file metadata: {e}")
+            return None
+
+    def download_to_file(self, file_id, file_obj):
+        try:
+            with open(self._path(file_id), 'rb') as f:
+                shutil.copyfileobj(f, file_obj)
+            return True
+        except Exception as e:
+            print(f"Error reading local file: {e}")
+            return False
+
+    def local_path(self, file_id):
+        try:
+            path = self._path(file_id)
+        except ValueError:
+            return None
+        return path if os.path.isfile(path) else None
+
+
+STORAGE_BACKENDS = {
+    GoogleDriveStorage.name: GoogleDriveStorage,
+    LocalStorage.name: LocalStorage,
+}
+
+
+def get_storage_backend(name=STORAGE_BACKEND) -> StorageBackend:
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    return STORAGE_BACKENDS[name]()
+
+
+# Global instance
+storage = get_storage_backend()
@@ -0,0 +1,163 @@
+import io
+import csv
+import asyncio
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from mysql.connector import IntegrityError
+from auth import hash_password
+
+IMPORT_COLUMNS = ('first_name', 'last_name', 'phone', 'password', 'class_level', 'filiere')
+REQUIRED_COLUMNS = ('first_name', 'phone', 'password')
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ROWS = 5000
+IMPORT_MAX_BYTES = 5 * 1024 * 1024
+
+INSERT_USER_SQL = """
+    INSERT INTO users (first_name, last_name, phone, password, class_level, filiere)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+def parse_csv(content: bytes) -> List[Dict[str, str]]:
+    """Read a CSV export (Excel or Google Sheets) into dicts
+
+    Accepts a UTF-8 BOM and ',' or ';' delimiters; headers are matched
+    case-insensitively.
+    """
+    try:
+        text = content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        text = content.decode('latin-1')
+
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    if not reader.fieldnames:
+        raise HTTPException(status_code=400, detail="Fichier CSV vide")
+
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = [col for col in REQUIRED_COLUMNS if col not in reader.fieldnames]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Colonnes manquantes: {', '.join(missing)}")
+
+    rows = []
+    for row in reader:
+        rows.append({col: (row.get(col) or '').strip() for col in IMPORT_COLUMNS})
+        if len(rows) > IMPORT_MAX_ROWS:
+            raise HTTPException(status_code=400, detail=f"Maximum {IMPORT_MAX_ROWS} lignes par import")
+    return rows
+
+
+def _hash_all(passwords: List[str]) -> List[str]:
+    return [hash_password(password) for password in passwords]
+
+
+def _validate(rows, default_class_level, existing_phones, admin_names):
+    """Split rows into insertable users and a per-row report"""
+    report, valid, seen = [], [], set()
+
+    # Line 1 is the header
+    for line, row in enumerate(rows, start=2):
+        entry = {'line': line, 'phone': row['phone'], 'status': 'error'}
+        report.append(entry)
+
+        missing = [col for col in REQUIRED_COLUMNS if not row[col]]
+        if missing:
+            entry['error'] = f"Champs requis vides: {', '.join(missing)}"
+        elif row['first_name'] in admin_names:
+            entry['error'] = "Ce nom est réservé aux administrateurs"
+        elif row['phone'] in seen:
+            entry['error'] = "Téléphone en double dans le fichier"
+        elif row['phone'] in existing_phones:
+            entry['status'] = 'skipped'
+            entry['error'] = "Téléphone déjà utilisé"
+        else:
+            seen.add(row['phone'])
+            entry['status'] = 'valid'
+            row['class_level'] = row['class_level'] or default_class_level
+            valid.append((entry, row))
+
+    return valid, report
+
+
+def _insert_batch(cursor, batch, hashes):
+    """Multi-row INSERT of a batch, falling back row by row on conflict
+
+    A failed statement is rolled back on its own by InnoDB, so the
+    transaction stays usable for the row-by-row retry (e.g. a phone
+    registered through /register while the import was running).
+    """
+    values = [
+        (row['first_name'], row['last_name'] or None, row['phone'], hashed,
+         row['class_level'] or None, row['filiere'] or None)
+        for (_, row), hashed in zip(batch, hashes)
+    ]
+    try:
+        # mysql-connector rewrites INSERT ... VALUES executemany into one statement
+        cursor.executemany(INSERT_USER_SQL, values)
+        for entry, _ in batch:
+            entry['status'] = 'created'
+        return
+    except IntegrityError:
+        pass
+
+    for (entry, _), value in zip(batch, values):
+        try:
+            cursor.execute(INSERT_USER_SQL, value)
+            entry['status'] = 'created'
+        except IntegrityError:
+            entry['status'] = 'skipped'
+            entry['error'] = "Téléphone déjà utilisé"
+
+
+async def import_users(conn, content: bytes, default_class_level: Optional[str] = None,
+                       dry_run: bool = False) -> dict:
+    """Validate a CSV of users and insert the valid rows in one transaction
+
+    Returns counts per status and the per-row report; with dry_run the
+    rows are only validated ('valid' status) and nothing is written.
+    """
+    rows = parse_csv(content)
+    phones = list({row['phone'] for row in rows if row['phone']})
+
+    cursor = conn.cursor()
+    try:
+        existing_phones = set()
+        for start in range(0, len(phones), IMPORT_BATCH_SIZE):
+            chunk = phones[start:start + IMPORT_BATCH_SIZE]
+            cursor.execute(
+                f"SELECT phone FROM users WHERE phone IN ({', '.join(['%s'] * len(chunk))})",
+                chunk
+            )
+            existing_phones.update(phone for (phone,) in cursor.fetchall())
+
+        cursor.execute("SELECT nom FROM admin")
+        admin_names = {nom for (nom,) in cursor.fetchall()}
+
+        valid, report = _validate(rows, default_class_level, existing_phones, admin_names)
+
+        if valid and not dry_run:
+            # Hashing runs in the default thread pool, off the event loop
+            hashes = await asyncio.to_thread(_hash_all, [row['password'] for _, row in valid])
+
+            for start in range(0, len(valid), IMPORT_BATCH_SIZE):
+                _insert_batch(cursor, valid[start:start + IMPORT_BATCH_SIZE],
+                              hashes[start:start + IMPORT_BATCH_SIZE])
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    count = lambda status: sum(1 for entry in report if entry['status'] == status)
+    return {
+        'created': count('created'),
+        'valid': count('valid'),
+        'skipped': count('skipped'),
+        'errors': count('error'),
+        'report': report
+    }
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from database import get_db_connection
+from config import USER_INDEX_REFRESH_INTERVAL
+
+SEARCH_MAX_LIMIT = 50
+
+USER_SELECT = """
+    SELECT id, first_name, last_name, class_level,
+           COALESCE(profile_picture_thumb, profile_picture) as profile_picture
+    FROM users
+    WHERE is_active = TRUE
+"""
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase and strip accents so "Éric" matches "eric" """
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+
+class UserSearchIndex:
+    """In-memory prefix index over active users' first and last names
+
+    Every name word is stored as a (word, user_id) key in a sorted list,
+    so a prefix lookup is a bisect followed by a short scan: O(log n + k)
+    without touching MySQL. Routes that create or edit users call
+    refresh_user(); a background loop reloads everything periodically to
+    pick up changes made elsewhere (thumbnails, admin SQL, other workers).
+    The reload runs in a thread; upserts and removals made meanwhile are
+    recorded and replayed on the new index so they are not lost.
+    """
+
+    def __init__(self):
+        self.users: Dict[int, dict] = {}
+        self.keys: List[Tuple[str, int]] = []
+        # user_id -> latest row (None when removed) while a reload is running
+        self.touched: Optional[Dict[int, Optional[dict]]] = None
+        self.lock = threading.RLock()
+
+    def _words(self, user) -> Set[str]:
+        return set(normalize(f"{user['first_name']} {user['last_name'] or ''}").split())
+
+    def load(self):
+        conn = get_db_connection()
+        if not conn:
+            return False
+
+        with self.lock:
+            self.touched = {}
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(USER_SELECT)
+            users = {row['id']: row for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"❌ Erreur de chargement de l'index utilisateurs: {e}")
+            with self.lock:
+                self.touched = None
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+        keys = sorted((word, uid) for uid, user in users.items() for word in self._words(user))
+        with self.lock:
+            touched, self.touched = self.touched, None
+            # Swap both at once so concurrent searches never see a half-built index
+            self.users, self.keys = users, keys
+            # The snapshot may predate changes made while it was read
+            for user_id, user in touched.items():
+                if user is None:
+                    self.remove(user_id)
+                else:
+                    self.upsert(user)
+        return True
+
+    async def refresh_loop(self, interval=USER_INDEX_REFRESH_INTERVAL):
+        """Background task: rebuild the index every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.load)
+
+    def remove(self, user_id: int):
+        with self.lock:
+            if self.touched is not None:
+                self.touched[user_id] = None
+            user = self.users.pop(user_id, None)
+            if not user:
+                return
+            for word in self._words(user):
+                index = bisect_left(self.keys, (word, user_id))
+                if index < len(self.keys) and self.keys[index] == (word, user_id):
+                    del self.keys[index]
+
+    def upsert(self, user: dict):
+        with self.lock:
+            self.remove(user['id'])
+            if self.touched is not None:
+                self.touched[user['id']] = user
+            self.users[user['id']] = user
+            for word in self._words(user):
+                insort(self.keys, (word, user['id']))
+
+    def refresh_users(self, user_ids: List[int], conn=None):
+        """Re-read some users from the database after a change"""
+        if not user_ids:
+            return
+        own_conn = conn is None
+        conn = conn or get_db_connection()
+        if not conn:
+            return
+
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                USER_SELECT + f" AND id IN ({', '.join(['%s'] * len(user_ids))})",
+                list(user_ids)
+            )
+            found = {row['id']: row for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            if own_conn:
+                conn.close()
+
+        for user_id in user_ids:
+            if user_id in found:
+                self.upsert(found[user_id])
+            else:
+                # Inactive or deleted users are not searchable
+                self.remove(user_id)
+
+    def refresh_user(self, user_id: int, conn=None):
+        self.refresh_users([user_id], conn)
+
+    def search(self, query: str = '', limit: int = 20, class_level: Optional[str] = None,
+               exclude: Iterable[int] = ()) -> List[dict]:
+        """Users whose name words start with every word of the query
+
+        The first query word drives the index scan; the others filter
+        the candidates, so "ra jean" finds "Jean Rakoto".
+        """
+        words = normalize(query).split()
+        limit = min(max(limit, 1), SEARCH_MAX_LIMIT)
+        exclude = set(exclude)
+        results, seen = [], set()
+
+        prefix = words[0] if words else ''
+        index = bisect_left(self.keys, (prefix, 0))
+        while index < len(self.keys) and len(results) < limit:
+            word, uid = self.keys[index]
+            index += 1
+            if not word.startswith(prefix):
+                break
+            if uid in seen or uid in exclude:
+                continue
+            seen.add(uid)
+
+            user = self.users.get(uid)
+            if not user:
+                continue
+            if class_level and user['class_level'] != class_level:
+                continue
+            if len(words) > 1:
+                user_words = self._words(user)
+                if not all(any(w.startswith(q) for w in user_words) for q in words[1:]):
+                    continue
+            results.append(user)
+
+        return results
+
+
+# Global instance
+user_index = UserSearchIndex()
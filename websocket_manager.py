@@ -1,6 +1,8 @@
 from fastapi import WebSocket
-from typing import Dict, List, Set
+from typing import Dict, Iterable, List, Set
 import json
+import asyncio
+from json_encoder import dumps
 
 class ConnectionManager:
     def __init__(self):
@@ -26,32 +28,40 @@ class ConnectionManager:
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
     
+    async def _send_text(self, user_id: int, text: str):
+        """Send an already encoded frame to every socket of a user"""
+        disconnected = []
+        for connection in list(self.active_connections.get(user_id, [])):
+            try:
+                await connection.send_text(text)
+            except:
+                disconnected.append(connection)
+        
+        # Clean up disconnected connections
+        for conn in disconnected:
+            self.disconnect(conn, user_id)
+    
+    async def _fan_out(self, message: dict, user_ids: Iterable[int]):
+        """Encode the message once and send the same text frame to every user"""
+        targets = [user_id for user_id in user_ids if user_id in self.active_connections]
+        if not targets:
+            return
+        text = dumps(message).decode()
+        await asyncio.gather(*(self._send_text(user_id, text) for user_id in targets))
+    
     async def send_personal_message(self, message: dict, user_id: int):
         """Send message to a specific user"""
         if user_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    disconnected.append(connection)
-            
-            # Clean up disconnected connections
-            for conn in disconnected:
-                self.active_connections[user_id].remove(conn)
+            await self._send_text(user_id, dumps(message).decode())
     
     async def broadcast_to_conversation(self, message: dict, conversation_id: int, exclude_user: int = None):
         """Broadcast message to all users in a conversation"""
-        if conversation_id in self.conversation_participants:
-            for user_id in self.conversation_participants[conversation_id]:
-                if exclude_user and user_id == exclude_user:
-                    continue
-                await self.send_personal_message(message, user_id)
+        participants = self.conversation_participants.get(conversation_id, ())
+        await self._fan_out(message, [uid for uid in participants if not (exclude_user and uid == exclude_user)])
     
     async def broadcast_to_multiple(self, message: dict, user_ids: List[int]):
         """Broadcast message to multiple users"""
-        for user_id in user_ids:
-            await self.send_personal_message(message, user_id)
+        await self._fan_out(message, set(user_ids))
     
     def add_to_conversation(self, conversation_id: int, user_id: int):
         """Add user to conversation participants"""
@@ -59,6 +69,10 @@ class ConnectionManager:
             self.conversation_participants[conversation_id] = set()
         self.conversation_participants[conversation_id].add(user_id)
     
+    def add_many_to_conversation(self, conversation_id: int, user_ids: List[int]):
+        """Add several users to conversation participants at once"""
+        self.conversation_participants.setdefault(conversation_id, set()).update(user_ids)
+    
     def remove_from_conversation(self, conversation_id: int, user_id: int):
         """Remove user from conversation participants"""
         if conversation_id in self.conversation_participants:
@@ -83,12 +97,13 @@ class ConnectionManager:
     async def broadcast_to_call(self, message: dict, call_id: int, exclude_user: int = None):
         """Broadcast WebRTC signaling to call participants"""
         if call_id in self.call_connections:
+            text = dumps(message).decode()
             disconnected = []
-            for user_id, connection in self.call_connections[call_id].items():
+            for user_id, connection in list(self.call_connections[call_id].items()):
                 if exclude_user and user_id == exclude_user:
                     continue
                 try:
-                    await connection.send_json(message)
+                    await connection.send_text(text)
                 except:
                     disconnected.append(user_id)
             
@@ -96,6 +111,28 @@ class ConnectionManager:
             for user_id in disconnected:
                 self.disconnect_call(call_id, user_id)
     
+    async def send_to_call_participant(self, message: dict, call_id: int, user_id: int) -> bool:
+        """Send WebRTC signaling to one call participant; False if they are not connected"""
+        connection = self.call_connections.get(call_id, {}).get(user_id)
+        if connection is None:
+            return False
+        try:
+            await connection.send_text(dumps(message).decode())
+            return True
+        except:
+            self.disconnect_call(call_id, user_id)
+            return False
+    
+    def connection_counts(self) -> Dict[str, int]:
+        """Current connection numbers, for /metrics"""
+        return {
+            'notification_users': len(self.active_connections),
+            'notification_sockets': sum(len(sockets) for sockets in self.active_connections.values()),
+            'calls': len(self.call_connections),
+            'call_sockets': sum(len(users) for users in self.call_connections.values()),
+            'tracked_conversations': len(self.conversation_participants),
+        }
+    
     def get_call_participants(self, call_id: int) -> List[int]:
         """Get list of participants in a call"""
         if call_id in self.call_connections: